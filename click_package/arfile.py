@@ -13,11 +13,11 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
-"""Basic support for writing ar archive files.
+"""Basic support for reading and writing ar archive files.
 
 We do things this way so that Click packages can be created with minimal
-dependencies (e.g. on non-Ubuntu systems).  No read support is needed, since
-Click packages are always installed on systems that have dpkg.
+dependencies (e.g. on non-Ubuntu systems).  Read support is sequential, so
+that a package can be checked in a single streaming pass.
 
 Some method names and general approach come from the tarfile module in
 Python's standard library; details of the format come from dpkg.
@@ -35,19 +35,57 @@ import shutil
 import time
 
 
+class ArMember:
+    """A file object reading the data of one member of an ArFile."""
+
+    def __init__(self, fileobj, name, size):
+        self.fileobj = fileobj
+        self.name = name
+        self.size = size
+        self._remaining = size
+        try:
+            self.offset = fileobj.tell()
+        except (AttributeError, IOError, OSError):
+            self.offset = None
+
+    def read(self, size=-1):
+        if size is None or size < 0 or size > self._remaining:
+            size = self._remaining
+        data = self.fileobj.read(size)
+        if len(data) < size:
+            raise IOError("ar member %s is truncated" % self.name)
+        self._remaining -= len(data)
+        return data
+
+    def _skip(self):
+        """Skip any unread data and padding."""
+        skip = self._remaining + (self.size & 1)
+        if self.offset is not None:
+            self.fileobj.seek(skip, os.SEEK_CUR)
+            skip = 0
+        while skip > 0:
+            data = self.fileobj.read(min(skip, 65536))
+            if not data:
+                break
+            skip -= len(data)
+        self._remaining = 0
+
+
 class ArFile:
     def __init__(self, name=None, mode="w", fileobj=None):
-        if mode != "w":
-            raise ValueError("only mode 'w' is supported")
+        if mode not in ("r", "w"):
+            raise ValueError("only modes 'r' and 'w' are supported")
         self.mode = mode
-        self.real_mode = "wb"
+        self.real_mode = mode + "b"
 
         if fileobj:
             if name is None and hasattr(fileobj, "name"):
                 name = fileobj.name
             if hasattr(fileobj, "mode"):
-                if fileobj.mode != "wb":
-                    raise ValueError("fileobj must be opened with mode='wb'")
+                if fileobj.mode != self.real_mode:
+                    raise ValueError(
+                        "fileobj must be opened with mode='%s'" %
+                        self.real_mode)
                 self._mode = fileobj.mode
             self.opened_fileobj = False
         else:
@@ -56,6 +94,14 @@ class ArFile:
         self.name = name
         self.fileobj = fileobj
         self.closed = False
+        self._member = None
+        if mode == "r":
+            try:
+                if self.fileobj.read(8) != b"!<arch>\n":
+                    raise IOError("%s is not an ar archive" % name)
+            except Exception:
+                self.close()
+                raise
 
     def close(self):
         if self.opened_fileobj:
@@ -73,6 +119,48 @@ class ArFile:
     def __exit__(self, *args):
         self.close()
 
+    def next(self):
+        """Return an ArMember for the next member, or None at the end.
+
+        Any unread data in the previous member is skipped.
+        """
+        self._check()
+        if self._member is not None:
+            self._member._skip()
+            self._member = None
+        header = self.fileobj.read(60)
+        if not header:
+            return None
+        if len(header) < 60 or header[58:60] != b"`\n":
+            raise IOError("%s has a corrupt ar member header" % self.name)
+        name = header[:16].decode("UTF-8").rstrip(" ")
+        if name.endswith("/"):
+            # GNU ar terminates names with "/".
+            name = name[:-1]
+        try:
+            size = int(header[48:58].decode("UTF-8"))
+        except ValueError:
+            raise IOError("%s has a corrupt ar member size" % self.name)
+        self._member = ArMember(self.fileobj, name, size)
+        return self._member
+
+    def reopen(self, member):
+        """Return a fresh ArMember reading member's data from the start.
+
+        This requires a seekable file, and ends iteration over members.
+        """
+        self._check()
+        self.fileobj.seek(member.offset)
+        self._member = ArMember(self.fileobj, member.name, member.size)
+        return self._member
+
+    def __iter__(self):
+        while True:
+            member = self.next()
+            if member is None:
+                break
+            yield member
+
     def add_magic(self):
         self.fileobj.write(b"!<arch>\n")
 
@@ -26,27 +26,25 @@ __all__ = [
 
 
 import contextlib
+import fnmatch
 import hashlib
 import io
 import json
+import logging
 import os
 import re
 import shutil
+import stat
 import subprocess
 import sys
 import tarfile
 import tempfile
+import time
 from textwrap import dedent
 
-try:
-    import apt_pkg
-    apt_pkg.init_system()
-except ImportError:
-    # "click build" is required to work with only the Python standard library.
-    pass
-
 from click_package import osextras
 from click_package.arfile import ArFile
+from click_package.pgzip import FragmentedGzipWriter, ParallelGzipWriter
 from click_package.preinst import static_preinst
 from click_package.versions import spec_version
 
@@ -56,6 +54,15 @@ from click_package.framework import (
 )
 
 
+# Supported compression methods for the data member, mapped to the
+# extensions dpkg-deb expects.  The control member is always gzipped.
+compressions = {
+    "gzip": "gz",
+    "xz": "xz",
+    "zstd": "zst",
+    }
+
+
 @contextlib.contextmanager
 def make_temp_dir():
     temp_dir = tempfile.mkdtemp(prefix="click")
@@ -80,6 +87,268 @@ class ClickBuildError(Exception):
     pass
 
 
+class HashingReader:
+    """Wrap a file object, hashing everything read through it."""
+
+    def __init__(self, fileobj, md5):
+        self.fileobj = fileobj
+        self.md5 = md5
+
+    def read(self, size=-1):
+        buf = self.fileobj.read(size)
+        self.md5.update(buf)
+        return buf
+
+
+class BuildCache:
+    """An opt-in cache of per-file build results, kept in a directory.
+
+    Each set of source trees has a cache of its own under path, so that
+    builds of different projects can share a cache directory.  Entries are
+    keyed on a source file's path and (size, mtime, inode), and
+    record its md5 sum.  When the data member is gzip-compressed, each
+    file's compressed tar entry is also kept as a gzip member of its own
+    under "fragments", keyed on the entry's tar header and the same stat
+    fields, so that an unchanged file is neither read nor recompressed.
+
+    A file modified during the second in which the build started might be
+    modified again without changing its mtime, so results for such files
+    are not stored.  Only entries used by the most recent build of the same
+    source trees are kept.
+    """
+
+    def __init__(self, path, sources):
+        tree_key = hashlib.sha256("\0".join(
+            sorted(os.path.realpath(source) for source in sources)).encode(
+            "UTF-8", "surrogateescape"))
+        self.path = os.path.join(path, tree_key.hexdigest())
+        self.fragments_dir = os.path.join(self.path, "fragments")
+        osextras.ensuredir(self.fragments_dir)
+        self.index_path = os.path.join(self.path, "index.json")
+        self.start = int(time.time())
+        try:
+            with open(self.index_path) as index:
+                self._entries = json.load(index)
+            if not isinstance(self._entries, dict):
+                self._entries = {}
+        except (IOError, OSError, ValueError):
+            self._entries = {}
+        self._used_entries = {}
+        self._used_fragments = set()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _stamp(st):
+        return [st.st_size, st.st_mtime_ns, st.st_ino]
+
+    def _cacheable(self, st):
+        return st.st_mtime < self.start
+
+    def lookup(self, path, st):
+        """Return the cached md5 sum for path, or None."""
+        entry = self._entries.get(path)
+        if (isinstance(entry, list) and len(entry) == 2 and
+                entry[0] == self._stamp(st)):
+            self._used_entries[path] = entry
+            self.hits += 1
+            return entry[1]
+        self.misses += 1
+        return None
+
+    def store(self, path, st, digest):
+        if self._cacheable(st):
+            self._used_entries[path] = [self._stamp(st), digest]
+
+    def fragment_key(self, header, path, st):
+        key = hashlib.sha256(header)
+        key.update(("\0%s\0%r" % (path, self._stamp(st))).encode(
+            "UTF-8", "surrogateescape"))
+        return key.hexdigest()
+
+    def get_fragment(self, key):
+        """Return the path to a cached fragment, or None."""
+        fragment = os.path.join(self.fragments_dir, key)
+        if os.path.exists(fragment):
+            self._used_fragments.add(key)
+            return fragment
+        return None
+
+    @contextlib.contextmanager
+    def new_fragment(self, key, st):
+        """Capture a new fragment, yielding a file or None if uncacheable."""
+        if not self._cacheable(st):
+            yield None
+            return
+        fragment = os.path.join(self.fragments_dir, key)
+        temp_fragment = "%s.new" % fragment
+        try:
+            with open(temp_fragment, "wb") as capture:
+                yield capture
+            os.rename(temp_fragment, fragment)
+            self._used_fragments.add(key)
+        finally:
+            osextras.unlink_force(temp_fragment)
+
+    def save(self):
+        temp_index_path = "%s.new" % self.index_path
+        with open(temp_index_path, "w") as index:
+            json.dump(self._used_entries, index)
+        os.rename(temp_index_path, self.index_path)
+        for key in os.listdir(self.fragments_dir):
+            if key not in self._used_fragments:
+                osextras.unlink_force(os.path.join(self.fragments_dir, key))
+
+
+class DataTarWriter:
+    """Stream a source tree into a data tarball in a single pass.
+
+    Each file is read once: its contents go to the tarball and to its md5
+    sum at the same time, and its size is added to the installed size.
+    With a BuildCache, unchanged files are not hashed, and if the tarball
+    is written through a FragmentedGzipWriter they are not read at all.
+    """
+
+    def __init__(self, tar, ignore_patterns, filter, exclude=None,
+                 cache=None):
+        self.tar = tar
+        self.ignore_patterns = ignore_patterns
+        self.filter = filter
+        self.exclude = exclude
+        self.cache = cache
+        if cache is not None and isinstance(tar.fileobj, FragmentedGzipWriter):
+            self.fragments = tar.fileobj
+        else:
+            self.fragments = None
+        self.md5sums = []
+        self.installed_bytes = 0
+        self._seen_arcnames = set()
+
+    def _ignored(self, names):
+        ignored = set()
+        for pattern in self.ignore_patterns:
+            ignored.update(fnmatch.filter(names, pattern))
+        return ignored
+
+    def add_directory(self, arcname):
+        """Add a directory entry that has no corresponding source."""
+        if arcname in self._seen_arcnames:
+            return
+        self._seen_arcnames.add(arcname)
+        umask = os.umask(0)
+        os.umask(umask)
+        tarinfo = tarfile.TarInfo(arcname)
+        tarinfo.type = tarfile.DIRTYPE
+        tarinfo.mode = 0o777 & ~umask
+        tarinfo.mtime = int(time.time())
+        tarinfo.uname = tarinfo.gname = "root"
+        self.installed_bytes += 4096
+        self.tar.addfile(tarinfo)
+
+    def _md5_file(self, path, st):
+        if self.cache is not None:
+            digest = self.cache.lookup(path, st)
+            if digest is not None:
+                return digest
+        md5 = hashlib.md5()
+        with open(path, "rb") as f:
+            while True:
+                buf = f.read(16384)
+                if not buf:
+                    break
+                md5.update(buf)
+        digest = md5.hexdigest()
+        if self.cache is not None:
+            self.cache.store(path, st, digest)
+        return digest
+
+    def _add_regular(self, path, st, tarinfo):
+        digest = None
+        if self.cache is not None:
+            digest = self.cache.lookup(path, st)
+        if self.fragments is None:
+            md5 = hashlib.md5()
+            with open(path, "rb") as f:
+                if digest is None:
+                    self.tar.addfile(tarinfo, HashingReader(f, md5))
+                    digest = md5.hexdigest()
+                else:
+                    self.tar.addfile(tarinfo, f)
+        else:
+            header = tarinfo.tobuf(
+                self.tar.format, self.tar.encoding, self.tar.errors)
+            key = self.cache.fragment_key(header, path, st)
+            fragment = None
+            if digest is not None:
+                fragment = self.cache.get_fragment(key)
+            if fragment is not None:
+                blocks = (tarinfo.size + tarfile.BLOCKSIZE - 1) // \
+                    tarfile.BLOCKSIZE
+                self.fragments.write_fragment(
+                    fragment, len(header) + blocks * tarfile.BLOCKSIZE)
+                self.tar.offset = self.fragments.tell()
+            else:
+                md5 = hashlib.md5()
+                with self.cache.new_fragment(key, st) as capture, \
+                        open(path, "rb") as f:
+                    self.fragments.begin_fragment(capture)
+                    self.tar.addfile(tarinfo, HashingReader(f, md5))
+                    self.fragments.end_fragment()
+                digest = md5.hexdigest()
+        if self.cache is not None:
+            self.cache.store(path, st, digest)
+        return digest
+
+    def add(self, path, arcname):
+        st = os.lstat(path)
+        rel_path = os.path.relpath(arcname, ".")
+        if rel_path == self.exclude:
+            # Not shipped in the data area, but still part of the tree.
+            self.installed_bytes += st.st_size
+            return
+        if stat.S_ISDIR(st.st_mode) and arcname in self._seen_arcnames:
+            # Another file_map entry already supplied this directory.
+            tarinfo = None
+        else:
+            tarinfo = self.tar.gettarinfo(path, arcname)
+            if tarinfo is not None:
+                tarinfo = self.filter(tarinfo)
+            if tarinfo is None:
+                return
+            self._seen_arcnames.add(arcname)
+            self.installed_bytes += st.st_size
+
+        if tarinfo is not None and tarinfo.type == tarfile.LNKTYPE:
+            # Store hard links as independent copies, as a staged copy of
+            # the tree would.
+            tarinfo.type = tarfile.REGTYPE
+            tarinfo.linkname = ""
+            tarinfo.size = st.st_size
+
+        if stat.S_ISREG(st.st_mode):
+            digest = self._add_regular(path, st, tarinfo)
+            self.md5sums.append((rel_path, digest))
+        elif stat.S_ISDIR(st.st_mode):
+            if tarinfo is not None:
+                self.tar.addfile(tarinfo)
+            names = sorted(os.listdir(path))
+            ignored = self._ignored(names)
+            for name in names:
+                if name not in ignored:
+                    self.add(
+                        os.path.join(path, name), os.path.join(arcname, name))
+        else:
+            self.tar.addfile(tarinfo)
+            if stat.S_ISLNK(st.st_mode) and os.path.isfile(path):
+                digest = self._md5_file(path, os.stat(path))
+                self.md5sums.append((rel_path, digest))
+
+    @property
+    def installed_size(self):
+        """Installed size in KiB, rounded up as "du -k" would."""
+        return (self.installed_bytes + 1023) // 1024
+
+
 class ClickBuilderBase:
     def __init__(self):
         self.file_map = {}
@@ -169,6 +438,15 @@ class ClickBuilderBase:
 
 class ClickBuilder(ClickBuilderBase):
 
+    def __init__(self):
+        super(ClickBuilder, self).__init__()
+        # Number of threads used to compress the data member.
+        self.jobs = 1
+        # One of the keys of compressions.
+        self.compression = "gzip"
+        # Directory for an incremental BuildCache, or None.
+        self.cache_dir = None
+
     def list_files(self, root_path):
         for dirpath, _, filenames in os.walk(root_path):
             rel_dirpath = os.path.relpath(dirpath, root_path)
@@ -183,13 +461,72 @@ class ClickBuilder(ClickBuilderBase):
             return None
         return tarinfo
 
+    @property
+    def data_member_name(self):
+        try:
+            return "data.tar.%s" % compressions[self.compression]
+        except KeyError:
+            raise ClickBuildError(
+                "Unknown compression method '%s'" % self.compression)
+
+    @contextlib.contextmanager
+    def _open_data_tar(self, data_tar_path):
+        if self.compression == "xz":
+            with contextlib.closing(FakerootTarFile.open(
+                    name=data_tar_path, mode="w:xz", format=tarfile.GNU_FORMAT
+                    )) as data_tar:
+                yield data_tar
+        elif self.compression == "zstd":
+            with open(data_tar_path, "wb") as raw:
+                try:
+                    zstd = subprocess.Popen(
+                        ["zstd", "-q", "-T%d" % self.jobs, "-c"],
+                        stdin=subprocess.PIPE, stdout=raw)
+                except OSError as e:
+                    raise ClickBuildError(
+                        "Cannot run zstd for zstd compression: %s" % e)
+                try:
+                    with contextlib.closing(FakerootTarFile.open(
+                            fileobj=zstd.stdin, mode="w|",
+                            format=tarfile.GNU_FORMAT)) as data_tar:
+                        yield data_tar
+                finally:
+                    zstd.stdin.close()
+                    returncode = zstd.wait()
+            if returncode != 0:
+                raise ClickBuildError(
+                    "zstd exited with status %d" % returncode)
+        elif self.cache_dir is not None:
+            if self.jobs > 1:
+                logging.warning(
+                    "Compressing on a single thread, as cached data cannot "
+                    "be compressed in parallel")
+            with open(data_tar_path, "wb") as raw, \
+                    FragmentedGzipWriter(raw) as compressed, \
+                    contextlib.closing(FakerootTarFile(
+                        fileobj=compressed, mode="w",
+                        format=tarfile.GNU_FORMAT)) as data_tar:
+                yield data_tar
+        elif self.jobs <= 1:
+            with contextlib.closing(FakerootTarFile.open(
+                    name=data_tar_path, mode="w:gz", format=tarfile.GNU_FORMAT
+                    )) as data_tar:
+                yield data_tar
+        else:
+            with open(data_tar_path, "wb") as raw, \
+                    ParallelGzipWriter(raw, jobs=self.jobs) as compressed, \
+                    contextlib.closing(FakerootTarFile.open(
+                        fileobj=compressed, mode="w|",
+                        format=tarfile.GNU_FORMAT)) as data_tar:
+                yield data_tar
+
     def _pack(self, temp_dir, control_dir, data_dir, package_path):
-        data_tar_path = os.path.join(temp_dir, "data.tar.gz")
-        with contextlib.closing(FakerootTarFile.open(
-                name=data_tar_path, mode="w:gz", format=tarfile.GNU_FORMAT
-                )) as data_tar:
+        data_tar_path = os.path.join(temp_dir, self.data_member_name)
+        with self._open_data_tar(data_tar_path) as data_tar:
             data_tar.add(data_dir, arcname="./", filter=self._filter_dot_click)
+        self._pack_tars(temp_dir, control_dir, data_tar_path, package_path)
 
+    def _pack_tars(self, temp_dir, control_dir, data_tar_path, package_path):
         control_tar_path = os.path.join(temp_dir, "control.tar.gz")
         control_tar = tarfile.open(
             name=control_tar_path, mode="w:gz", format=tarfile.GNU_FORMAT)
@@ -202,7 +539,7 @@ class ClickBuilder(ClickBuilderBase):
             package.add_data(
                 "_click-binary", ("%s\n" % spec_version).encode("UTF-8"))
             package.add_file("control.tar.gz", control_tar_path)
-            package.add_file("data.tar.gz", data_tar_path)
+            package.add_file(self.data_member_name, data_tar_path)
 
     def _validate_framework(self, framework_string):
         """Apply policy checks to framework declarations."""
@@ -212,38 +549,74 @@ class ClickBuilder(ClickBuilderBase):
         except ClickFrameworkInvalid as e:
             raise ClickBuildError(str(e))
 
+    def _file_map_items(self):
+        """Yield (source_path, relative dest_path) pairs in a stable order."""
+        items = []
+        for source_path, dest_path in self.file_map.items():
+            dest_path = os.path.normpath(dest_path.lstrip("/") or ".")
+            items.append((dest_path, source_path))
+        for dest_path, source_path in sorted(items):
+            yield source_path, dest_path
+
+    def _find_source(self, rel_path):
+        """Find the source file that will appear at rel_path in the data."""
+        rel_path = os.path.normpath(rel_path)
+        for source_path, dest_path in self._file_map_items():
+            if dest_path == ".":
+                candidate = os.path.join(source_path, rel_path)
+            elif rel_path.startswith(dest_path + "/"):
+                candidate = os.path.join(
+                    source_path, rel_path[len(dest_path) + 1:])
+            else:
+                continue
+            if os.path.lexists(candidate):
+                return candidate
+        return None
+
     def build(self, dest_dir, manifest_path="manifest.json"):
         with make_temp_dir() as temp_dir:
-            # Prepare data area.
-            root_path = os.path.join(temp_dir, "data")
-
-            for source_path, dest_path in self.file_map.items():
-                if dest_path.startswith("/"):
-                    dest_path = dest_path[1:]
-                real_dest_path = os.path.join(root_path, dest_path)
-                shutil.copytree(
-                    source_path, real_dest_path, symlinks=True,
-                    ignore=shutil.ignore_patterns(*self._ignore_patterns))
-
             # Prepare control area.
             control_dir = os.path.join(temp_dir, "DEBIAN")
             osextras.ensuredir(control_dir)
 
             if os.path.isabs(manifest_path):
                 full_manifest_path = manifest_path
+                exclude = None
             else:
-                full_manifest_path = os.path.join(root_path, manifest_path)
+                exclude = os.path.normpath(manifest_path)
+                full_manifest_path = self._find_source(exclude)
+                if full_manifest_path is None:
+                    raise ClickBuildError(
+                        "Cannot find %s in the files to be packaged" %
+                        manifest_path)
             self.read_manifest(full_manifest_path)
             if "framework" in self.manifest:
                 self._validate_framework(self.manifest["framework"])
 
-            du_output = subprocess.check_output(
-                ["du", "-k", "-s", "--apparent-size", "."],
-                cwd=temp_dir, universal_newlines=True).rstrip("\n")
-            match = re.match(r"^(\d+)\s+\.$", du_output)
-            if not match:
-                raise Exception("du gave unexpected output '%s'" % du_output)
-            installed_size = match.group(1)
+            # Stream the data area straight from the source tree; the
+            # manifest goes in the control area instead.
+            data_tar_path = os.path.join(temp_dir, self.data_member_name)
+            if self.cache_dir is not None:
+                cache = BuildCache(self.cache_dir, self.file_map)
+            else:
+                cache = None
+            with self._open_data_tar(data_tar_path) as data_tar:
+                writer = DataTarWriter(
+                    data_tar, self._ignore_patterns, self._filter_dot_click,
+                    exclude=exclude, cache=cache)
+                for source_path, dest_path in self._file_map_items():
+                    arcname = "./"
+                    if dest_path != ".":
+                        writer.add_directory(arcname)
+                        for component in dest_path.split("/")[:-1]:
+                            arcname = os.path.join(arcname, component)
+                            writer.add_directory(arcname)
+                        arcname = os.path.join("./", dest_path)
+                    writer.add(source_path, arcname)
+            if cache is not None:
+                cache.save()
+
+            installed_size = str(writer.installed_size)
             self.manifest["installed-size"] = installed_size
             control_path = os.path.join(control_dir, "control")
             osextras.ensuredir(os.path.dirname(control_path))
@@ -270,23 +643,12 @@ class ClickBuilder(ClickBuilderBase):
                         self.manifest, ensure_ascii=False, sort_keys=True,
                         indent=4, separators=(",", ": ")),
                     file=manifest)
-            os.unlink(full_manifest_path)
             os.chmod(real_manifest_path, 0o644)
 
             md5sums_path = os.path.join(control_dir, "md5sums")
             with open(md5sums_path, "w") as md5sums:
-                for path in sorted(self.list_files(root_path)):
-                    md5 = hashlib.md5()
-                    p = os.path.join(root_path, path)
-                    if not os.path.exists(p):
-                        continue
-                    with open(p, "rb") as f:
-                        while True:
-                            buf = f.read(16384)
-                            if not buf:
-                                break
-                            md5.update(buf)
-                    print("%s  %s" % (md5.hexdigest(), path), file=md5sums)
+                for path, digest in sorted(writer.md5sums):
+                    print("%s  %s" % (digest, path), file=md5sums)
 
             preinst_path = os.path.join(control_dir, "preinst")
             with open(preinst_path, "w") as preinst:
@@ -296,7 +658,7 @@ class ClickBuilder(ClickBuilderBase):
             package_name = "%s_%s_%s.click" % (
                 self.name, self.epochless_version, self.architecture)
             package_path = os.path.join(dest_dir, package_name)
-            self._pack(temp_dir, control_dir, root_path, package_path)
+            self._pack_tars(temp_dir, control_dir, data_tar_path, package_path)
             return package_path
 
 
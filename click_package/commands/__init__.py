@@ -19,10 +19,12 @@ import importlib
 
 
 all_commands = (
+    "app-id",
     "build",
     "buildsource",
     "chroot",
     "contents",
+    "delta",
     "desktophook",
     "framework",
     "hook",
@@ -31,6 +33,7 @@ all_commands = (
     "list",
     "pkgdir",
     "register",
+    "serve",
     "unregister",
     "verify",
     )
@@ -41,8 +44,33 @@ hidden_commands = (
     )
 
 
+# The first line of each visible command module's docstring, so that the
+# usage message can be shown without importing every command.
+descriptions = {
+    "app-id":
+        "Print the application ID of an app in an installed Click package.",
+    "build": "Build a Click package.",
+    "buildsource": "Build a Click source package.",
+    "chroot": "Use and manage a Click chroot.",
+    "contents": "Show the file-list contents of a Click package file.",
+    "delta": "Build a delta update between two versions of a Click package.",
+    "framework": "List available frameworks.",
+    "hook": "Install or remove a Click system hook.",
+    "info": "Show manifest information for a Click package.",
+    "install": "Install a Click package (low-level; consider pkcon instead).",
+    "list": "List installed Click packages.",
+    "pkgdir": "Print the directory where a Click package is unpacked.",
+    "register": "Register an installed Click package for a user.",
+    "serve":
+        "Answer queries from other click commands in a long-running process.",
+    "unregister": "Unregister an installed Click package for a user.",
+    "verify": "Verify a Click package.",
+    }
+
+
 def load_command(command):
-    return importlib.import_module("click_package.commands.%s" % command)
+    return importlib.import_module(
+        "click_package.commands.%s" % command.replace("-", "_"))
 
 
 def help_text():
@@ -50,6 +78,5 @@ def help_text():
     for command in all_commands:
         if command in hidden_commands:
             continue
-        mod = load_command(command)
-        lines.append("  %-21s %s" % (command, mod.__doc__.splitlines()[0]))
+        lines.append("  %-21s %s" % (command, descriptions[command]))
     return "\n".join(lines)
@@ -0,0 +1,75 @@
+# Copyright (C) 2026 UBports Foundation
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; version 3 of the License.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Print the application ID of an app in an installed Click package."""
+
+from __future__ import print_function
+
+from optparse import OptionParser
+import sys
+
+from gi.repository import Click
+
+from click_package.json_helpers import load_manifest
+
+
+def get_app_id(registry, package_name, app_name=None):
+    """Return the full application ID of an app registered for a user.
+
+    If app_name is None, the package must contain exactly one app.
+    """
+    version = registry.get_version(package_name)
+    manifest = load_manifest(registry, package_name)
+    app_names = sorted(manifest.get("hooks", {}))
+    if app_name is None:
+        if not app_names:
+            raise Exception("%s has no apps" % package_name)
+        elif len(app_names) > 1:
+            raise Exception(
+                "%s has %d apps; specify one of: %s" %
+                (package_name, len(app_names), " ".join(app_names)))
+        app_name = app_names[0]
+    elif app_name not in app_names:
+        raise Exception("%s has no app named %s" % (package_name, app_name))
+    if "_" in app_name or "/" in app_name:
+        raise Exception(
+            "Application name '%s' may not contain _ or / characters" %
+            app_name)
+    return "%s_%s_%s" % (package_name, app_name, version)
+
+
+def run(argv, db=None):
+    parser = OptionParser("%prog app-id [options] PACKAGE-NAME [APP-NAME]")
+    parser.add_option(
+        "--root", metavar="PATH", help="look for additional packages in PATH")
+    parser.add_option(
+        "--user", metavar="USER",
+        help="look up PACKAGE-NAME for USER (if you have permission; "
+             "default: current user)")
+    options, args = parser.parse_args(argv)
+    if len(args) < 1:
+        parser.error("need package name")
+    try:
+        if db is None:
+            db = Click.DB()
+            db.read(db_dir=None)
+        if options.root is not None:
+            db.add(options.root)
+        registry = Click.User.for_user(db, name=options.user)
+        print(get_app_id(
+            registry, args[0], app_name=args[1] if len(args) > 1 else None))
+    except Exception as e:
+        print(e, file=sys.stderr)
+        return 1
+    return 0
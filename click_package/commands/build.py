@@ -23,7 +23,7 @@ import sys
 import subprocess
 
 from gi.repository import Click
-from click_package.build import ClickBuildError, ClickBuilder
+from click_package.build import ClickBuildError, ClickBuilder, compressions
 
 
 def run(argv):
@@ -37,7 +37,22 @@ def run(argv):
     parser.add_option(
         "-I", "--ignore", metavar="file-pattern", action='append', default=[],
         help="Ignore the given pattern when building the package")
+    parser.add_option(
+        "-j", "--jobs", metavar="N", type="int", default=1,
+        help="compress the package data using N threads (default: 1)")
+    parser.add_option(
+        "--compression", metavar="METHOD", type="choice",
+        choices=sorted(compressions), default="gzip",
+        help=(
+            "compress the package data using METHOD (%s; default: gzip)" %
+            ", ".join(sorted(compressions))))
+    parser.add_option(
+        "--cache-dir", metavar="PATH",
+        help="reuse md5 sums and compressed files from earlier builds, "
+             "cached in PATH")
     options, args = parser.parse_args(argv)
+    if options.jobs < 1:
+        parser.error("--jobs must be at least 1")
     if len(args) < 1:
         parser.error("need directory")
     directory = args[0]
@@ -50,6 +65,9 @@ def run(argv):
             'directory "%s" does not contain manifest file "%s"' %
             (directory, options.manifest))
     builder = ClickBuilder()
+    builder.jobs = options.jobs
+    builder.compression = options.compression
+    builder.cache_dir = options.cache_dir
     builder.add_file(directory, "./")
     for ignore in options.ignore:
         builder.add_ignore_pattern(ignore)
@@ -17,8 +17,57 @@
 
 from __future__ import print_function
 
+from contextlib import closing
 from optparse import OptionParser
-import subprocess
+import stat
+import sys
+import tarfile
+import time
+
+
+_type_chars = {
+    tarfile.DIRTYPE: "d",
+    tarfile.SYMTYPE: "l",
+    tarfile.LNKTYPE: "h",
+    tarfile.CHRTYPE: "c",
+    tarfile.BLKTYPE: "b",
+    tarfile.FIFOTYPE: "p",
+    }
+
+
+class ContentsLister:
+    """Format data entries as dpkg-deb -c (that is, GNU tar -tv) does."""
+
+    def __init__(self):
+        # GNU tar widens this column as needed, and never narrows it.
+        self.ugswidth = 18
+
+    def format(self, tarinfo):
+        # stat.filemode only knows the file type from the mode bits, which
+        # tar keeps separately.
+        permissions = stat.filemode(tarinfo.mode & 0o7777)[1:]
+        modes = _type_chars.get(tarinfo.type, "-") + permissions
+        user = tarinfo.uname or str(tarinfo.uid)
+        group = tarinfo.gname or str(tarinfo.gid)
+        if tarinfo.ischr() or tarinfo.isblk():
+            size = "%d,%d" % (tarinfo.devmajor, tarinfo.devminor)
+        else:
+            size = str(tarinfo.size)
+        pad = len(user) + 1 + len(group) + len(size)
+        self.ugswidth = max(self.ugswidth, pad)
+        name = tarinfo.name
+        # tarfile strips the trailing slash from directory names.
+        if tarinfo.isdir() and not name.endswith("/"):
+            name += "/"
+        line = "%s %s/%s %*s %s %s" % (
+            modes, user, group, self.ugswidth - pad + len(size), size,
+            time.strftime("%Y-%m-%d %H:%M", time.localtime(tarinfo.mtime)),
+            name)
+        if tarinfo.issym():
+            line += " -> %s" % tarinfo.linkname
+        elif tarinfo.islnk():
+            line += " link to %s" % tarinfo.linkname
+        return line
 
 
 def run(argv):
@@ -27,5 +76,14 @@ def run(argv):
     if len(args) < 1:
         parser.error("need file name")
     path = args[0]
-    subprocess.check_call(["dpkg-deb", "-c", path])
+    # Deferred, since this pulls in python-debian.
+    from click_package.install import ClickPackage
+    lister = ContentsLister()
+    try:
+        with closing(ClickPackage(path)) as package:
+            for tarinfo, _ in package.data_members():
+                print(lister.format(tarinfo))
+    except Exception as e:
+        print("Failed to read %s: %s" % (path, e), file=sys.stderr)
+        return 1
     return 0
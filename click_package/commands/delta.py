@@ -0,0 +1,43 @@
+# Copyright (C) 2026 UBports Foundation
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; version 3 of the License.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Build a delta update between two versions of a Click package."""
+
+from __future__ import print_function
+
+from optparse import OptionParser
+import sys
+
+from click_package.delta import ClickDeltaBuilder, ClickDeltaError
+
+
+def run(argv):
+    parser = OptionParser(
+        "%prog delta [options] OLD-PACKAGE-FILE NEW-PACKAGE-FILE")
+    parser.add_option(
+        "-o", "--output-dir", metavar="DIRECTORY", default=".",
+        help="write the delta to DIRECTORY (default: current directory)")
+    options, args = parser.parse_args(argv)
+    if len(args) < 2:
+        parser.error("need old and new package file names")
+    builder = ClickDeltaBuilder(args[0], args[1])
+    try:
+        path = builder.build(options.output_dir)
+    except ClickDeltaError as e:
+        print(e, file=sys.stderr)
+        return 1
+    print("Successfully built delta in '%s' (%d unchanged files, %d bytes, "
+          "taken from the old version)." % (
+              path, builder.reused_files, builder.reused_bytes))
+    return 0
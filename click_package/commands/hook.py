@@ -38,8 +38,8 @@ def run(argv):
 
           install HOOK
           remove HOOK
-          run-system
-          run-user [--user=USER]"""))
+          run-system [--jobs=N]
+          run-user [--user=USER] [--jobs=N]"""))
     parser.add_option(
         "--root", metavar="PATH", help="look for additional packages in PATH")
     parser.add_option(
@@ -47,7 +47,14 @@ def run(argv):
         help=(
             "run user-level hooks for USER (default: current user; only "
             "applicable to run-user)"))
+    parser.add_option(
+        "-j", "--jobs", metavar="N", type="int", default=1,
+        help=(
+            "run the commands of up to N hooks at once (default: 1; only "
+            "applicable to run-system and run-user)"))
     options, args = parser.parse_args(argv)
+    if options.jobs < 1:
+        parser.error("--jobs must be at least 1")
     if len(args) < 1:
         parser.error("need subcommand (install, remove, run-system, run-user)")
     subcommand = args[0]
@@ -67,7 +74,7 @@ def run(argv):
         if options.root is not None:
             db.add(options.root)
         try:
-            Click.run_system_hooks(db)
+            Click.run_system_hooks_parallel(db, options.jobs)
         except GLib.GError as e:
             if e.domain == "click_hooks_error-quark":
                 print(e.message, file=sys.stderr)
@@ -80,7 +87,7 @@ def run(argv):
         if options.root is not None:
             db.add(options.root)
         try:
-            Click.run_user_hooks(db, user_name=options.user)
+            Click.run_user_hooks_parallel(db, options.user, options.jobs)
         except GLib.GError as e:
             if e.domain == "click_hooks_error-quark":
                 print(e.message, file=sys.stderr)
@@ -19,6 +19,7 @@ from __future__ import print_function
 
 from contextlib import closing
 import glob
+import io
 import json
 from optparse import OptionParser
 import os
@@ -26,8 +27,7 @@ import sys
 
 from gi.repository import Click
 
-from click_package.install import DebFile
-from click_package.json_helpers import json_object_to_python
+from click_package.json_helpers import load_manifest
 
 
 def _load_manifest(manifest_file):
@@ -39,20 +39,23 @@ def _load_manifest(manifest_file):
     return manifest
 
 
-def get_manifest(options, arg):
+def get_manifest(options, arg, db=None):
     if "/" not in arg:
-        db = Click.DB()
-        db.read(db_dir=None)
+        if db is None:
+            db = Click.DB()
+            db.read(db_dir=None)
         if options.root is not None:
             db.add(options.root)
         registry = Click.User.for_user(db, name=options.user)
         if registry.has_package_name(arg):
-            return json_object_to_python(registry.get_manifest(arg))
+            return load_manifest(registry, arg)
 
+    # Deferred, since this pulls in python-debian.
+    from click_package.install import ClickPackage
     try:
-        with closing(DebFile(filename=arg)) as package:
-            with package.control.get_file(
-                    "manifest", encoding="UTF-8") as manifest_file:
+        with closing(ClickPackage(arg)) as package:
+            with io.StringIO(package.control_files["manifest"].decode(
+                    "UTF-8")) as manifest_file:
                 return _load_manifest(manifest_file)
     except Exception:
         pkgdir = Click.find_package_directory(arg)
@@ -65,7 +68,7 @@ def get_manifest(options, arg):
             return _load_manifest(f)
 
 
-def run(argv):
+def run(argv, db=None):
     parser = OptionParser("%prog info [options] PATH")
     parser.add_option(
         "--root", metavar="PATH", help="look for additional packages in PATH")
@@ -77,7 +80,7 @@ def run(argv):
     if len(args) < 1:
         parser.error("need file name")
     try:
-        manifest = get_manifest(options, args[0])
+        manifest = get_manifest(options, args[0], db=db)
     except Exception as e:
         print(e, file=sys.stderr)
         return 1
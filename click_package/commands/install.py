@@ -17,7 +17,7 @@
 
 from __future__ import print_function
 
-from optparse import OptionParser
+from optparse import OptionParser, SUPPRESS_HELP
 import sys
 from textwrap import dedent
 
@@ -28,7 +28,7 @@ from click_package.install import ClickInstaller, ClickInstallerError
 
 def run(argv):
     parser = OptionParser(dedent("""\
-        %prog install [options] PACKAGE-FILE
+        %prog install [options] PACKAGE-FILE [PACKAGE-FILE...]
 
         This is a low-level tool; to install a package as an ordinary user
         you should generally use "pkcon install-local PACKAGE-FILE"
@@ -46,20 +46,51 @@ def run(argv):
     parser.add_option(
         "--allow-unauthenticated", default=False, action="store_true",
         help="allow installing packages with no signatures")
+    parser.add_option(
+        "--single-pass", dest="single_pass", default=True,
+        action="store_true", help=SUPPRESS_HELP)
+    parser.add_option(
+        "--use-dpkg", dest="single_pass", action="store_false",
+        help="audit the package data and then unpack it using dpkg, rather "
+             "than in a single pass")
+    parser.add_option(
+        "--link-unchanged", default=False, action="store_true",
+        help="when upgrading, link files that have not changed from the "
+             "previous version rather than writing them again")
+    parser.add_option(
+        "-j", "--jobs", metavar="N", type="int", default=None,
+        help="when installing several packages, audit up to N at once "
+             "(default: the number of CPUs)")
     parser.add_option(
         "--verbose", default=False, action="store_true",
         help="be more verbose on install")
     options, args = parser.parse_args(argv)
+    if options.jobs is not None and options.jobs < 1:
+        parser.error("--jobs must be at least 1")
+    if options.link_unchanged and not options.single_pass:
+        parser.error("--link-unchanged cannot be used with --use-dpkg")
     if len(args) < 1:
         parser.error("need package file name")
     db = Click.DB()
     db.read(db_dir=None)
     if options.root is not None:
         db.add(options.root)
-    package_path = args[0]
     installer = ClickInstaller(
         db=db, force_missing_framework=options.force_missing_framework,
-        allow_unauthenticated=options.allow_unauthenticated)
+        allow_unauthenticated=options.allow_unauthenticated,
+        single_pass=options.single_pass,
+        link_unchanged=options.link_unchanged)
+    if len(args) > 1:
+        # The error names the package that failed.
+        try:
+            installer.install_many(
+                args, user=options.user, all_users=options.all_users,
+                quiet=not options.verbose, jobs=options.jobs)
+        except ClickInstallerError as e:
+            print("Cannot install %s" % e, file=sys.stderr)
+            return 1
+        return 0
+    package_path = args[0]
     try:
         installer.install(
             package_path, user=options.user, all_users=options.all_users,
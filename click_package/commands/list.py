@@ -23,22 +23,23 @@ import sys
 
 from gi.repository import Click
 
-from click_package.json_helpers import json_array_to_python
+from click_package.json_helpers import load_manifests
 
 
-def list_packages(options):
-    db = Click.DB()
-    db.read(db_dir=None)
+def list_packages(options, db=None):
+    if db is None:
+        db = Click.DB()
+        db.read(db_dir=None)
     if options.root is not None:
         db.add(options.root)
     if options.all:
-        return json_array_to_python(db.get_manifests(all_versions=True))
+        return load_manifests(db, all_versions=True)
     else:
         registry = Click.User.for_user(db, name=options.user)
-        return json_array_to_python(registry.get_manifests())
+        return load_manifests(registry)
 
 
-def run(argv):
+def run(argv, db=None):
     parser = OptionParser("%prog list [options]")
     parser.add_option(
         "--root", metavar="PATH", help="look for additional packages in PATH")
@@ -52,7 +53,7 @@ def run(argv):
         "--manifest", default=False, action="store_true",
         help="format output as a JSON array of manifests")
     options, _ = parser.parse_args(argv)
-    json_output = list_packages(options)
+    json_output = list_packages(options, db=db)
     if options.manifest:
         json.dump(
             json_output, sys.stdout, ensure_ascii=False, sort_keys=True,
@@ -24,7 +24,7 @@ import sys
 from gi.repository import Click
 
 
-def run(argv):
+def run(argv, db=None):
     parser = OptionParser("%prog pkgdir [options] {PACKAGE-NAME|PATH}")
     parser.add_option(
         "--root", metavar="PATH", help="look for additional packages in PATH")
@@ -39,8 +39,9 @@ def run(argv):
         if "/" in args[0]:
             print(Click.find_package_directory(args[0]))
         else:
-            db = Click.DB()
-            db.read(db_dir=None)
+            if db is None:
+                db = Click.DB()
+                db.read(db_dir=None)
             if options.root is not None:
                 db.add(options.root)
             package_name = args[0]
@@ -0,0 +1,262 @@
+# Copyright (C) 2026 UBports Foundation
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; version 3 of the License.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Answer queries from other click commands in a long-running process."""
+
+from __future__ import print_function
+
+from contextlib import closing
+import io
+from optparse import OptionParser
+import os
+import socket
+import struct
+import sys
+from textwrap import dedent
+
+from gi.repository import Click
+
+from click_package import osextras
+from click_package.commands import load_command
+from click_package.serve import (
+    forwardable,
+    receive_message,
+    send_message,
+    served_commands,
+    socket_path,
+    )
+
+
+# A client that takes longer than this to send its query is dropped.
+REQUEST_TIMEOUT = 10
+# Bound the number of query results kept.
+MAX_CACHED_RESULTS = 256
+# The first file descriptor passed by systemd socket activation.
+SD_LISTEN_FDS_START = 3
+
+
+def _listdir(directory):
+    try:
+        return sorted(osextras.listdir_force(directory))
+    except OSError:
+        return []
+
+
+def _stamp(paths):
+    stamp = []
+    for path in paths:
+        try:
+            st = os.lstat(path)
+        except OSError:
+            stamp.append((path, None))
+        else:
+            stamp.append((path, st.st_dev, st.st_ino, st.st_mtime_ns))
+    return stamp
+
+
+class ClickServer:
+    """Run served commands against a long-lived database.
+
+    Query results are cached until the database configuration or anything
+    that could change them is modified: installing or removing a version
+    of a package modifies that package's directory, and registering or
+    unregistering modifies a user's registration directory.  Checking
+    this takes a few stat calls per package, which is much cheaper than
+    starting click again.
+    """
+
+    def __init__(self, sock, idle_timeout=None):
+        self.sock = sock
+        self.idle_timeout = idle_timeout
+        self.db = None
+        self._config_stamp = None
+        self._stamp = None
+        self._results = {}
+
+    def _config_paths(self):
+        db_dir = Click.get_db_dir()
+        return [db_dir] + [
+            os.path.join(db_dir, name) for name in _listdir(db_dir)]
+
+    def _database_paths(self):
+        paths = []
+        for i in range(self.db.props.size):
+            root = self.db.get(i).props.root
+            users = os.path.join(root, ".click", "users")
+            paths.append(root)
+            paths.append(users)
+            paths.extend(os.path.join(users, name) for name in _listdir(users))
+            paths.extend(
+                os.path.join(root, name) for name in _listdir(root)
+                if name != ".click")
+        return paths
+
+    def _refresh(self):
+        config_stamp = _stamp(self._config_paths())
+        if config_stamp != self._config_stamp:
+            db = Click.DB()
+            db.read(db_dir=None)
+            self.db = db
+            self._config_stamp = config_stamp
+            self._stamp = None
+        stamp = _stamp(self._database_paths())
+        if stamp != self._stamp or len(self._results) >= MAX_CACHED_RESULTS:
+            self._results = {}
+            self._stamp = stamp
+
+    def _cacheable(self, argv, cwd):
+        # Arguments that might name files are resolved relative to the
+        # client's working directory, and the files might change.
+        for arg in argv[1:]:
+            if arg.startswith("-"):
+                continue
+            if "/" in arg or os.path.lexists(os.path.join(cwd, arg)):
+                return False
+        return True
+
+    def run_command(self, argv, cwd):
+        """Run argv as click would and return the reply to send."""
+        self._refresh()
+        key = tuple(argv)
+        cacheable = self._cacheable(argv, cwd)
+        if cacheable and key in self._results:
+            return self._results[key]
+        os.chdir(cwd)
+        stdout = io.StringIO()
+        stderr = io.StringIO()
+        old_stdout, old_stderr = sys.stdout, sys.stderr
+        sys.stdout, sys.stderr = stdout, stderr
+        try:
+            try:
+                status = load_command(argv[0]).run(argv[1:], db=self.db)
+            except SystemExit as e:
+                # OptionParser exits for --help and for usage errors.
+                if e.code is None:
+                    status = 0
+                elif isinstance(e.code, int):
+                    status = e.code
+                else:
+                    print(e.code, file=sys.stderr)
+                    status = 1
+        finally:
+            sys.stdout, sys.stderr = old_stdout, old_stderr
+        reply = {
+            "status": status,
+            "stdout": stdout.getvalue(),
+            "stderr": stderr.getvalue(),
+            }
+        if cacheable:
+            self._results[key] = reply
+        return reply
+
+    def _peer_allowed(self, conn):
+        # The socket lives in the user's private runtime directory, but
+        # check anyway: queries must be answered with the client's own
+        # privileges.
+        if not hasattr(socket, "SO_PEERCRED"):
+            return True
+        ucred = struct.Struct("3i")
+        _, uid, _ = ucred.unpack(conn.getsockopt(
+            socket.SOL_SOCKET, socket.SO_PEERCRED, ucred.size))
+        return uid == os.getuid()
+
+    def handle(self, conn):
+        conn.settimeout(REQUEST_TIMEOUT)
+        reply = {"status": None}
+        try:
+            if not self._peer_allowed(conn):
+                return
+            request = receive_message(conn)
+            argv = request["argv"]
+            if forwardable(argv):
+                reply = self.run_command(argv, request["cwd"])
+        except Exception as e:
+            # The client runs the command itself instead.
+            print("Failed to answer query: %s" % e, file=sys.stderr)
+        try:
+            send_message(conn, reply)
+        except OSError:
+            pass
+
+    def serve_forever(self):
+        self.sock.settimeout(self.idle_timeout)
+        while True:
+            try:
+                conn, _ = self.sock.accept()
+            except socket.timeout:
+                return
+            with closing(conn):
+                self.handle(conn)
+
+
+def _activated_socket():
+    """Return the socket passed by systemd socket activation, if any."""
+    if os.environ.get("LISTEN_PID") != str(os.getpid()):
+        return None
+    if int(os.environ.get("LISTEN_FDS", "0")) < 1:
+        return None
+    for name in ("LISTEN_PID", "LISTEN_FDS", "LISTEN_FDNAMES"):
+        os.environ.pop(name, None)
+    return socket.socket(
+        socket.AF_UNIX, socket.SOCK_STREAM, fileno=SD_LISTEN_FDS_START)
+
+
+def _listen(path):
+    with closing(socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)) as probe:
+        try:
+            probe.connect(path)
+        except OSError:
+            pass
+        else:
+            raise OSError("click serve is already running on %s" % path)
+    directory = os.path.dirname(path)
+    if not os.path.isdir(directory):
+        os.makedirs(directory, 0o700)
+    osextras.unlink_force(path)
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.bind(path)
+    os.chmod(path, 0o600)
+    sock.listen(16)
+    return sock
+
+
+def run(argv):
+    commands = ", ".join(
+        '"click %s"' % command for command in served_commands)
+    parser = OptionParser(dedent("""\
+        %%prog serve [options]
+
+        Answer %s queries from other click processes over a socket in
+        $XDG_RUNTIME_DIR, keeping the Click database and recent results in
+        memory.  Normally started by socket activation.""") % commands)
+    parser.add_option(
+        "--idle-timeout", metavar="SECONDS", type="int", default=None,
+        help="exit after SECONDS without queries (default: never)")
+    options, _ = parser.parse_args(argv)
+    if options.idle_timeout is not None and options.idle_timeout < 1:
+        parser.error("--idle-timeout must be at least 1")
+    sock = _activated_socket()
+    if sock is None:
+        path = socket_path()
+        if path is None:
+            print("XDG_RUNTIME_DIR is not set", file=sys.stderr)
+            return 1
+        try:
+            sock = _listen(path)
+        except OSError as e:
+            print(e, file=sys.stderr)
+            return 1
+    with closing(sock):
+        ClickServer(sock, idle_timeout=options.idle_timeout).serve_forever()
+    return 0
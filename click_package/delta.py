@@ -0,0 +1,147 @@
+# Copyright (C) 2026 UBports Foundation
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; version 3 of the License.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Building delta updates between versions of a Click package.
+
+A delta is laid out like a Click package: debian-binary, then a
+_click-delta member (in place of _click-binary) recording the base version
+as JSON, then the new version's control member unchanged, then a data
+member.  The data member lists every entry of the new version's data
+member in the same order, but any regular file whose contents, according to
+the two versions' md5sums, are already present in the base version is
+stored empty, with a PAX header naming the file in the base to take it
+from.  Since the control member, including md5sums, is carried over
+unchanged, the reconstructed files can all be verified on installation.
+"""
+
+from __future__ import print_function
+
+__metaclass__ = type
+__all__ = [
+    'ClickDeltaBuilder',
+    'ClickDeltaError',
+    ]
+
+
+import copy
+import json
+import os
+import re
+import tarfile
+
+from contextlib import closing
+
+from click_package.arfile import ArFile
+from click_package.build import make_temp_dir
+from click_package.install import ClickPackage, delta_member, delta_source
+
+
+class ClickDeltaError(Exception):
+    pass
+
+
+class ClickDeltaBuilder:
+    def __init__(self, old_path, new_path):
+        self.old_path = old_path
+        self.new_path = new_path
+        self.reused_files = 0
+        self.reused_bytes = 0
+
+    def _open(self, path):
+        try:
+            package = ClickPackage(path)
+        except Exception as e:
+            raise ClickDeltaError("Failed to read %s: %s" % (path, e))
+        if package.delta is not None:
+            package.close()
+            raise ClickDeltaError("%s is itself a delta" % path)
+        if "md5sums" not in package.control_files:
+            package.close()
+            raise ClickDeltaError("%s has no md5sums" % path)
+        return package
+
+    def _manifest(self, package):
+        try:
+            return json.loads(
+                package.control_files["manifest"].decode("UTF-8"))
+        except (KeyError, ValueError) as e:
+            raise ClickDeltaError(
+                "%s has no valid manifest: %s" % (package.path, e))
+
+    def _write_data(self, old, new, data_tar_path):
+        new_md5sums = new.md5sums()
+        old_by_digest = {}
+        for name, digest in sorted(old.md5sums().items()):
+            old_by_digest.setdefault(digest, []).append(name)
+        with closing(tarfile.open(
+                name=data_tar_path, mode="w:gz",
+                format=tarfile.PAX_FORMAT)) as tar:
+            for tarinfo, fileobj in new.data_members():
+                if fileobj is None:
+                    tar.addfile(tarinfo)
+                    continue
+                name = os.path.normpath(tarinfo.name)
+                sources = old_by_digest.get(new_md5sums.get(name), [])
+                if not sources:
+                    tar.addfile(tarinfo, fileobj)
+                    continue
+                source = name if name in sources else sources[0]
+                reference = copy.copy(tarinfo)
+                reference.pax_headers = dict(tarinfo.pax_headers)
+                reference.pax_headers[delta_source] = source
+                reference.size = 0
+                tar.addfile(reference)
+                self.reused_files += 1
+                self.reused_bytes += tarinfo.size
+
+    def build(self, dest_dir):
+        """Write a delta from the old to the new package into dest_dir.
+
+        Returns the path to the delta.
+        """
+        with closing(self._open(self.old_path)) as old, \
+                closing(self._open(self.new_path)) as new:
+            old_manifest = self._manifest(old)
+            new_manifest = self._manifest(new)
+            if old_manifest.get("name") != new_manifest.get("name"):
+                raise ClickDeltaError(
+                    "%s and %s are not versions of the same package" %
+                    (self.old_path, self.new_path))
+            old_version = old_manifest.get("version")
+            new_version = new_manifest.get("version")
+            if old_version == new_version:
+                raise ClickDeltaError(
+                    "%s and %s have the same version" %
+                    (self.old_path, self.new_path))
+
+            delta_name = "%s_%s_to_%s_%s.click-delta" % (
+                new_manifest["name"],
+                re.sub(r"^\d+:", "", old_version),
+                re.sub(r"^\d+:", "", new_version),
+                new.debcontrol().get("Architecture", "all"))
+            delta_path = os.path.join(dest_dir, delta_name)
+            control_name, control = new.raw_control()
+            with make_temp_dir() as temp_dir:
+                data_tar_path = os.path.join(temp_dir, "data.tar.gz")
+                self._write_data(old, new, data_tar_path)
+                with ArFile(name=delta_path, mode="w") as delta:
+                    delta.add_magic()
+                    delta.add_data("debian-binary", b"2.0\n")
+                    delta.add_data(
+                        delta_member,
+                        ("%s\n" % json.dumps(
+                            {"base-version": old_version})).encode("UTF-8"))
+                    delta.add_data(control_name, control)
+                    delta.add_file("data.tar.gz", data_tar_path)
+            return delta_path
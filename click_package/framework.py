@@ -19,14 +19,31 @@ import logging
 import os
 import re
 
-try:
-    import apt_pkg
-except:
-    pass
-
 import click_package.paths
 
 
+# None until the first import attempt, and False if that failed.
+_apt_pkg = None
+
+
+def _import_apt_pkg():
+    """Import apt_pkg on first use, since it is slow to load.
+
+    Returns None if apt_pkg is not available; "click build" is required to
+    work with only the Python standard library.
+    """
+    global _apt_pkg
+    if _apt_pkg is None:
+        try:
+            import apt_pkg
+        except ImportError:
+            _apt_pkg = False
+        else:
+            apt_pkg.init_system()
+            _apt_pkg = apt_pkg
+    return _apt_pkg or None
+
+
 class ClickFrameworkInvalid(Exception):
     pass
 
@@ -82,9 +99,8 @@ def click_framework_has_framework(framework_name):
 
 
 def validate_framework(framework_string, ignore_missing_frameworks=False):
-    try:
-        apt_pkg
-    except NameError:
+    apt_pkg = _import_apt_pkg()
+    if apt_pkg is None:
         logging.warning("No apt_pkg module, skipping validate_framework")
         return
 
@@ -26,27 +26,35 @@ __all__ = [
     ]
 
 
+import fcntl
+import fnmatch
 from functools import partial
-import grp
+import hashlib
 import inspect
 import json
 import logging
+from multiprocessing.pool import ThreadPool
 import os
-import pwd
+import re
 import shutil
 import stat
 import subprocess
 import sys
-import tempfile
+import tarfile
 from textwrap import dedent
+import threading
+import time
 
-from contextlib import closing
+from contextlib import closing, contextmanager
 
+from debian.deb822 import Deb822
 from debian.debfile import DebFile as _DebFile
 from debian.debian_support import Version
-from gi.repository import Click
+from gi.repository import Click, GLib
 
-from click_package.paths import preload_path
+from click_package.arfile import ArFile
+from click_package.paths import debsig_cache_dir, preload_path
+from click_package.pgzip import GzipMembersReader
 from click_package.preinst import static_preinst_matches
 from click_package.versions import spec_version
 
@@ -76,6 +84,114 @@ class DebsigVerifyError(Exception):
     pass
 
 
+class DebsigVerifyCache:
+    """Cache of successful debsig-verify results.
+
+    Entries are keyed by the SHA-256 digest of a package's contents, and
+    live in a subdirectory named after a digest of debsig-verify's
+    policies, keyrings and executable, so that changing any of those
+    invalidates every earlier result.  The cache is only trusted if it is
+    owned by root and writable by nobody else, and only root adds to it.
+    """
+
+    state_paths = ("/etc/debsig/policies", "/usr/share/debsig/keyrings")
+    owner = 0
+
+    def __init__(self, path=debsig_cache_dir):
+        self.path = path
+
+    def _trusted(self, path):
+        try:
+            st = os.lstat(path)
+        except OSError:
+            return False
+        return (
+            stat.S_ISDIR(st.st_mode) and st.st_uid == self.owner and
+            not st.st_mode & (stat.S_IWGRP | stat.S_IWOTH))
+
+    def _writable(self):
+        if os.geteuid() != self.owner:
+            return False
+        if os.path.exists(self.path):
+            return self._trusted(self.path) and os.access(self.path, os.W_OK)
+        return True
+
+    @property
+    def enabled(self):
+        return self._trusted(self.path) or self._writable()
+
+    def state_digest(self):
+        """Digest everything that can change debsig-verify's verdict."""
+        state = hashlib.sha256()
+        executable = shutil.which("debsig-verify")
+        if executable is not None:
+            st = os.stat(executable)
+            state.update(("%s %d %d %d\n" % (
+                executable, st.st_ino, st.st_size,
+                st.st_mtime_ns)).encode("UTF-8"))
+        for top in self.state_paths:
+            for dirpath, dirnames, filenames in os.walk(top):
+                dirnames.sort()
+                for filename in sorted(filenames):
+                    path = os.path.join(dirpath, filename)
+                    state.update(path.encode("UTF-8") + b"\0")
+                    try:
+                        with open(path, "rb") as f:
+                            state.update(
+                                hashlib.sha256(f.read()).digest())
+                    except IOError:
+                        state.update(b"unreadable")
+        return state.hexdigest()
+
+    def file_digest(self, path):
+        """Return (digest, stamp) for the contents of path.
+
+        The stamp changes whenever the file is modified or replaced, even
+        if its modification time is reset, since it includes the change
+        time.
+        """
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            stamp = self.file_stamp(f.fileno())
+            while True:
+                buf = f.read(1024 * 1024)
+                if not buf:
+                    break
+                digest.update(buf)
+        return digest.hexdigest(), stamp
+
+    def file_stamp(self, path_or_fd):
+        st = os.stat(path_or_fd)
+        return (st.st_dev, st.st_ino, st.st_size, st.st_mtime_ns,
+                st.st_ctime_ns)
+
+    def lookup(self, state, digest):
+        state_dir = os.path.join(self.path, state)
+        return (
+            self._trusted(self.path) and self._trusted(state_dir) and
+            os.path.exists(os.path.join(state_dir, digest)))
+
+    def store(self, state, digest):
+        if not self._writable():
+            return
+        try:
+            if not os.path.exists(self.path):
+                os.makedirs(self.path, 0o755)
+            # Results for any other state are stale.
+            for name in os.listdir(self.path):
+                if name != state:
+                    shutil.rmtree(
+                        os.path.join(self.path, name), ignore_errors=True)
+            state_dir = os.path.join(self.path, state)
+            if not os.path.exists(state_dir):
+                os.mkdir(state_dir, 0o755)
+            with open(os.path.join(state_dir, digest), "w"):
+                pass
+        except OSError as e:
+            logging.warning(
+                "Cannot update signature verification cache: %s" % e)
+
+
 class DebsigVerify:
     """Tiny wrapper around the debsig-verify commandline"""
     # from debsig-verify-0.9/debsigs.h
@@ -93,10 +209,23 @@ class DebsigVerify:
         return Click.find_on_path("debsig-verify")
 
     @classmethod
-    def verify(cls, path, allow_unauthenticated):
+    def verify(cls, path, allow_unauthenticated, cache=None):
+        if cache is None:
+            cache = DebsigVerifyCache()
+        use_cache = cache.enabled
+        if use_cache:
+            state = cache.state_digest()
+            digest, stamp = cache.file_digest(path)
+            if cache.lookup(state, digest):
+                return True
         command = ["debsig-verify"] + [path]
         try:
             subprocess.check_output(command, universal_newlines=True)
+            # Only cache the result if debsig-verify saw the same package
+            # contents and policies that we digested.
+            if (use_cache and cache.file_stamp(path) == stamp and
+                    cache.state_digest() == state):
+                cache.store(state, digest)
         except subprocess.CalledProcessError as e:
             if (allow_unauthenticated and
                 e.returncode in (DebsigVerify.DS_FAIL_NOSIGS,
@@ -123,12 +252,404 @@ class ClickInstallerAuditError(ClickInstallerError):
     pass
 
 
+# Tar modes for reading each compression of a control or data member.
+_member_tar_modes = {
+    "": "r|",
+    ".bz2": "r|bz2",
+    ".xz": "r|xz",
+    }
+
+
+# The order in which dpkg writes the fields it knows about to its status
+# file; other fields follow in their original order.
+_dpkg_status_fields = (
+    "Package", "Essential", "Status", "Priority", "Section", "Installed-Size",
+    "Origin", "Maintainer", "Bugs", "Architecture", "Multi-Arch", "Source",
+    "Version", "Description",
+    )
+
+
+@contextmanager
+def _open_member_tar(member, prefix):
+    """Open the tar archive in an ar member for streaming."""
+    extension = member.name[len(prefix):]
+    if extension in _member_tar_modes:
+        with closing(tarfile.open(
+                fileobj=member, mode=_member_tar_modes[extension])) as tar:
+            yield tar
+    elif extension == ".gz":
+        # click build --cache-dir writes several gzip members, which
+        # tarfile's "r|gz" would stop reading after the first.
+        with closing(tarfile.open(
+                fileobj=GzipMembersReader(member), mode="r|")) as tar:
+            yield tar
+    elif extension == ".zst":
+        # The standard library has no zstd support; stream through zstd.
+        zstd = subprocess.Popen(
+            ["zstd", "-dc"], stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+
+        def feed():
+            try:
+                shutil.copyfileobj(member, zstd.stdin)
+            except (IOError, OSError):
+                pass
+            finally:
+                zstd.stdin.close()
+
+        feeder = threading.Thread(target=feed)
+        feeder.start()
+        try:
+            with closing(tarfile.open(
+                    fileobj=zstd.stdout, mode="r|")) as tar:
+                yield tar
+        finally:
+            zstd.stdout.close()
+            feeder.join()
+            returncode = zstd.wait()
+        if returncode != 0:
+            raise IOError("zstd exited with status %d" % returncode)
+    else:
+        raise IOError("unsupported compression for %s" % member.name)
+
+
+def _parse_md5sums(contents):
+    md5sums = {}
+    for line in contents.splitlines():
+        if not line:
+            continue
+        match = re.match(r"^([0-9a-fA-F]{32}) [ *](.+)$", line)
+        if not match:
+            raise ClickInstallerAuditError(
+                "Malformed md5sums line: %s" % line)
+        md5sums[os.path.normpath(match.group(2))] = match.group(1).lower()
+    return md5sums
+
+
+# From <linux/fs.h>.
+FICLONE = 0x40049409
+
+# A delta (see click_package.delta) has this member in place of
+# _click-binary, and encodes each file taken from its base version as an
+# empty data entry with this PAX header naming the file in the base.
+delta_member = "_click-delta"
+delta_source = "CLICK.delta-source"
+
+
+def _md5_file(f):
+    md5 = hashlib.md5()
+    while True:
+        buf = f.read(65536)
+        if not buf:
+            break
+        md5.update(buf)
+    return md5.hexdigest()
+
+
+class _PreviousVersion:
+    """Files of a previously unpacked version that an upgrade can reuse.
+
+    A file in the new version can be taken from the previous version if
+    both versions' md5sums give it the same digest, and the file on disk
+    still has that digest.  It is hard-linked if its mode and modification
+    time are unchanged too, and otherwise reflinked where the filesystem
+    supports that.
+    """
+
+    def __init__(self, inst_dir, package_name, md5sums):
+        self.inst_dir = inst_dir
+        self.md5sums = md5sums
+        self.by_digest = {}
+        self.files = 0
+        self.bytes = 0
+        old_md5sums_path = os.path.join(
+            inst_dir, ".click", "info", "%s.md5sums" % package_name)
+        try:
+            with open(old_md5sums_path, encoding="UTF-8") as f:
+                old_md5sums = _parse_md5sums(f.read())
+        except (IOError, ClickInstallerAuditError):
+            old_md5sums = {}
+        for name, digest in sorted(old_md5sums.items()):
+            self.by_digest.setdefault(digest, []).append(name)
+
+    def _candidates(self, name):
+        candidates = self.by_digest.get(self.md5sums.get(name), [])
+        # Prefer the same path, which is most likely to be identical.
+        if name in candidates:
+            yield name
+        for candidate in candidates:
+            if candidate != name:
+                yield candidate
+
+    def _reflink(self, src, path, mode, mtime):
+        fd = os.open(
+            path, os.O_WRONLY | os.O_CREAT | os.O_EXCL | os.O_NOFOLLOW,
+            0o600)
+        try:
+            fcntl.ioctl(fd, FICLONE, src.fileno())
+            os.fchmod(fd, mode)
+        except (IOError, OSError):
+            os.close(fd)
+            os.unlink(path)
+            return False
+        os.close(fd)
+        os.utime(path, (mtime, mtime))
+        return True
+
+    def _link(self, src, source, st, path, mode, mtime):
+        """Create path from src, the open file at source, with status st.
+
+        The caller has already checked the contents of src.
+        """
+        try:
+            if (stat.S_IMODE(st.st_mode) == mode and
+                    int(st.st_mtime) == mtime):
+                os.link(source, path, follow_symlinks=False)
+                # source may have been replaced since it was checked.
+                linked = os.lstat(path)
+                if (linked.st_dev, linked.st_ino) == (st.st_dev, st.st_ino):
+                    return True
+                os.unlink(path)
+                return False
+            return self._reflink(src, path, mode, mtime)
+        except OSError:
+            return False
+
+    def reuse(self, tarinfo, path, mode):
+        """Try to create path from the previous version.
+
+        Returns True if the file was created.
+        """
+        name = os.path.normpath(tarinfo.name)
+        for candidate in self._candidates(name):
+            source = os.path.join(self.inst_dir, candidate)
+            try:
+                fd = os.open(source, os.O_RDONLY | os.O_NOFOLLOW)
+            except OSError:
+                continue
+            with os.fdopen(fd, "rb") as src:
+                st = os.fstat(src.fileno())
+                if (not stat.S_ISREG(st.st_mode) or
+                        st.st_size != tarinfo.size):
+                    continue
+                # The old md5sums only say what the file held when it was
+                # unpacked.
+                if _md5_file(src) != self.md5sums[name]:
+                    continue
+                if self._link(src, source, st, path, mode, tarinfo.mtime):
+                    self.files += 1
+                    self.bytes += st.st_size
+                    return True
+        return False
+
+    def copy(self, tarinfo, fileobj, f):
+        """Write the contents of a file that could not be reused."""
+        shutil.copyfileobj(fileobj, f, 65536)
+
+    def check_complete(self, inst_dir):
+        pass
+
+
+class _DeltaBase(_PreviousVersion):
+    """The unpacked base version that a delta is applied to.
+
+    Files that the delta takes from the base are linked or copied from it,
+    and every file in the result, whether from the base or from the delta,
+    is checked against the new version's md5sums.
+    """
+
+    def __init__(self, inst_dir, md5sums):
+        self.inst_dir = inst_dir
+        self.real_inst_dir = os.path.realpath(inst_dir)
+        self.md5sums = md5sums
+        self.files = 0
+        self.bytes = 0
+        self.seen = set()
+
+    def _check_digest(self, name, digest):
+        self.seen.add(name)
+        if name not in self.md5sums:
+            raise ClickInstallerAuditError(
+                "File %s is not listed in md5sums" % name)
+        if digest != self.md5sums[name]:
+            raise ClickInstallerAuditError("MD5 sum mismatch for %s" % name)
+
+    def reuse(self, tarinfo, path, mode):
+        if delta_source not in tarinfo.pax_headers:
+            return False
+        name = os.path.normpath(tarinfo.name)
+        source_name = os.path.normpath(tarinfo.pax_headers[delta_source])
+        if source_name.startswith("/") or source_name.split("/")[0] == "..":
+            raise ClickInstallerAuditError(
+                "Delta source %s for %s is outside the base version" %
+                (source_name, name))
+        source = os.path.join(self.inst_dir, source_name)
+        # O_NOFOLLOW only covers the last component, so a link to a
+        # directory in the base could otherwise lead outside it.
+        real_source = os.path.realpath(source)
+        if not real_source.startswith(self.real_inst_dir + os.sep):
+            raise ClickInstallerAuditError(
+                "Delta source %s for %s is outside the base version" %
+                (source_name, name))
+        try:
+            fd = os.open(real_source, os.O_RDONLY | os.O_NOFOLLOW)
+        except OSError as e:
+            raise ClickInstallerAuditError(
+                "Cannot read %s from the base version: %s" % (source_name, e))
+        with os.fdopen(fd, "rb") as src:
+            st = os.fstat(src.fileno())
+            self._check_digest(name, _md5_file(src))
+            if not self._link(
+                    src, real_source, st, path, mode, tarinfo.mtime):
+                src.seek(0)
+                fd = os.open(
+                    path, os.O_WRONLY | os.O_CREAT | os.O_EXCL | os.O_NOFOLLOW,
+                    0o600)
+                with os.fdopen(fd, "wb") as f:
+                    shutil.copyfileobj(src, f, 65536)
+                    os.fchmod(f.fileno(), mode)
+                os.utime(path, (tarinfo.mtime, tarinfo.mtime))
+        self.files += 1
+        self.bytes += st.st_size
+        return True
+
+    def copy(self, tarinfo, fileobj, f):
+        md5 = hashlib.md5()
+        while True:
+            buf = fileobj.read(65536)
+            if not buf:
+                break
+            md5.update(buf)
+            f.write(buf)
+        self._check_digest(os.path.normpath(tarinfo.name), md5.hexdigest())
+
+    def check_complete(self, inst_dir):
+        """Check the files in md5sums that were not checked on the way.
+
+        These can only be symbolic links, as for "click verify --slow".
+        """
+        real_inst_dir = os.path.realpath(inst_dir)
+        for name in sorted(set(self.md5sums) - self.seen):
+            path = os.path.join(inst_dir, name)
+            if not os.path.islink(path):
+                raise ClickInstallerAuditError(
+                    "File %s listed in md5sums is missing from the delta" %
+                    name)
+            target = os.path.realpath(path)
+            if not target.startswith(real_inst_dir + os.sep):
+                # The link points outside the package; there is nothing
+                # in the package to check.
+                continue
+            md5 = hashlib.md5()
+            with open(target, "rb") as f:
+                while True:
+                    buf = f.read(65536)
+                    if not buf:
+                        break
+                    md5.update(buf)
+            self._check_digest(name, md5.hexdigest())
+
+
+class ClickPackage:
+    """Sequential reader for a Click package file.
+
+    Opening the package reads the control member into memory and checks
+    the member layout, skipping over the data member, which can then be
+    streamed once with data_members().
+    """
+
+    maintainer_scripts = ("preinst", "postinst", "prerm", "postrm", "config")
+
+    def __init__(self, path):
+        self.path = path
+        self._ar = ArFile(name=path, mode="r")
+        try:
+            self.control_files = None
+            self.delta = None
+            self._control = None
+            self._data = None
+            for member in self._ar:
+                if member.name.startswith("control.tar"):
+                    if self.control_files is not None or self._data:
+                        raise IOError(
+                            "%s has an unexpected %s member" %
+                            (path, member.name))
+                    self._control = member
+                    self.control_files = self._read_control(member)
+                elif member.name.startswith("data.tar"):
+                    if self.control_files is None or self._data:
+                        raise IOError(
+                            "%s has an unexpected %s member" %
+                            (path, member.name))
+                    # Skipped for now, and streamed by data_members().
+                    self._data = member
+                elif member.name == delta_member:
+                    self.delta = json.loads(member.read().decode("UTF-8"))
+                elif (member.name != "debian-binary" and
+                        not member.name.startswith("_")):
+                    raise IOError(
+                        "%s has an unknown %s member" % (path, member.name))
+            if self.control_files is None:
+                raise IOError("%s has no control member" % path)
+            if self._data is None:
+                raise IOError("%s has no data member" % path)
+        except Exception:
+            self.close()
+            raise
+
+    def _read_control(self, member):
+        files = {}
+        with _open_member_tar(member, "control.tar") as tar:
+            for tarinfo in tar:
+                if tarinfo.isfile():
+                    name = os.path.normpath(tarinfo.name)
+                    files[name] = tar.extractfile(tarinfo).read()
+        return files
+
+    def close(self):
+        self._ar.close()
+
+    def raw_control(self):
+        """Return (member name, contents) of the unparsed control member."""
+        return self._control.name, self._ar.reopen(self._control).read()
+
+    def debcontrol(self):
+        return Deb822(self.control_files.get("control", b""))
+
+    def scripts(self):
+        return dict(
+            (name, self.control_files[name])
+            for name in self.maintainer_scripts if name in self.control_files)
+
+    def md5sums(self):
+        """Parse the md5sums control file into a dict of path to digest."""
+        return _parse_md5sums(self.control_files["md5sums"].decode("UTF-8"))
+
+    def data_members(self):
+        """Yield (TarInfo, file object or None) for each data entry.
+
+        This consumes the data member, so may only be called once.
+        """
+        data = self._ar.reopen(self._data)
+        with _open_member_tar(data, "data.tar") as tar:
+            for tarinfo in tar:
+                if tarinfo.isfile():
+                    yield tarinfo, tar.extractfile(tarinfo)
+                else:
+                    yield tarinfo, None
+
+
 class ClickInstaller:
     def __init__(self, db, force_missing_framework=False,
-                 allow_unauthenticated=False):
+                 allow_unauthenticated=False, single_pass=True,
+                 link_unchanged=False):
         self.db = db
         self.force_missing_framework = force_missing_framework
         self.allow_unauthenticated = allow_unauthenticated
+        # Reusing files from the previous version needs a single-pass
+        # unpack, since dpkg always writes every file.  single_pass=False
+        # falls back to auditing the data and then unpacking it with dpkg.
+        self.single_pass = single_pass or link_unchanged
+        self.link_unchanged = link_unchanged
 
     def _preload_path(self):
         if "CLICK_PACKAGE_PRELOAD" in os.environ:
@@ -163,9 +684,23 @@ class ClickInstaller:
                 kwargs["pass_fds"] = (fd.fileno(),)
             subprocess.check_call(command, env=env, **kwargs)
 
-    def audit(self, path, slow=False, check_arch=False):
+    def audit(self, path, slow=False, check_arch=False, check_data=True):
         # always do the signature check first
-        if DebsigVerify.available():
+        self._verify_signature(path, DebsigVerify.available())
+
+        # fail early if the file cannot be opened
+        package = self._open_package(path)
+
+        # then perform the audit
+        with closing(package):
+            package_name, package_version, manifest = self._audit_control(
+                package)
+            self._audit_system(manifest, check_arch=check_arch)
+            self._audit_contents(package, slow=slow, check_data=check_data)
+            return package_name, package_version
+
+    def _verify_signature(self, path, debsig_verify_available):
+        if debsig_verify_available:
             try:
                 DebsigVerify.verify(path, self.allow_unauthenticated)
             except DebsigVerifyError as e:
@@ -174,146 +709,227 @@ class ClickInstaller:
             logging.warning(
                 "debsig-verify not available; cannot check signatures")
 
-        # fail early if the file cannot be opened
+    def _open_package(self, path):
         try:
-            with closing(DebFile(filename=path)) as package:
-                pass
+            return ClickPackage(path)
         except Exception as e:
             raise ClickInstallerError("Failed to read %s: %s" % (
                 path, str(e)))
 
-        # then perform the audit
-        with closing(DebFile(filename=path)) as package:
-            control_fields = package.control.debcontrol()
+    def _audit_control(self, package):
+        """Check the control member, returning the package's identity.
 
-            try:
-                click_version = Version(control_fields["Click-Version"])
-            except KeyError:
-                raise ClickInstallerAuditError("No Click-Version field")
-            if click_version > spec_version:
-                raise ClickInstallerAuditError(
-                    "Click-Version: %s newer than maximum supported version "
-                    "%s" % (click_version, spec_version))
-
-            for field in (
-                "Pre-Depends", "Depends", "Recommends", "Suggests", "Enhances",
-                "Conflicts", "Breaks",
-                "Provides",
-            ):
-                if field in control_fields:
-                    raise ClickInstallerAuditError(
-                        "%s field is forbidden in Click packages" % field)
+        Returns (name, version, manifest).  This does not call into
+        libclick, so is safe to run on several threads at once.
+        """
+        control_fields = package.debcontrol()
 
-            scripts = package.control.scripts()
-            if ("preinst" in scripts and
-                    static_preinst_matches(scripts["preinst"])):
-                scripts.pop("preinst", None)
-            if scripts:
+        try:
+            click_version = Version(control_fields["Click-Version"])
+        except KeyError:
+            raise ClickInstallerAuditError("No Click-Version field")
+        if click_version > spec_version:
+            raise ClickInstallerAuditError(
+                "Click-Version: %s newer than maximum supported version "
+                "%s" % (click_version, spec_version))
+
+        for field in (
+            "Pre-Depends", "Depends", "Recommends", "Suggests", "Enhances",
+            "Conflicts", "Breaks",
+            "Provides",
+        ):
+            if field in control_fields:
                 raise ClickInstallerAuditError(
-                    "Maintainer scripts are forbidden in Click packages "
-                    "(found: %s)" %
-                    " ".join(sorted(scripts)))
+                    "%s field is forbidden in Click packages" % field)
 
-            if not package.control.has_file("manifest"):
-                raise ClickInstallerAuditError("Package has no manifest")
-            with package.control.get_file("manifest", encoding="UTF-8") as f:
-                manifest = json.load(f)
+        scripts = package.scripts()
+        if ("preinst" in scripts and
+                static_preinst_matches(scripts["preinst"])):
+            scripts.pop("preinst", None)
+        if scripts:
+            raise ClickInstallerAuditError(
+                "Maintainer scripts are forbidden in Click packages "
+                "(found: %s)" %
+                " ".join(sorted(scripts)))
 
-            try:
-                package_name = manifest["name"]
-            except KeyError:
-                raise ClickInstallerAuditError('No "name" entry in manifest')
-            # TODO: perhaps just do full name validation?
-            if "/" in package_name:
-                raise ClickInstallerAuditError(
-                    'Invalid character "/" in "name" entry: %s' % package_name)
-            if "_" in package_name:
-                raise ClickInstallerAuditError(
-                    'Invalid character "_" in "name" entry: %s' % package_name)
+        if "manifest" not in package.control_files:
+            raise ClickInstallerAuditError("Package has no manifest")
+        manifest = json.loads(
+            package.control_files["manifest"].decode("UTF-8"))
+        try:
+            package_name = manifest["name"]
+        except KeyError:
+            raise ClickInstallerAuditError('No "name" entry in manifest')
+        # TODO: perhaps just do full name validation?
+        if "/" in package_name:
+            raise ClickInstallerAuditError(
+                'Invalid character "/" in "name" entry: %s' % package_name)
+        if "_" in package_name:
+            raise ClickInstallerAuditError(
+                'Invalid character "_" in "name" entry: %s' % package_name)
 
-            try:
-                package_version = manifest["version"]
-            except KeyError:
-                raise ClickInstallerAuditError(
-                    'No "version" entry in manifest')
-            # TODO: perhaps just do full version validation?
-            if "/" in package_version:
-                raise ClickInstallerAuditError(
-                    'Invalid character "/" in "version" entry: %s' %
-                    package_version)
-            if "_" in package_version:
-                raise ClickInstallerAuditError(
-                    'Invalid character "_" in "version" entry: %s' %
-                    package_version)
+        try:
+            package_version = manifest["version"]
+        except KeyError:
+            raise ClickInstallerAuditError(
+                'No "version" entry in manifest')
+        # TODO: perhaps just do full version validation?
+        if "/" in package_version:
+            raise ClickInstallerAuditError(
+                'Invalid character "/" in "version" entry: %s' %
+                package_version)
+        if "_" in package_version:
+            raise ClickInstallerAuditError(
+                'Invalid character "_" in "version" entry: %s' %
+                package_version)
 
-            try:
-                framework = manifest["framework"]
-            except KeyError:
-                raise ClickInstallerAuditError(
-                    'No "framework" entry in manifest')
-            try:
-                validate_framework(framework, self.force_missing_framework)
-            except ClickFrameworkInvalid as e:
-                raise ClickInstallerAuditError(str(e))
+        if "framework" not in manifest:
+            raise ClickInstallerAuditError(
+                'No "framework" entry in manifest')
+
+        return package_name, package_version, manifest
 
-            if check_arch:
-                architecture = manifest.get("architecture", "all")
-                if architecture != "all":
-                    dpkg_architecture = self._dpkg_architecture()
-                    if isinstance(architecture, list):
-                        if dpkg_architecture not in architecture:
-                            raise ClickInstallerAuditError(
-                                'Package architectures "%s" not compatible '
-                                'with system architecture "%s"' %
-                                (" ".join(architecture), dpkg_architecture))
-                    elif architecture != dpkg_architecture:
+    def _audit_system(self, manifest, check_arch=False):
+        """Check that the system can run the package described by manifest.
+
+        This looks up frameworks through libclick, whose caches are not
+        thread-safe, so must only be called from one thread at a time.
+        """
+        try:
+            validate_framework(
+                manifest["framework"], self.force_missing_framework)
+        except ClickFrameworkInvalid as e:
+            raise ClickInstallerAuditError(str(e))
+
+        if check_arch:
+            architecture = manifest.get("architecture", "all")
+            if architecture != "all":
+                dpkg_architecture = self._dpkg_architecture()
+                if isinstance(architecture, list):
+                    if dpkg_architecture not in architecture:
                         raise ClickInstallerAuditError(
-                            'Package architecture "%s" not compatible '
+                            'Package architectures "%s" not compatible '
                             'with system architecture "%s"' %
-                            (architecture, dpkg_architecture))
-
-            # This isn't ideally quick, since it has to decompress the data
-            # part of the package, but dpkg's path filtering code assumes
-            # that all paths start with "./" so we must check it before
-            # passing the package to dpkg.
-            for data_name in package.data:
-                if data_name != "." and not data_name.startswith("./"):
+                            (" ".join(architecture), dpkg_architecture))
+                elif architecture != dpkg_architecture:
                     raise ClickInstallerAuditError(
-                        'File name "%s" in package does not start with "./"' %
-                        data_name)
+                        'Package architecture "%s" not compatible '
+                        'with system architecture "%s"' %
+                        (architecture, dpkg_architecture))
 
-            if slow:
-                temp_dir = tempfile.mkdtemp(prefix="click")
-                try:
-                    self.extract(path, temp_dir)
-                    command = [
-                        "md5sum", "-c", "--quiet",
-                        os.path.join("DEBIAN", "md5sums"),
-                    ]
-                    subprocess.check_call(command, cwd=temp_dir)
-                finally:
-                    shutil.rmtree(temp_dir)
+    def _audit_contents(self, package, slow=False, check_data=True):
+        # Applying a delta checks every file against md5sums.
+        if (package.delta is not None and
+                "md5sums" not in package.control_files):
+            raise ClickInstallerAuditError("Delta has no md5sums")
+        if slow:
+            if "md5sums" not in package.control_files:
+                raise ClickInstallerAuditError("Package has no md5sums")
+            md5sums = package.md5sums()
+        else:
+            md5sums = {}
+        # Single-pass unpacking checks the data member as it extracts.
+        if check_data or slow:
+            self._audit_data(package, md5sums)
 
-            return package_name, package_version
+    def _audit_data(self, package, md5sums):
+        """Check the data member in one pass, without extracting it.
+
+        dpkg's path filtering code assumes that all paths start with "./",
+        so we must check that before passing the package to dpkg.  If
+        md5sums is not empty, files are checksummed as they stream past and
+        compared with it, following links within the package.  Files that
+        a delta takes from its base version can only be checked when the
+        delta is applied.
+        """
+        digests = {}
+        links = {}
+        for tarinfo, fileobj in package.data_members():
+            data_name = tarinfo.name
+            if data_name != "." and not data_name.startswith("./"):
+                raise ClickInstallerAuditError(
+                    'File name "%s" in package does not start with "./"' %
+                    data_name)
+            name = os.path.normpath(data_name)
+            if delta_source in tarinfo.pax_headers:
+                digests[name] = None
+            elif fileobj is not None and md5sums:
+                md5 = hashlib.md5()
+                while True:
+                    buf = fileobj.read(65536)
+                    if not buf:
+                        break
+                    md5.update(buf)
+                digests[name] = md5.hexdigest()
+            elif tarinfo.issym():
+                if tarinfo.linkname.startswith("/"):
+                    links[name] = None
+                else:
+                    links[name] = os.path.normpath(os.path.join(
+                        os.path.dirname(name), tarinfo.linkname))
+            elif tarinfo.islnk():
+                links[name] = os.path.normpath(tarinfo.linkname)
+
+        for name, expected in sorted(md5sums.items()):
+            target = name
+            for _ in range(40):
+                if target not in links:
+                    break
+                target = links[target]
+                if target is None:
+                    break
+            if target is None:
+                # The link points outside the package; there is nothing
+                # in the package to check.
+                continue
+            if target not in digests:
+                raise ClickInstallerAuditError(
+                    "File %s listed in md5sums is missing from the "
+                    "package" % name)
+            if digests[target] is not None and digests[target] != expected:
+                raise ClickInstallerAuditError(
+                    "MD5 sum mismatch for %s" % name)
 
-    def _drop_privileges(self, username):
+    def _lookup_privileges(self, username):
+        """Look up what _drop_privileges needs in order to become username.
+
+        This goes through libclick's cache of user lookups, so call it
+        before forking: the child would start with an empty cache, and
+        should not call into GI in any case.  Returns None if we are not
+        root, in which case there are no privileges to drop.
+        """
         if os.geteuid() != 0:
+            return None
+        pw = self._getpwnam(username)
+        return pw.props.uid, pw.props.gid, pw.get_groups()
+
+    def _drop_privileges(self, privileges):
+        if privileges is None:
             return
-        pw = pwd.getpwnam(username)
-        os.setgroups(
-            [g.gr_gid for g in grp.getgrall() if username in g.gr_mem])
+        uid, gid, groups = privileges
+        os.setgroups(groups)
         # Portability note: this assumes that we have [gs]etres[gu]id, which
         # is true on Linux but not necessarily elsewhere.  If you need to
         # support something else, there are reasonably standard alternatives
         # involving other similar calls; see e.g. gnulib/lib/idpriv-drop.c.
-        os.setresgid(pw.pw_gid, pw.pw_gid, pw.pw_gid)
-        os.setresuid(pw.pw_uid, pw.pw_uid, pw.pw_uid)
-        assert os.getresuid() == (pw.pw_uid, pw.pw_uid, pw.pw_uid)
-        assert os.getresgid() == (pw.pw_gid, pw.pw_gid, pw.pw_gid)
+        os.setresgid(gid, gid, gid)
+        os.setresuid(uid, uid, uid)
+        assert os.getresuid() == (uid, uid, uid)
+        assert os.getresgid() == (gid, gid, gid)
         os.umask(0o022)
 
-    def _euid_access(self, username, path, mode):
-        """Like os.access, but for the effective UID."""
+    def _getpwnam(self, username):
+        """Look up username using libclick's cache of user lookups."""
+        pw = Click.lookup_passwd(username)
+        if pw is None:
+            raise KeyError("getpwnam(): name not found: %s" % username)
+        return pw
+
+    def _euid_access(self, privileges, path, mode):
+        """Like os.access, but for the effective UID.
+
+        privileges is as returned by _lookup_privileges.
+        """
         # TODO: Dropping privileges and calling
         # os.access(effective_ids=True) ought to work, but for some reason
         # appears not to return False when it should.  It seems that we need
@@ -321,26 +937,26 @@ class ClickInstaller:
         # exec anything.
         pid = os.fork()
         if pid == 0:  # child
-            self._drop_privileges(username)
+            self._drop_privileges(privileges)
             os._exit(0 if os.access(path, mode) else 1)
         else:  # parent
             _, status = os.waitpid(pid, 0)
             return status == 0
 
-    def _check_write_permissions(self, path):
+    def _check_write_permissions(self, path, privileges):
         while True:
             if os.path.exists(path):
                 break
             path = os.path.dirname(path)
             if path == "/":
                 break
-        if not self._euid_access("clickpkg", path, os.W_OK):
+        if not self._euid_access(privileges, path, os.W_OK):
             raise ClickInstallerPermissionDenied(
                 'Cannot acquire permission to write to %s; either run as root '
                 'with --user, or use "pkcon install-local" instead' % path)
 
-    def _install_preexec(self, inst_dir):
-        self._drop_privileges("clickpkg")
+    def _install_preexec(self, inst_dir, privileges):
+        self._drop_privileges(privileges)
 
         admin_dir = os.path.join(inst_dir, ".click")
         if not os.path.exists(admin_dir):
@@ -353,30 +969,222 @@ class ClickInstaller:
             os.mkdir(os.path.join(admin_dir, "updates"))
             os.mkdir(os.path.join(admin_dir, "triggers"))
 
-    def _unpack(self, path, user=None, all_users=False, quiet=True):
-        package_name, package_version = self.audit(path, check_arch=True)
+    def _widen_mode(self, mode):
+        """Widen mode in the same way as after unpacking with dpkg."""
+        mode = stat.S_IMODE(mode) | stat.S_IRGRP | stat.S_IROTH
+        if mode & stat.S_IXUSR:
+            mode |= stat.S_IXGRP | stat.S_IXOTH
+        return mode
 
-        # Is this package already unpacked in an underlay (non-topmost)
-        # database?
-        if self.db.has_package_version(package_name, package_version):
-            overlay = self.db.get(self.db.props.size - 1)
-            if not overlay.has_package_version(package_name, package_version):
-                return package_name, package_version, None
+    def _check_inside(self, real_inst_dir, path):
+        real_path = os.path.realpath(path)
+        if (real_path != real_inst_dir and
+                not real_path.startswith(real_inst_dir + os.sep)):
+            raise ClickInstallerAuditError(
+                "Refusing to write outside the package directory: %s" % path)
 
-        package_dir = os.path.join(self.db.props.overlay, package_name)
-        inst_dir = os.path.join(package_dir, package_version)
-        assert (
-            os.path.dirname(os.path.dirname(inst_dir)) ==
-            self.db.props.overlay)
+    def _extract_entry(self, inst_dir, real_inst_dir, tarinfo, fileobj,
+                       previous=None):
+        """Create one data entry under inst_dir with widened permissions.
 
-        self._check_write_permissions(self.db.props.overlay)
-        root_click = os.path.join(self.db.props.overlay, ".click")
-        if not os.path.exists(root_click):
-            os.makedirs(root_click)
-            if os.geteuid() == 0:
-                pw = pwd.getpwnam("clickpkg")
-                os.chown(root_click, pw.pw_uid, pw.pw_gid)
+        Directories are left as 0700 so that their contents can be
+        extracted; _extract_data sets their modes once it has finished.
+        This runs as clickpkg, so it needs no sandbox beyond refusing to
+        follow links out of inst_dir.
+        """
+        path = os.path.join(inst_dir, os.path.normpath(tarinfo.name))
+        self._check_inside(real_inst_dir, os.path.dirname(path))
+        mode = self._widen_mode(tarinfo.mode)
+        if tarinfo.isdir():
+            if not os.path.isdir(path) or os.path.islink(path):
+                if os.path.lexists(path):
+                    os.unlink(path)
+                os.mkdir(path, 0o700)
+            return
+        if os.path.isdir(path) and not os.path.islink(path):
+            raise ClickInstallerAuditError(
+                "Cannot replace directory %s with a non-directory" %
+                tarinfo.name)
+        if os.path.lexists(path):
+            os.unlink(path)
+        if tarinfo.isfile():
+            if previous is not None and previous.reuse(tarinfo, path, mode):
+                return
+            fd = os.open(
+                path, os.O_WRONLY | os.O_CREAT | os.O_EXCL | os.O_NOFOLLOW,
+                0o600)
+            with os.fdopen(fd, "wb") as f:
+                if previous is not None:
+                    previous.copy(tarinfo, fileobj, f)
+                else:
+                    shutil.copyfileobj(fileobj, f, 65536)
+                os.fchmod(f.fileno(), mode)
+            os.utime(path, (tarinfo.mtime, tarinfo.mtime))
+        elif tarinfo.issym():
+            os.symlink(tarinfo.linkname, path)
+        elif tarinfo.islnk():
+            target = os.path.join(inst_dir, os.path.normpath(tarinfo.linkname))
+            self._check_inside(real_inst_dir, os.path.dirname(target))
+            os.link(target, path, follow_symlinks=False)
+        elif tarinfo.isfifo():
+            os.mkfifo(path, mode)
+        else:
+            raise ClickInstallerAuditError(
+                "Unsupported file type for %s in package" % tarinfo.name)
+
+    def _extract_data(self, package, inst_dir, previous=None):
+        """Stream the data member into inst_dir in a single pass.
+
+        The member names are checked as they are extracted, in place of the
+        separate pass in audit().  Returns the list of installed paths in
+        the form dpkg records them.
+        """
+        real_inst_dir = os.path.realpath(inst_dir)
+        installed = []
+        directories = []
+        for tarinfo, fileobj in package.data_members():
+            data_name = tarinfo.name
+            if data_name != "." and not data_name.startswith("./"):
+                raise ClickInstallerAuditError(
+                    'File name "%s" in package does not start with "./"' %
+                    data_name)
+            name = "/" + os.path.normpath(data_name)
+            if name == "/.":
+                installed.append(name)
+                continue
+            if name.startswith("/../") or name == "/..":
+                raise ClickInstallerAuditError(
+                    'File name "%s" in package is outside the package '
+                    'directory' % data_name)
+            # Equivalent to dpkg --path-exclude "*/.click/*".
+            if fnmatch.fnmatchcase(name, "*/.click/*"):
+                continue
+            self._extract_entry(
+                inst_dir, real_inst_dir, tarinfo, fileobj, previous=previous)
+            if tarinfo.isdir():
+                directories.append((name, tarinfo.mode))
+            installed.append(name)
+        if previous is not None:
+            previous.check_complete(inst_dir)
+        # Deepest first, in case a parent is not searchable by its owner.
+        for name, mode in reversed(directories):
+            os.chmod(inst_dir + name, self._widen_mode(mode))
+        return installed
 
+    def _write_admin_dir(self, package, inst_dir, installed):
+        """Record the unpacked package in inst_dir/.click as dpkg would."""
+        admin_dir = os.path.join(inst_dir, ".click")
+        control_fields = package.debcontrol()
+        package_name = control_fields["Package"]
+        info_dir = os.path.join(admin_dir, "info")
+        for name, contents in package.control_files.items():
+            if name == "control" or "/" in name:
+                continue
+            info_path = os.path.join(info_dir, "%s.%s" % (package_name, name))
+            with open(info_path, "wb") as f:
+                f.write(contents)
+            if name in ClickPackage.maintainer_scripts:
+                os.chmod(info_path, 0o755)
+        list_path = os.path.join(info_dir, "%s.list" % package_name)
+        with open(list_path, "w") as f:
+            for name in installed:
+                print(name, file=f)
+        with open(os.path.join(info_dir, "format"), "w") as f:
+            print("1", file=f)
+        control_fields["Status"] = "install ok installed"
+        status = Deb822()
+        for field in _dpkg_status_fields:
+            if field in control_fields:
+                status[field] = control_fields[field]
+        for field, value in control_fields.items():
+            if field not in status:
+                status[field] = value
+        status_path = os.path.join(admin_dir, "status")
+        with open("%s.new" % status_path, "w") as f:
+            print(status.dump(), file=f)
+        os.rename("%s.new" % status_path, status_path)
+
+    def _unpack_single_pass(self, path, inst_dir, root_click, privileges,
+                            quiet=True, previous_dir=None, base_dir=None):
+        """Audit and unpack the data member in one pass, without dpkg.
+
+        The package is opened here and read as clickpkg in a child process,
+        which extracts it into the new inst_dir, fixes up permissions on
+        the way, and writes a dpkg-compatible admin directory.  If
+        previous_dir is given, unchanged files are reused from that
+        unpacked version rather than written again.  If path is a delta,
+        base_dir is the unpacked version it applies to.
+        """
+        with closing(ClickPackage(path)) as package:
+            control_fields = package.debcontrol()
+            if not quiet:
+                print("Unpacking %s (%s) ..." % (
+                    control_fields["Package"], control_fields["Version"]))
+            read_fd, write_fd = os.pipe()
+            pid = os.fork()
+            if pid == 0:  # child
+                os.close(read_fd)
+                status = 1
+                try:
+                    self._install_preexec(inst_dir, privileges)
+                    if base_dir is not None:
+                        previous = _DeltaBase(base_dir, package.md5sums())
+                    elif (previous_dir is not None and
+                            "md5sums" in package.control_files):
+                        previous = _PreviousVersion(
+                            previous_dir, control_fields["Package"],
+                            package.md5sums())
+                    else:
+                        previous = None
+                    installed = self._extract_data(
+                        package, inst_dir, previous=previous)
+                    self._write_admin_dir(package, inst_dir, installed)
+                    with open(os.path.join(root_click, "log"), "a") as log:
+                        print("%s install %s:%s <none> %s" % (
+                            time.strftime("%Y-%m-%d %H:%M:%S"),
+                            control_fields["Package"],
+                            control_fields["Architecture"],
+                            control_fields["Version"]), file=log)
+                    if previous is not None:
+                        result = {
+                            "files": previous.files, "bytes": previous.bytes}
+                    else:
+                        result = {}
+                    status = 0
+                except Exception as e:
+                    result = {
+                        "audit": isinstance(e, ClickInstallerAuditError),
+                        "message": str(e),
+                        }
+                try:
+                    os.write(write_fd, json.dumps(result).encode("UTF-8"))
+                finally:
+                    os._exit(status)
+            os.close(write_fd)
+            with os.fdopen(read_fd, "rb") as result_pipe:
+                result = result_pipe.read()
+            _, status = os.waitpid(pid, 0)
+        if result:
+            result = json.loads(result.decode("UTF-8"))
+        if status != 0:
+            shutil.rmtree(inst_dir, ignore_errors=True)
+            if not result:
+                result = {
+                    "audit": False,
+                    "message": "unpack process exited with status %d" %
+                               status,
+                    }
+            if result["audit"]:
+                raise ClickInstallerAuditError(result["message"])
+            raise ClickInstallerError(
+                "Failed to unpack %s: %s" % (path, result["message"]))
+        if (not quiet and (previous_dir is not None or base_dir is not None)
+                and result):
+            print("Reused %d unchanged files (%d bytes) from %s" % (
+                result["files"], result["bytes"], base_dir or previous_dir))
+
+    def _unpack_dpkg(self, path, inst_dir, root_click, privileges,
+                     quiet=True):
         # TODO: sandbox so that this can only write to the unpack directory
         command = [
             "dpkg",
@@ -407,6 +1215,7 @@ class ClickInstaller:
             kwargs = {}
             if sys.version >= "3.2":
                 kwargs["pass_fds"] = (fd.fileno(),)
+            preexec = partial(self._install_preexec, inst_dir, privileges)
             if quiet:
                 fn = subprocess.check_output
                 kwargs["stderr"] = subprocess.STDOUT
@@ -414,7 +1223,7 @@ class ClickInstaller:
                 fn = subprocess.check_call
             try:
                 fn(command,
-                    preexec_fn=partial(self._install_preexec, inst_dir),
+                    preexec_fn=preexec,
                     env=env, universal_newlines=True,
                     **kwargs)
             except subprocess.CalledProcessError as e:
@@ -434,6 +1243,84 @@ class ClickInstaller:
                     except OSError:
                         pass
 
+    def _unpack_files(self, path, package_name, package_version, privileges,
+                      quiet=True):
+        """Unpack an audited package into the overlay database.
+
+        privileges is the result of _lookup_privileges("clickpkg").
+        Returns False if the package is already unpacked in an underlay
+        database, and so was not unpacked again.
+        """
+        # Is this package already unpacked in an underlay (non-topmost)
+        # database?
+        if self.db.has_package_version(package_name, package_version):
+            overlay = self.db.get(self.db.props.size - 1)
+            if not overlay.has_package_version(package_name, package_version):
+                return False
+
+        package_dir = os.path.join(self.db.props.overlay, package_name)
+        inst_dir = os.path.join(package_dir, package_version)
+        assert (
+            os.path.dirname(os.path.dirname(inst_dir)) ==
+            self.db.props.overlay)
+
+        self._check_write_permissions(self.db.props.overlay, privileges)
+        root_click = os.path.join(self.db.props.overlay, ".click")
+        if not os.path.exists(root_click):
+            os.makedirs(root_click)
+            if privileges is not None:
+                uid, gid, _ = privileges
+                os.chown(root_click, uid, gid)
+
+        with closing(ClickPackage(path)) as package:
+            delta = package.delta
+        if delta is not None:
+            if os.path.exists(inst_dir):
+                # A delta cannot be reinstalled over an existing unpack, as
+                # that would need the files it takes from its base.
+                logging.warning(
+                    "%s %s is already unpacked; not applying delta %s" %
+                    (package_name, package_version, path))
+            else:
+                try:
+                    base_dir = self.db.get_path(
+                        package_name, delta["base-version"])
+                except GLib.GError:
+                    raise ClickInstallerError(
+                        "Cannot apply delta: %s %s is not installed" %
+                        (package_name, delta["base-version"]))
+                self._unpack_single_pass(
+                    path, inst_dir, root_click, privileges, quiet=quiet,
+                    base_dir=base_dir)
+        elif self.single_pass and not os.path.exists(inst_dir):
+            previous_dir = None
+            if self.link_unchanged:
+                # Only a version in the same database is on the same
+                # filesystem, as links need.
+                current_path = os.path.join(package_dir, "current")
+                if os.path.islink(current_path):
+                    old_version = os.readlink(current_path)
+                    if "/" not in old_version:
+                        previous_dir = os.path.join(package_dir, old_version)
+            self._unpack_single_pass(
+                path, inst_dir, root_click, privileges, quiet=quiet,
+                previous_dir=previous_dir)
+        else:
+            if self.single_pass:
+                # Reinstalling over an existing unpack is left to dpkg, which
+                # knows how to remove files dropped from the package.
+                with closing(ClickPackage(path)) as package:
+                    self._audit_data(package, {})
+            self._unpack_dpkg(
+                path, inst_dir, root_click, privileges, quiet=quiet)
+        return True
+
+    def _activate(self, package_name, package_version):
+        """Run install hooks and make package_version the current version.
+
+        Returns the previous current version, if any.
+        """
+        package_dir = os.path.join(self.db.props.overlay, package_name)
         current_path = os.path.join(package_dir, "current")
 
         if os.path.islink(current_path):
@@ -452,16 +1339,133 @@ class ClickInstaller:
             # shutil.chown would be more convenient, but it doesn't support
             # follow_symlinks=False in Python 3.3.
             # http://bugs.python.org/issue18108
-            pw = pwd.getpwnam("clickpkg")
-            os.chown(new_path, pw.pw_uid, pw.pw_gid, follow_symlinks=False)
+            pw = self._getpwnam("clickpkg")
+            os.chown(
+                new_path, pw.props.uid, pw.props.gid, follow_symlinks=False)
         os.rename(new_path, current_path)
+        return old_version
+
+    def _update_index(self):
+        try:
+            self.db.update_index()
+        except GLib.GError as e:
+            logging.warning("Cannot update package index: %s" % e.message)
 
+    def _unpack(self, path, user=None, all_users=False, quiet=True):
+        package_name, package_version = self.audit(
+            path, check_arch=True, check_data=not self.single_pass)
+        if not self._unpack_files(
+                path, package_name, package_version,
+                self._lookup_privileges("clickpkg"), quiet=quiet):
+            return package_name, package_version, None
+        old_version = self._activate(package_name, package_version)
+        self._update_index()
         return package_name, package_version, old_version
 
     def install(self, path, user=None, all_users=False, quiet=True):
+        # Run each hook's command once, after all links have been updated.
+        # After a failure, abort() still runs the commands queued so far.
+        batch = Click.HookBatch()
+        batch.begin()
+        try:
+            self._install(path, user=user, all_users=all_users, quiet=quiet)
+            batch.commit()
+        finally:
+            batch.abort()
+
+    def install_many(self, paths, user=None, all_users=False, quiet=True,
+                     jobs=None):
+        """Install several packages, running hook commands once at the end.
+
+        Signature checks and the parts of each audit that only read the
+        package run concurrently on a pool of jobs threads (by default, one
+        per CPU).  libclick's caches are not thread-safe, so anything that
+        calls into it, such as framework checks, runs afterwards on this
+        thread.  If any package fails its audit, nothing is installed.
+        Unpacking forks, which is not safe while other threads are running,
+        so the packages are then unpacked one at a time, and only once all
+        are unpacked are they made current and registered, in the order
+        given.  If any unpack fails, none of the packages is made current;
+        versions unpacked before the failure are left for garbage
+        collection.
+        """
+        if jobs is None:
+            jobs = os.cpu_count() or 1
+        if jobs < 1:
+            raise ValueError("jobs must be at least 1")
+
+        debsig_verify_available = DebsigVerify.available()
+        privileges = self._lookup_privileges("clickpkg")
+
+        def audit(path):
+            try:
+                self._verify_signature(path, debsig_verify_available)
+                package = self._open_package(path)
+                with closing(package):
+                    audited = self._audit_control(package)
+                    self._audit_contents(
+                        package, check_data=not self.single_pass)
+                    return audited
+            except ClickInstallerError as e:
+                raise ClickInstallerError("%s: %s" % (path, e)) from e
+
+        pool = ThreadPool(jobs)
+        try:
+            audited = pool.map(audit, paths)
+        finally:
+            pool.close()
+            pool.join()
+        for path, (_, _, manifest) in zip(paths, audited):
+            try:
+                self._audit_system(manifest, check_arch=True)
+            except ClickInstallerError as e:
+                raise ClickInstallerError("%s: %s" % (path, e)) from e
+        packages = []
+        seen = set()
+        for path, (package_name, package_version, _) in zip(paths, audited):
+            if (package_name, package_version) not in seen:
+                seen.add((package_name, package_version))
+                packages.append((path, package_name, package_version))
+
+        batch = Click.HookBatch()
+        batch.begin()
+        try:
+            unpacked = []
+            for path, package_name, package_version in packages:
+                try:
+                    new = self._unpack_files(
+                        path, package_name, package_version, privileges,
+                        quiet=quiet)
+                except ClickInstallerError as e:
+                    raise ClickInstallerError("%s: %s" % (path, e)) from e
+                unpacked.append((package_name, package_version, new))
+
+            installed = []
+            for package_name, package_version, new in unpacked:
+                if new:
+                    old_version = self._activate(package_name, package_version)
+                else:
+                    old_version = None
+                installed.append((package_name, package_version, old_version))
+            if installed:
+                self._update_index()
+            for package_name, package_version, old_version in installed:
+                self._register(
+                    package_name, package_version, old_version,
+                    user=user, all_users=all_users)
+            batch.commit()
+        finally:
+            batch.abort()
+
+    def _install(self, path, user=None, all_users=False, quiet=True):
         package_name, package_version, old_version = self._unpack(
             path, user=user, all_users=all_users, quiet=quiet)
+        self._register(
+            package_name, package_version, old_version,
+            user=user, all_users=all_users)
 
+    def _register(self, package_name, package_version, old_version,
+                  user=None, all_users=False):
         if user is not None or all_users:
             if all_users:
                 registry = Click.User.for_all_users(self.db)
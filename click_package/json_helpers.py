@@ -13,7 +13,14 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
-"""Helper functions to turn json-glib objects into Python objects."""
+"""Helper functions to turn json-glib objects into Python objects.
+
+Converting a json-glib tree with json_node_to_python costs several
+introspected calls per node.  Where libclick can serialise the whole tree
+itself, as with manifests, it is much cheaper to have it do so and parse
+the resulting string with the json module: load_manifest and
+load_manifests do that.
+"""
 
 from __future__ import print_function
 
@@ -23,9 +30,13 @@ __all__ = [
     'json_array_to_python',
     'json_node_to_python',
     'json_object_to_python',
+    'load_manifest',
+    'load_manifests',
     ]
 
 
+import json
+
 from gi.repository import Json
 
 
@@ -57,3 +68,19 @@ def json_node_to_python(node):
     else:
         raise ClickJsonError(
             "Unknown JSON node type \"%s\"" % node_type.value_nick)
+
+
+def load_manifest(registry, *args):
+    """Return a manifest from a Click.DB or Click.User as a dict.
+
+    This takes the same arguments as registry.get_manifest.
+    """
+    return json.loads(registry.get_manifest_as_string(*args))
+
+
+def load_manifests(registry, **kwargs):
+    """Return the manifests from a Click.DB or Click.User as a list.
+
+    This takes the same arguments as registry.get_manifests.
+    """
+    return json.loads(registry.get_manifests_as_string(**kwargs))
@@ -0,0 +1,269 @@
+# Copyright (C) 2026 UBports Foundation
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; version 3 of the License.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Gzip readers and writers for Click packages.
+
+ParallelGzipWriter splits its input into fixed-size blocks which are
+deflated independently on a pool of threads (zlib releases the GIL while
+compressing), in the manner of pigz.  Each block except the last ends with a
+sync flush, so the compressed blocks concatenate into a single ordinary
+deflate stream inside one gzip member; any gzip reader can decompress the
+result.
+
+FragmentedGzipWriter writes a stream of independent gzip members whose
+compressed form can be cached and reused by later builds.  GzipMembersReader
+reads such a stream back sequentially.
+"""
+
+from __future__ import print_function
+
+__metaclass__ = type
+__all__ = [
+    'FragmentedGzipWriter',
+    'GzipMembersReader',
+    'ParallelGzipWriter',
+    ]
+
+
+from collections import deque
+from multiprocessing.pool import ThreadPool
+import struct
+import time
+import zlib
+
+
+# pigz defaults.
+BLOCK_SIZE = 128 * 1024
+DICT_SIZE = 32 * 1024
+
+
+def _compress_block(level, block, zdict, last):
+    if zdict:
+        compressor = zlib.compressobj(
+            level, zlib.DEFLATED, -zlib.MAX_WBITS, zlib.DEF_MEM_LEVEL,
+            zlib.Z_DEFAULT_STRATEGY, zdict)
+    else:
+        compressor = zlib.compressobj(
+            level, zlib.DEFLATED, -zlib.MAX_WBITS)
+    data = compressor.compress(block)
+    if last:
+        return data + compressor.flush(zlib.Z_FINISH)
+    else:
+        return data + compressor.flush(zlib.Z_SYNC_FLUSH)
+
+
+class ParallelGzipWriter:
+    """A write-only file object producing gzip output using several threads.
+
+    Suitable for use as the fileobj of a TarFile opened in stream mode
+    ("w|").  With jobs=1 the blocks are compressed in the calling thread.
+    """
+
+    def __init__(self, fileobj, jobs=1, compresslevel=9,
+                 block_size=BLOCK_SIZE, mtime=None):
+        if jobs < 1:
+            raise ValueError("jobs must be at least 1")
+        self.fileobj = fileobj
+        self.jobs = jobs
+        self.compresslevel = compresslevel
+        self.block_size = block_size
+        self.closed = False
+        self._pool = ThreadPool(jobs) if jobs > 1 else None
+        self._pending = deque()
+        self._buffer = bytearray()
+        self._dictionary = b""
+        self._crc = 0
+        self._size = 0
+        if mtime is None:
+            mtime = int(time.time())
+        self.fileobj.write(
+            struct.pack("<BBBBIBB", 0x1f, 0x8b, 8, 0, mtime, 2, 255))
+
+    def _submit(self, block, last):
+        args = (self.compresslevel, block, self._dictionary, last)
+        self._dictionary = block[-DICT_SIZE:]
+        if self._pool is None:
+            self.fileobj.write(_compress_block(*args))
+            return
+        self._pending.append(self._pool.apply_async(_compress_block, args))
+        # Bound the amount of compressed data held in memory.
+        while len(self._pending) > self.jobs * 2:
+            self.fileobj.write(self._pending.popleft().get())
+
+    def write(self, data):
+        if self.closed:
+            raise ValueError("write to closed file")
+        data = bytes(data)
+        self._crc = zlib.crc32(data, self._crc)
+        self._size += len(data)
+        self._buffer.extend(data)
+        while len(self._buffer) > self.block_size:
+            block = bytes(self._buffer[:self.block_size])
+            del self._buffer[:self.block_size]
+            self._submit(block, False)
+        return len(data)
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        try:
+            self._submit(bytes(self._buffer), True)
+            self._buffer = bytearray()
+            while self._pending:
+                self.fileobj.write(self._pending.popleft().get())
+            self.fileobj.write(struct.pack(
+                "<II", self._crc & 0xffffffff, self._size & 0xffffffff))
+        finally:
+            if self._pool is not None:
+                self._pool.close()
+                self._pool.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+class FragmentedGzipWriter:
+    """A write-only file object producing a gzip stream of several members.
+
+    Data written between begin_fragment and end_fragment is compressed as
+    a gzip member of its own, which is also copied to a capture file so
+    that it can be replayed later with write_fragment.  A concatenation of
+    gzip members is itself a valid gzip stream.  tell() reports the
+    uncompressed offset, as TarFile expects.
+    """
+
+    def __init__(self, fileobj, compresslevel=9):
+        self.fileobj = fileobj
+        self.compresslevel = compresslevel
+        self.closed = False
+        self._offset = 0
+        self._compressor = None
+        self._capture = None
+
+    def tell(self):
+        return self._offset
+
+    def _output(self, data):
+        self.fileobj.write(data)
+        if self._capture is not None:
+            self._capture.write(data)
+
+    def _end_member(self):
+        if self._compressor is not None:
+            self._output(self._compressor.flush())
+            self._compressor = None
+
+    def write(self, data):
+        if self.closed:
+            raise ValueError("write to closed file")
+        if self._compressor is None:
+            # The gzip header this produces has no name and a zero mtime,
+            # so identical input always compresses to identical output.
+            self._compressor = zlib.compressobj(
+                self.compresslevel, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+        self._output(self._compressor.compress(data))
+        self._offset += len(data)
+        return len(data)
+
+    def begin_fragment(self, capture=None):
+        """Start a new member, copying it to capture if that is not None."""
+        self._end_member()
+        self._capture = capture
+
+    def end_fragment(self):
+        self._end_member()
+        self._capture = None
+
+    def write_fragment(self, fragment, size):
+        """Copy a previously captured member holding size bytes of data."""
+        self._end_member()
+        with open(fragment, "rb") as f:
+            while True:
+                buf = f.read(65536)
+                if not buf:
+                    break
+                self.fileobj.write(buf)
+        self._offset += size
+
+    def close(self):
+        if self.closed:
+            return
+        self._end_member()
+        self.closed = True
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+class GzipMembersReader:
+    """A read-only file object decompressing every member of a gzip stream.
+
+    tarfile's streaming "r|gz" mode stops silently at the end of the first
+    gzip member, which would truncate the output of FragmentedGzipWriter.
+    This starts a new decompressor for each member in turn, and raises
+    EOFError if the stream ends part of the way through one.
+    """
+
+    def __init__(self, fileobj):
+        self.fileobj = fileobj
+        self._decompressor = self._new_decompressor()
+        self._started = False
+        self._buffer = b""
+        self._pos = 0
+        self._eof = False
+
+    @staticmethod
+    def _new_decompressor():
+        return zlib.decompressobj(16 + zlib.MAX_WBITS)
+
+    def _decompress(self, data):
+        pieces = [self._buffer[self._pos:]]
+        while data:
+            self._started = True
+            pieces.append(self._decompressor.decompress(data))
+            if not self._decompressor.eof:
+                break
+            data = self._decompressor.unused_data
+            self._decompressor = self._new_decompressor()
+            self._started = False
+        self._buffer = b"".join(pieces)
+        self._pos = 0
+
+    def read(self, size=-1):
+        while not self._eof and (
+                size < 0 or len(self._buffer) - self._pos < size):
+            data = self.fileobj.read(65536)
+            if data:
+                self._decompress(data)
+            elif self._started:
+                raise EOFError(
+                    "Compressed file ended before the end-of-stream marker "
+                    "was reached")
+            else:
+                self._eof = True
+        if size < 0:
+            size = len(self._buffer) - self._pos
+        data = self._buffer[self._pos:self._pos + size]
+        self._pos += len(data)
+        return data
+
+    def close(self):
+        pass
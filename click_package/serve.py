@@ -0,0 +1,126 @@
+# Copyright (C) 2026 UBports Foundation
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; version 3 of the License.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Forwarding read-only queries to a running "click serve" daemon.
+
+"click serve" keeps a Click database and the results of recent queries in
+memory, and answers the commands in served_commands over a Unix socket in
+$XDG_RUNTIME_DIR.  bin/click forwards those commands to it when it is
+running or can be socket-activated, so that they do not each need to start
+a Python interpreter, load GObject introspection data, and read the
+database again.  The daemon is opt-in: if nothing is listening on the
+socket, or anything goes wrong, commands simply run locally.
+
+This module is used before anything else is loaded, so it must not import
+gi.
+
+Each connection carries one JSON message in each direction.  The client
+sends {"argv": [...], "cwd": "..."} and shuts down its side of the
+connection; the daemon replies {"status": N, "stdout": "...", "stderr":
+"..."}, or {"status": null} if the client should run the command itself.
+"""
+
+from __future__ import print_function
+
+__metaclass__ = type
+__all__ = [
+    'forward',
+    'forwardable',
+    'receive_message',
+    'send_message',
+    'served_commands',
+    'socket_path',
+    ]
+
+
+from contextlib import closing
+import json
+import os
+import socket
+import sys
+
+
+served_commands = (
+    "app-id",
+    "info",
+    "list",
+    "pkgdir",
+    )
+
+
+# How long to wait for an answer before running the command locally instead.
+CLIENT_TIMEOUT = 30
+
+
+def socket_path():
+    runtime_dir = os.environ.get("XDG_RUNTIME_DIR")
+    if not runtime_dir:
+        return None
+    return os.path.join(runtime_dir, "click", "serve.sock")
+
+
+def send_message(sock, message):
+    sock.sendall(json.dumps(message).encode("UTF-8"))
+    sock.shutdown(socket.SHUT_WR)
+
+
+def receive_message(sock):
+    chunks = []
+    while True:
+        chunk = sock.recv(65536)
+        if not chunk:
+            break
+        chunks.append(chunk)
+    return json.loads(b"".join(chunks).decode("UTF-8"))
+
+
+def forwardable(argv):
+    """Return True if the daemon can answer the command line argv."""
+    if not argv or argv[0] not in served_commands:
+        return False
+    for arg in argv[1:]:
+        if arg == "--":
+            break
+        # --root (or an abbreviation of it) adds a database, which the
+        # daemon's long-lived one does not have.
+        option = arg.split("=", 1)[0]
+        if len(option) >= 3 and "--root".startswith(option):
+            return False
+    return True
+
+
+def forward(argv):
+    """Run the command line argv in a "click serve" daemon if possible.
+
+    Returns the command's exit status, having written its output, or None
+    if the command should be run locally.
+    """
+    path = socket_path()
+    if path is None or not forwardable(argv):
+        return None
+    try:
+        with closing(socket.socket(
+                socket.AF_UNIX, socket.SOCK_STREAM)) as sock:
+            sock.settimeout(CLIENT_TIMEOUT)
+            sock.connect(path)
+            send_message(sock, {"argv": list(argv), "cwd": os.getcwd()})
+            reply = receive_message(sock)
+    except (OSError, ValueError):
+        return None
+    if not isinstance(reply, dict) or reply.get("status") is None:
+        return None
+    sys.stdout.write(reply.get("stdout", ""))
+    sys.stdout.flush()
+    sys.stderr.write(reply.get("stderr", ""))
+    return reply["status"]
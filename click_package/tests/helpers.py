@@ -36,6 +36,7 @@ import re
 import shutil
 import sys
 import tempfile
+import time
 import unittest
 try:
     from unittest import mock
@@ -322,6 +323,64 @@ if not hasattr(mock, "call"):
     mock.call = _Call(from_kall=False)
 
 
+class BenchmarkTestCase(TestCase):
+    """Timing comparisons, which only run if TEST_BENCHMARK is set.
+
+    Timings depend on the machine, so they are printed to stderr rather
+    than asserted on; each test should still check that the variants it
+    times produce the same results.  TEST_BENCHMARK_SIZE sets the size in
+    MiB of the tree made by make_benchmark_tree (default: 1024).
+    """
+
+    def setUp(self):
+        super(BenchmarkTestCase, self).setUp()
+        if "TEST_BENCHMARK" not in os.environ:
+            raise unittest.SkipTest("Skipping benchmarks")
+        self.use_temp_dir()
+
+    def make_benchmark_tree(self):
+        """Create a synthetic source tree, returning its path and size.
+
+        The tree holds a manifest and 4 MiB data files, alternately
+        incompressible and text-like.
+        """
+        path = os.path.join(self.temp_dir, "scratch")
+        size = int(os.environ.get("TEST_BENCHMARK_SIZE", "1024")) * 1024 * 1024
+        with mkfile(os.path.join(path, "manifest.json")) as f:
+            json.dump({
+                "name": "com.example.test",
+                "version": "1.0",
+                "maintainer": "Foo Bar <foo@example.org>",
+                "title": "test title",
+                "architecture": "all",
+            }, f)
+        chunk = 4 * 1024 * 1024
+        text = b"".join(
+            b"line %d of some fairly compressible text\n" % i
+            for i in range(chunk // 40))[:chunk]
+        for i in range(0, size, chunk):
+            data_path = os.path.join(path, "data", "%04d" % (i // chunk))
+            with mkfile(data_path, mode="wb") as f:
+                f.write(text if i // chunk % 2 else os.urandom(chunk))
+        return path, size
+
+    def timed(self, label, func, *args, items=None, **kwargs):
+        """Call func, printing how long it took, and return its result.
+
+        If func handles a number of items, pass that as items to print the
+        time taken per item as well.
+        """
+        start = time.time()
+        result = func(*args, **kwargs)
+        elapsed = time.time() - start
+        if items:
+            print("\n%s: %.3fs, %.1fus per item" % (
+                label, elapsed, elapsed * 1000000 / items), file=sys.stderr)
+        else:
+            print("\n%s: %.3fs" % (label, elapsed), file=sys.stderr)
+        return result
+
+
 @contextlib.contextmanager
 def mkfile(path, mode="w"):
     Click.ensuredir(os.path.dirname(path))
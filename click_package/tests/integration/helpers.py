@@ -111,7 +111,8 @@ class ClickTestCase(unittest.TestCase):
                 }, f)
 
     def _make_click(self, name=None, version=1.0,
-                    framework="ubuntu-sdk-13.10", hooks={}):
+                    framework="ubuntu-sdk-13.10", hooks={},
+                    compression=None):
         if name is None:
             name = "com.example.%s" % "".join(
                 random.choice(string.ascii_lowercase) for i in range(10))
@@ -123,9 +124,11 @@ class ClickTestCase(unittest.TestCase):
                               name, version, framework, hooks)
         with open(os.path.join(clickdir, "README"), "w") as f:
             f.write("hello world!")
+        command = [self.click_binary, "build", clickdir]
+        if compression is not None:
+            command.append("--compression=%s" % compression)
         with chdir(tmpdir), open(os.devnull, "w") as devnull:
-            subprocess.call(
-                [self.click_binary, "build", clickdir], stdout=devnull)
+            subprocess.call(command, stdout=devnull)
         generated_clicks = glob.glob(os.path.join(tmpdir, "*.click"))
         self.assertEqual(len(generated_clicks), 1)
         return generated_clicks[0]
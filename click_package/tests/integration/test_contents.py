@@ -16,6 +16,7 @@
 """Integration tests for the click CLI contents command."""
 
 import re
+import shutil
 import subprocess
 
 from .helpers import ClickTestCase
@@ -31,3 +32,15 @@ class TestContents(ClickTestCase):
         self.assertTrue(re.search(
             r'-rw-r[-w]-r-- root/root\s+[0-9]+\s+[0-9-]+ [0-9:]+ ./README',
             output))
+
+    def test_contents_zstd(self):
+        if not shutil.which("zstd"):
+            self.skipTest("zstd not installed")
+        name = "com.example.contents"
+        path_to_click = self._make_click(name, compression="zstd")
+        output = subprocess.check_output([
+            self.click_binary, "contents", path_to_click],
+            universal_newlines=True)
+        self.assertTrue(re.search(
+            r'-rw-r[-w]-r-- root/root\s+[0-9]+\s+[0-9-]+ [0-9:]+ ./README',
+            output))
@@ -17,6 +17,7 @@
 
 import json
 import os
+import shutil
 import subprocess
 
 from .helpers import ClickTestCase
@@ -30,6 +31,22 @@ class TestInfo(ClickTestCase):
             self.click_binary, "info", path_to_click], universal_newlines=True)
         self.assertEqual(name, json.loads(output)["name"])
 
+    def test_info_from_path_xz(self):
+        name = "com.example.foo"
+        path_to_click = self._make_click(name, compression="xz")
+        output = subprocess.check_output([
+            self.click_binary, "info", path_to_click], universal_newlines=True)
+        self.assertEqual(name, json.loads(output)["name"])
+
+    def test_info_from_path_zstd(self):
+        if not shutil.which("zstd"):
+            self.skipTest("zstd not installed")
+        name = "com.example.foo"
+        path_to_click = self._make_click(name, compression="zstd")
+        output = subprocess.check_output([
+            self.click_binary, "info", path_to_click], universal_newlines=True)
+        self.assertEqual(name, json.loads(output)["name"])
+
     def test_info_installed_click(self):
         name = "com.example.foo"
         user = os.environ.get("USER", "root")
@@ -64,6 +64,23 @@ gboolean g_spawn_sync         (const gchar          *working_directory,
                                gint                 *exit_status,
                                GError              **error);
 
+/**
+ * g_spawn_async: (attributes headers=glib.h)
+ * @argv: (array zero-terminated=1):
+ * @envp: (array zero-terminated=1):
+ * @flags: (type gint)
+ * @child_setup: (type gpointer)
+ * @child_pid: (out):
+ */
+gboolean g_spawn_async        (const gchar          *working_directory,
+                               gchar               **argv,
+                               gchar               **envp,
+                               GSpawnFlags           flags,
+                               GSpawnChildSetupFunc  child_setup,
+                               gpointer              user_data,
+                               GPid                 *child_pid,
+                               GError              **error);
+
 /**
  * click_find_on_path: (attributes headers=glib.h)
  */
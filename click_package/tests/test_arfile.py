@@ -35,8 +35,14 @@ class TestArFile(TestCase):
         super(TestArFile, self).setUp()
         self.use_temp_dir()
 
-    def test_init_rejects_mode_r(self):
-        self.assertRaises(ValueError, ArFile, mode="r")
+    def test_init_rejects_mode_a(self):
+        self.assertRaises(ValueError, ArFile, mode="a")
+
+    def test_init_rejects_non_ar_file(self):
+        path = os.path.join(self.temp_dir, "foo.a")
+        with open(path, "wb") as f:
+            f.write(b"not an ar file\n")
+        self.assertRaises(IOError, ArFile, name=path, mode="r")
 
     def test_init_name(self):
         path = os.path.join(self.temp_dir, "foo.a")
@@ -84,3 +90,20 @@ class TestArFile(TestCase):
         with open(os.path.join(extract_path, "file-member"), "rb") as member:
             self.assertEqual(
                 b"\x00\x01\x02\x03\x04\x05\x06\x07", member.read())
+
+    def test_reads_members(self):
+        path = os.path.join(self.temp_dir, "foo.a")
+        with ArFile(name=path, mode="w") as arfile:
+            arfile.add_magic()
+            arfile.add_data("odd-member", b"odd")
+            arfile.add_data("even-member", b"even")
+            arfile.add_data("skipped", b"skipped data")
+        with ArFile(name=path, mode="r") as arfile:
+            # Partly-read members are skipped, including padding.
+            self.assertEqual(
+                [("odd-member", b"od"), ("even-member", b"ev"),
+                 ("skipped", b"sk")],
+                [(member.name, member.read(2)) for member in arfile])
+        with ArFile(name=path, mode="r") as arfile:
+            members = list(arfile)
+            self.assertEqual(b"odd", arfile.reopen(members[0]).read())
@@ -21,21 +21,32 @@ __metaclass__ = type
 __all__ = [
     'TestClickBuilder',
     'TestClickSourceBuilder',
+    'TestCompressionBenchmark',
     ]
 
 
+from contextlib import closing
 import json
 import os
+import shutil
 import stat
 import subprocess
 import tarfile
 from textwrap import dedent
 
-from click_package.build import ClickBuildError, ClickBuilder, ClickSourceBuilder
+from click_package.build import (
+    ClickBuildError,
+    ClickBuilder,
+    ClickSourceBuilder,
+    compressions,
+)
+from click_package.install import ClickPackage
 from click_package.preinst import static_preinst
 from click_package.tests.helpers import (
+    BenchmarkTestCase,
     disable_logging,
     mkfile,
+    mock,
     TestCase,
     touch,
 )
@@ -243,6 +254,166 @@ class TestClickBuilder(TestCase, TestClickBuilderBaseMixin):
         subprocess.check_call(["dpkg-deb", "-x", path, extract_path])
         self.assertEqual([], os.listdir(extract_path))
 
+    @disable_logging
+    def test_build_no_staging_copy(self):
+        scratch = self._make_scratch_dir()
+        lib = os.path.join(self.temp_dir, "lib")
+        with mkfile(os.path.join(lib, "foo.so")) as f:
+            f.write("test /usr/lib/foo.so\n")
+        self.builder.add_file(lib, "/usr/lib")
+        with mock.patch("shutil.copytree") as mock_copytree:
+            path = self.builder.build(self.temp_dir)
+        self.assertFalse(mock_copytree.called)
+        self.assertTrue(os.path.exists(os.path.join(scratch, "manifest.json")))
+        control_path = os.path.join(self.temp_dir, "control")
+        subprocess.check_call(["dpkg-deb", "-e", path, control_path])
+        with open(os.path.join(control_path, "md5sums")) as md5sums:
+            self.assertEqual(
+                "62abb4a152faee3da3d662f12a76c7ee  usr/lib/foo.so\n",
+                md5sums.read())
+        extract_path = os.path.join(self.temp_dir, "extract")
+        subprocess.check_call(["dpkg-deb", "-x", path, extract_path])
+        self.assertEqual(["usr"], os.listdir(extract_path))
+        with open(os.path.join(extract_path, "usr", "lib", "foo.so")) as f:
+            self.assertEqual("test /usr/lib/foo.so\n", f.read())
+
+    @disable_logging
+    def test_build_parallel_compression(self):
+        scratch = self._make_scratch_dir()
+        with mkfile(os.path.join(scratch, "toplevel"), mode="wb") as f:
+            f.write(b"test /toplevel\n" * 100000)
+        self.builder.jobs = 4
+        path = self.builder.build(self.temp_dir)
+        extract_path = os.path.join(self.temp_dir, "extract")
+        subprocess.check_call(["dpkg-deb", "-x", path, extract_path])
+        with open(os.path.join(scratch, "toplevel"), "rb") as source, \
+                open(os.path.join(extract_path, "toplevel"), "rb") as target:
+            self.assertEqual(source.read(), target.read())
+
+    def _extract_member(self, path, member_name):
+        return subprocess.check_output(["ar", "p", path, member_name])
+
+    @disable_logging
+    def test_build_cache(self):
+        scratch = self._make_scratch_dir()
+        with mkfile(os.path.join(scratch, "bin", "foo")) as f:
+            f.write("test /bin/foo\n")
+        with mkfile(os.path.join(scratch, "toplevel")) as f:
+            f.write("test /toplevel\n")
+        for dirpath, dirnames, filenames in os.walk(scratch):
+            for name in dirnames + filenames + [""]:
+                os.utime(os.path.join(dirpath, name), (1000000, 1000000))
+        self.builder.cache_dir = os.path.join(self.temp_dir, "cache")
+        first = os.path.join(self.temp_dir, "first")
+        second = os.path.join(self.temp_dir, "second")
+        os.mkdir(first)
+        os.mkdir(second)
+        first_path = self.builder.build(first)
+        cache_dir = os.path.join(self.temp_dir, "cache")
+        [tree_dir] = os.listdir(cache_dir)
+        fragments_dir = os.path.join(cache_dir, tree_dir, "fragments")
+        self.assertEqual(2, len(os.listdir(fragments_dir)))
+        # Unchanged files are neither read nor hashed the second time.
+        with mock.patch("click_package.build.HashingReader") as mock_reader:
+            mock_reader.side_effect = AssertionError("file was read")
+            second_path = self.builder.build(second)
+        self.assertEqual(
+            self._extract_member(first_path, "data.tar.gz"),
+            self._extract_member(second_path, "data.tar.gz"))
+        control_path = os.path.join(self.temp_dir, "control")
+        subprocess.check_call(["dpkg-deb", "-e", second_path, control_path])
+        with open(os.path.join(control_path, "md5sums")) as md5sums:
+            self.assertEqual(
+                "eb774c3ead632b397d6450d1df25e001  bin/foo\n"
+                "49327ce6306df8a87522456b14a179e0  toplevel\n",
+                md5sums.read())
+        extract_path = os.path.join(self.temp_dir, "extract")
+        subprocess.check_call(["dpkg-deb", "-x", second_path, extract_path])
+        with open(os.path.join(extract_path, "bin", "foo")) as f:
+            self.assertEqual("test /bin/foo\n", f.read())
+
+    @disable_logging
+    def test_build_cache_shared(self):
+        scratch = self._make_scratch_dir()
+        with mkfile(os.path.join(scratch, "toplevel")) as f:
+            f.write("test /toplevel\n")
+        other = os.path.join(self.temp_dir, "other")
+        shutil.copytree(scratch, other)
+        for tree in (scratch, other):
+            for dirpath, dirnames, filenames in os.walk(tree):
+                for name in dirnames + filenames + [""]:
+                    os.utime(os.path.join(dirpath, name), (1000000, 1000000))
+        cache_dir = os.path.join(self.temp_dir, "cache")
+        for tree in (scratch, other):
+            builder = ClickBuilder()
+            builder.cache_dir = cache_dir
+            builder.add_file(tree, "./")
+            builder.build(self.temp_dir)
+        # Building one tree does not discard the other's cache.
+        tree_dirs = os.listdir(cache_dir)
+        self.assertEqual(2, len(tree_dirs))
+        for tree_dir in tree_dirs:
+            self.assertEqual(1, len(os.listdir(
+                os.path.join(cache_dir, tree_dir, "fragments"))))
+
+    @disable_logging
+    def test_build_cache_read_back(self):
+        scratch = self._make_scratch_dir()
+        for i in range(3):
+            with mkfile(os.path.join(scratch, "sub", "f%d" % i)) as f:
+                f.write("test /sub/f%d\n" % i)
+        self.builder.cache_dir = os.path.join(self.temp_dir, "cache")
+        for name in ("first", "second"):
+            dest = os.path.join(self.temp_dir, name)
+            os.mkdir(dest)
+            path = self.builder.build(dest)
+        # The cached data member is several gzip members; reading it
+        # sequentially must not stop after the first of them.
+        with closing(ClickPackage(path)) as package:
+            contents = {}
+            for tarinfo, fileobj in package.data_members():
+                contents[tarinfo.name] = (
+                    fileobj.read() if fileobj is not None else None)
+        self.assertEqual(
+            [".", "./sub", "./sub/f0", "./sub/f1", "./sub/f2"],
+            sorted(contents))
+        for i in range(3):
+            self.assertEqual(
+                ("test /sub/f%d\n" % i).encode(),
+                contents["./sub/f%d" % i])
+
+    def _check_compression(self, compression, member_name):
+        scratch = self._make_scratch_dir()
+        with mkfile(os.path.join(scratch, "toplevel")) as f:
+            f.write("test /toplevel\n")
+        self.builder.compression = compression
+        path = self.builder.build(self.temp_dir)
+        members = subprocess.check_output(
+            ["ar", "t", path], universal_newlines=True).splitlines()
+        self.assertEqual(
+            ["debian-binary", "_click-binary", "control.tar.gz", member_name],
+            members)
+        extract_path = os.path.join(self.temp_dir, "extract")
+        subprocess.check_call(["dpkg-deb", "-x", path, extract_path])
+        self.assertEqual(["toplevel"], os.listdir(extract_path))
+
+    @disable_logging
+    def test_build_xz(self):
+        self._check_compression("xz", "data.tar.xz")
+
+    @disable_logging
+    def test_build_zstd(self):
+        if not shutil.which("zstd"):
+            self.skipTest("zstd not installed")
+        self._check_compression("zstd", "data.tar.zst")
+
+    def test_build_unknown_compression(self):
+        self._make_scratch_dir()
+        self.builder.compression = "lzip"
+        self.assertRaisesRegex(
+            ClickBuildError, "Unknown compression method 'lzip'",
+            self.builder.build, self.temp_dir)
+
     @disable_logging
     def test_build_multiple_architectures(self):
         scratch = self._make_scratch_dir(manifest_override={
@@ -280,6 +451,35 @@ class TestClickBuilder(TestCase, TestClickBuilderBaseMixin):
             self.assertEqual(source_json, target_json)
 
 
+class TestCompressionBenchmark(BenchmarkTestCase):
+    def test_size_and_unpack_time(self):
+        scratch, _ = self.make_benchmark_tree()
+        for compression in sorted(compressions):
+            if compression == "zstd" and not shutil.which("zstd"):
+                continue
+            dest = os.path.join(self.temp_dir, compression)
+            os.mkdir(dest)
+            builder = ClickBuilder()
+            builder.compression = compression
+            builder.add_file(scratch, "./")
+            path = self.timed(
+                "build with --compression=%s" % compression,
+                builder.build, dest)
+            members = subprocess.check_output(
+                ["ar", "t", path], universal_newlines=True).splitlines()
+            self.assertEqual(
+                "data.tar.%s" % compressions[compression], members[-1])
+            extract_path = os.path.join(dest, "extract")
+            self.timed(
+                "unpack %d-byte %s package" % (
+                    os.path.getsize(path), compression),
+                subprocess.check_call,
+                ["dpkg-deb", "-x", path, extract_path])
+            self.assertEqual(
+                sorted(os.listdir(os.path.join(scratch, "data"))),
+                sorted(os.listdir(os.path.join(extract_path, "data"))))
+
+
 class TestClickFrameworkValidation(TestCase):
     def setUp(self):
         super(TestClickFrameworkValidation, self).setUp()
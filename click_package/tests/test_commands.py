@@ -0,0 +1,223 @@
+# Copyright (C) 2026 UBports Foundation
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; version 3 of the License.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Unit tests for click_package.commands."""
+
+from __future__ import print_function
+
+__metaclass__ = type
+__all__ = [
+    'TestCommandMetadata',
+    'TestContentsLister',
+    'TestStartupImports',
+    ]
+
+
+from contextlib import closing
+import io
+import os
+import re
+import shutil
+import subprocess
+import sys
+import tarfile
+from unittest import skipUnless
+
+import click_package
+from click_package.arfile import ArFile
+from click_package.commands import (
+    all_commands,
+    descriptions,
+    help_text,
+    hidden_commands,
+    load_command,
+    )
+from click_package.commands.contents import ContentsLister
+from click_package.tests.helpers import TestCase
+
+
+top_srcdir = os.path.dirname(os.path.dirname(click_package.__file__))
+
+
+class TestCommandMetadata(TestCase):
+    def test_descriptions_match_docstrings(self):
+        for command in all_commands:
+            if command in hidden_commands:
+                self.assertNotIn(command, descriptions)
+                continue
+            self.assertEqual(
+                load_command(command).__doc__.splitlines()[0],
+                descriptions[command])
+
+    def test_help_text_imports_no_commands(self):
+        output = subprocess.check_output(
+            [sys.executable, "-c",
+             "import sys; "
+             "from click_package import commands; "
+             "commands.help_text(); "
+             "print(sorted(name for name in sys.modules "
+             "if name.startswith('click_package.commands.')))"],
+            cwd=top_srcdir, universal_newlines=True)
+        self.assertEqual("[]\n", output)
+
+    def test_help_text(self):
+        lines = help_text().splitlines()
+        self.assertEqual(len(all_commands) - len(hidden_commands), len(lines))
+        self.assertEqual(
+            "  pkgdir                Print the directory where a Click "
+            "package is unpacked.",
+            lines[all_commands.index("pkgdir") - 1])
+
+
+class TestStartupImports(TestCase):
+    """Check what "click pkgdir" and "click list" import at startup.
+
+    Read-only queries must not load the modules needed to build or install
+    packages.  Set TEST_BENCHMARK to also check the total import time of
+    each against a budget of TEST_IMPORT_BUDGET milliseconds (default: 150).
+    """
+
+    # Modules (or packages) that these commands have no use for.
+    forbidden = (
+        "apt_pkg",
+        "click_package.build",
+        "click_package.chroot",
+        "click_package.framework",
+        "click_package.install",
+        "debian",
+        "urllib.request",
+        "xml.etree",
+        )
+
+    def _import_times(self, argv):
+        """Return a dict of module names to import times in microseconds.
+
+        The command module itself is loaded by importlib.import_module,
+        which -X importtime does not see, but everything it imports is
+        listed.
+        """
+        if sys.version_info < (3, 7):
+            self.skipTest("-X importtime needs Python 3.7")
+        click = os.path.join(top_srcdir, "bin", "click")
+        if not os.path.exists(click):
+            self.skipTest("bin/click not found")
+        env = dict(os.environ)
+        # Don't let a running "click serve" answer instead.
+        env.pop("XDG_RUNTIME_DIR", None)
+        process = subprocess.Popen(
+            [sys.executable, "-X", "importtime", click] + argv + ["--help"],
+            stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, env=env,
+            universal_newlines=True)
+        _, stderr = process.communicate()
+        self.assertEqual(0, process.returncode, stderr)
+        times = {}
+        for line in stderr.splitlines():
+            match = re.match(
+                r"import time:\s+(\d+)\s+\|\s+\d+\s+\|\s*(\S+)$", line)
+            if match:
+                times[match.group(2)] = int(match.group(1))
+        return times
+
+    def _check(self, argv):
+        times = self._import_times(argv)
+        for name in times:
+            for forbidden in self.forbidden:
+                self.assertFalse(
+                    name == forbidden or name.startswith(forbidden + "."),
+                    "click %s imports %s" % (argv[0], name))
+        if "TEST_BENCHMARK" in os.environ:
+            total = sum(times.values()) / 1000
+            budget = int(os.environ.get("TEST_IMPORT_BUDGET", "150"))
+            print(
+                "\nclick %s imports: %.1fms (budget %dms)" % (
+                    argv[0], total, budget),
+                file=sys.stderr)
+            self.assertLessEqual(total, budget)
+
+    def test_pkgdir(self):
+        self._check(["pkgdir"])
+
+    def test_list(self):
+        self._check(["list"])
+
+
+def _tar_bytes(entries):
+    """Return a gzipped tarball of entries, as (TarInfo, data) pairs."""
+    buf = io.BytesIO()
+    with tarfile.open(fileobj=buf, mode="w:gz") as tar:
+        for tarinfo, data in entries:
+            tarinfo.mtime = 1400000000
+            tarinfo.size = len(data) if data is not None else 0
+            tar.addfile(
+                tarinfo, io.BytesIO(data) if data is not None else None)
+    return buf.getvalue()
+
+
+def _tarinfo(name, type=tarfile.REGTYPE, mode=0o644, user="root",
+             group="root", **kwargs):
+    tarinfo = tarfile.TarInfo(name)
+    tarinfo.type = type
+    tarinfo.mode = mode
+    tarinfo.uname = user
+    tarinfo.gname = group
+    for key, value in kwargs.items():
+        setattr(tarinfo, key, value)
+    return tarinfo
+
+
+@skipUnless(shutil.which("dpkg-deb"), "dpkg-deb not installed")
+class TestContentsLister(TestCase):
+    def setUp(self):
+        super(TestContentsLister, self).setUp()
+        self.use_temp_dir()
+
+    def test_matches_dpkg_deb(self):
+        control = _tarinfo("./control")
+        data_entries = [
+            (_tarinfo("./", type=tarfile.DIRTYPE, mode=0o755), None),
+            (_tarinfo("./bin", type=tarfile.DIRTYPE, mode=0o755), None),
+            (_tarinfo("./bin/foo", mode=0o755), b"#! /bin/sh\n"),
+            (_tarinfo("./bin/bar", type=tarfile.SYMTYPE, mode=0o777,
+                      linkname="foo"), None),
+            (_tarinfo("./bin/baz", type=tarfile.LNKTYPE, mode=0o755,
+                      linkname="./bin/foo"), None),
+            (_tarinfo("./setuid", mode=0o4755), b"x"),
+            (_tarinfo("./fifo", type=tarfile.FIFOTYPE), None),
+            (_tarinfo("./null", type=tarfile.CHRTYPE, mode=0o666,
+                      devmajor=1, devminor=3), None),
+            (_tarinfo("./numeric", user="", group="", uid=1234,
+                      gid=5678), b"numeric"),
+            # Wider than the default column, which then stays wide.
+            (_tarinfo("./wide", user="a-rather-long-user",
+                      group="and-group"), b"w" * 123456),
+            (_tarinfo("./after"), b"after"),
+        ]
+        path = os.path.join(self.temp_dir, "test.click")
+        with ArFile(name=path, mode="w") as package:
+            package.add_magic()
+            package.add_data("debian-binary", b"2.0\n")
+            package.add_data(
+                "control.tar.gz",
+                _tar_bytes([(control, b"Package: test\n")]))
+            package.add_data("data.tar.gz", _tar_bytes(data_entries))
+        expected = subprocess.check_output(
+            ["dpkg-deb", "-c", path], universal_newlines=True).splitlines()
+        # Deferred, since this pulls in python-debian.
+        from click_package.install import ClickPackage
+        lister = ContentsLister()
+        with closing(ClickPackage(path)) as package:
+            self.assertEqual(
+                expected,
+                [lister.format(tarinfo)
+                 for tarinfo, _ in package.data_members()])
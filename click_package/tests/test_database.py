@@ -148,6 +148,66 @@ class TestClickSingleDB(TestCase):
         ], self._installed_packages_tuplify(
             self.db.get_packages(all_versions=True)))
 
+    def _make_indexed_packages(self):
+        for package, version in (("a", "1.0"), ("a", "1.1"), ("b", "0.1")):
+            with mkfile(os.path.join(
+                    self.temp_dir, package, version, ".click", "info",
+                    "%s.manifest" % package)) as manifest:
+                json.dump({"name": package, "version": version}, manifest)
+        os.symlink("1.1", os.path.join(self.temp_dir, "a", "current"))
+        os.makedirs(os.path.join(self.temp_dir, ".click"))
+        # Backdate the database so that the index counts as fresh.
+        for path in (
+                self.temp_dir, os.path.join(self.temp_dir, "a"),
+                os.path.join(self.temp_dir, "b")):
+            os.utime(path, (0, 0))
+        self.db.update_index()
+
+    def test_update_index(self):
+        self._make_indexed_packages()
+        with open(os.path.join(
+                self.temp_dir, ".click", "index.json")) as index_file:
+            index = json.load(index_file)
+        self.assertEqual(2, index["format"])
+        self.assertEqual(["a", "b"], sorted(index["packages"]))
+        self.assertEqual("1.1", index["packages"]["a"]["current"])
+        self.assertEqual(
+            {"1.0": {"name": "a", "version": "1.0"},
+             "1.1": {"name": "a", "version": "1.1"}},
+            index["packages"]["a"]["versions"])
+
+    def test_packages_from_index(self):
+        self._make_indexed_packages()
+        self.assertEqual([
+            ("a", "1.0", os.path.join(self.temp_dir, "a", "1.0")),
+            ("a", "1.1", os.path.join(self.temp_dir, "a", "1.1")),
+            ("b", "0.1", os.path.join(self.temp_dir, "b", "0.1")),
+        ], self._installed_packages_tuplify(
+            self.db.get_packages(all_versions=True)))
+
+    def test_packages_stale_index(self):
+        self._make_indexed_packages()
+        os.makedirs(os.path.join(self.temp_dir, "b", "0.2"))
+        os.makedirs(os.path.join(self.temp_dir, "c", "2.0"))
+        self.assertEqual([
+            ("a", "1.0", os.path.join(self.temp_dir, "a", "1.0")),
+            ("a", "1.1", os.path.join(self.temp_dir, "a", "1.1")),
+            ("b", "0.1", os.path.join(self.temp_dir, "b", "0.1")),
+            ("b", "0.2", os.path.join(self.temp_dir, "b", "0.2")),
+            ("c", "2.0", os.path.join(self.temp_dir, "c", "2.0")),
+        ], self._installed_packages_tuplify(
+            self.db.get_packages(all_versions=True)))
+
+    def test_packages_bad_index(self):
+        os.makedirs(os.path.join(self.temp_dir, "a", "1.0"))
+        with mkfile(os.path.join(
+                self.temp_dir, ".click", "index.json")) as index_file:
+            print("{bad syntax", file=index_file)
+        self.assertEqual([
+            ("a", "1.0", os.path.join(self.temp_dir, "a", "1.0")),
+        ], self._installed_packages_tuplify(
+            self.db.get_packages(all_versions=True)))
+
     def test_manifest(self):
         manifest_path = os.path.join(
             self.temp_dir, "a", "1.0", ".click", "info", "a.manifest")
@@ -889,6 +949,84 @@ class TestClickDB(TestCase):
             [b_pkg1_manifest_obj, b_pkg2_manifest_obj],
             json.loads(db.get_manifests_as_string(all_versions=False)))
 
+    def test_manifests_from_index(self):
+        a_path = os.path.join(self.temp_dir, "a", "1.0")
+        a_manifest_path = os.path.join(a_path, ".click", "info", "a.manifest")
+        with mkfile(a_manifest_path) as manifest:
+            json.dump({"name": "a", "version": "1.0"}, manifest)
+        os.symlink("1.0", os.path.join(self.temp_dir, "a", "current"))
+        os.makedirs(os.path.join(self.temp_dir, ".click"))
+        for path in (self.temp_dir, os.path.join(self.temp_dir, "a")):
+            os.utime(path, (0, 0))
+        db = Click.DB()
+        db.add(self.temp_dir)
+        db.update_index()
+        # Changing the manifest in place does not invalidate the index,
+        # which shows that the manifest is served from it.
+        with mkfile(a_manifest_path) as manifest:
+            json.dump({"name": "a", "version": "1.0", "x": 1}, manifest)
+        self.assertEqual([{
+            "name": "a", "version": "1.0", "_directory": a_path,
+            "_removable": 1,
+        }], json_array_to_python(db.get_manifests(all_versions=True)))
+
+    def test_manifests_from_index_just_unpacked(self):
+        # Packages unpacked just after the index is written, within the
+        # same second, show up straight away.
+        a_path = os.path.join(self.temp_dir, "a", "1.0")
+        with mkfile(os.path.join(
+                a_path, ".click", "info", "a.manifest")) as manifest:
+            json.dump({"name": "a", "version": "1.0"}, manifest)
+        os.symlink("1.0", os.path.join(self.temp_dir, "a", "current"))
+        os.makedirs(os.path.join(self.temp_dir, ".click"))
+        db = Click.DB()
+        db.add(self.temp_dir)
+        db.update_index()
+        a_new_path = os.path.join(self.temp_dir, "a", "1.1")
+        with mkfile(os.path.join(
+                a_new_path, ".click", "info", "a.manifest")) as manifest:
+            json.dump({"name": "a", "version": "1.1"}, manifest)
+        b_path = os.path.join(self.temp_dir, "b", "1.0")
+        with mkfile(os.path.join(
+                b_path, ".click", "info", "b.manifest")) as manifest:
+            json.dump({"name": "b", "version": "1.0"}, manifest)
+        os.symlink("1.0", os.path.join(self.temp_dir, "b", "current"))
+        self.assertEqual([
+            {
+                "name": "a", "version": "1.0", "_directory": a_path,
+                "_removable": 1,
+            },
+            {
+                "name": "a", "version": "1.1", "_directory": a_new_path,
+                "_removable": 1,
+            },
+            {
+                "name": "b", "version": "1.0", "_directory": b_path,
+                "_removable": 1,
+            },
+        ], json_array_to_python(db.get_manifests(all_versions=True)))
+
+    def test_manifest_cache(self):
+        a_manifest_path = os.path.join(
+            self.temp_dir, "a", "1.0", ".click", "info", "a.manifest")
+        with mkfile(a_manifest_path) as manifest:
+            json.dump({"name": "a", "version": "1.0"}, manifest)
+        os.utime(a_manifest_path, (0, 0))
+        db = Click.DB()
+        db.add(self.temp_dir)
+        manifest = json_object_to_python(db.get_manifest("a", "1.0"))
+        self.assertEqual(
+            manifest, json_object_to_python(db.get_manifest("a", "1.0")))
+        self.assertEqual(1, db.props.manifest_cache_misses)
+        self.assertEqual(1, db.props.manifest_cache_hits)
+        # Rewriting the manifest invalidates the cached copy.
+        with mkfile(a_manifest_path) as manifest:
+            json.dump({"name": "a", "version": "1.0", "x": 1}, manifest)
+        os.utime(a_manifest_path, (1, 1))
+        self.assertEqual(
+            1, json_object_to_python(db.get_manifest("a", "1.0"))["x"])
+        self.assertEqual(2, db.props.manifest_cache_misses)
+
     def test_manifests_all(self):
         with open(os.path.join(self.temp_dir, "a.conf"), "w") as a:
             print("[Click Database]", file=a)
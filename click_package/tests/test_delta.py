@@ -0,0 +1,130 @@
+# Copyright (C) 2026 UBports Foundation
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; version 3 of the License.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Unit tests for click_package.delta."""
+
+from __future__ import print_function
+
+__metaclass__ = type
+__all__ = [
+    'TestClickDeltaBuilder',
+    ]
+
+
+import json
+import os
+import subprocess
+import tarfile
+
+from click_package.build import ClickBuilder
+from click_package.delta import ClickDeltaBuilder, ClickDeltaError
+from click_package.install import delta_source
+from click_package.tests.helpers import (
+    disable_logging,
+    mkfile,
+    TestCase,
+)
+
+
+class TestClickDeltaBuilder(TestCase):
+    def setUp(self):
+        super(TestClickDeltaBuilder, self).setUp()
+        self.use_temp_dir()
+
+    def _build(self, version, files, name="com.example.test"):
+        scratch = os.path.join(self.temp_dir, "scratch-%s" % version)
+        with mkfile(os.path.join(scratch, "manifest.json")) as f:
+            json.dump({
+                "name": name,
+                "version": version,
+                "maintainer": "Foo Bar <foo@example.org>",
+                "title": "test title",
+                "architecture": "all",
+                "framework": "ubuntu-sdk-13.10",
+            }, f)
+        for path, contents in files.items():
+            with mkfile(os.path.join(scratch, path)) as f:
+                f.write(contents)
+        dest = os.path.join(self.temp_dir, "out-%s" % version)
+        os.mkdir(dest)
+        builder = ClickBuilder()
+        builder.add_file(scratch, "./")
+        return builder.build(dest)
+
+    def _data_entries(self, path):
+        data = subprocess.check_output(["ar", "p", path, "data.tar.gz"])
+        data_path = os.path.join(self.temp_dir, "data.tar.gz")
+        with open(data_path, "wb") as f:
+            f.write(data)
+        with tarfile.open(data_path) as tar:
+            return dict(
+                (tarinfo.name, (tarinfo.size, tarinfo.pax_headers))
+                for tarinfo in tar)
+
+    @disable_logging
+    def test_build(self):
+        old_path = self._build("1.0", {
+            "same": "same contents\n",
+            "changed": "old contents\n",
+            "moved": "moved contents\n",
+        })
+        new_path = self._build("1.1", {
+            "same": "same contents\n",
+            "changed": "new contents\n",
+            "sub/moved": "moved contents\n",
+        })
+        builder = ClickDeltaBuilder(old_path, new_path)
+        path = builder.build(self.temp_dir)
+        self.assertEqual(
+            "com.example.test_1.0_to_1.1_all.click-delta",
+            os.path.basename(path))
+        self.assertEqual(
+            ["debian-binary", "_click-delta", "control.tar.gz",
+             "data.tar.gz"],
+            subprocess.check_output(
+                ["ar", "t", path], universal_newlines=True).split())
+        self.assertEqual(
+            {"base-version": "1.0"},
+            json.loads(subprocess.check_output(
+                ["ar", "p", path, "_click-delta"],
+                universal_newlines=True)))
+        self.assertEqual(
+            subprocess.check_output(["ar", "p", new_path, "control.tar.gz"]),
+            subprocess.check_output(["ar", "p", path, "control.tar.gz"]))
+        entries = self._data_entries(path)
+        self.assertEqual(0, entries["./same"][0])
+        self.assertEqual("same", entries["./same"][1][delta_source])
+        self.assertEqual(0, entries["./sub/moved"][0])
+        self.assertEqual("moved", entries["./sub/moved"][1][delta_source])
+        self.assertEqual(len("new contents\n"), entries["./changed"][0])
+        self.assertNotIn(delta_source, entries["./changed"][1])
+        self.assertEqual(2, builder.reused_files)
+        self.assertEqual(
+            len("same contents\n") + len("moved contents\n"),
+            builder.reused_bytes)
+
+    @disable_logging
+    def test_build_different_packages(self):
+        old_path = self._build("1.0", {}, name="com.example.test")
+        new_path = self._build("1.1", {}, name="com.example.other")
+        self.assertRaisesRegex(
+            ClickDeltaError, "not versions of the same package",
+            ClickDeltaBuilder(old_path, new_path).build, self.temp_dir)
+
+    @disable_logging
+    def test_build_same_version(self):
+        old_path = self._build("1.0", {})
+        self.assertRaisesRegex(
+            ClickDeltaError, "have the same version",
+            ClickDeltaBuilder(old_path, old_path).build, self.temp_dir)
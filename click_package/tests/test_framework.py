@@ -20,6 +20,7 @@ from __future__ import print_function
 __metaclass__ = type
 __all__ = [
     'TestClickFramework',
+    'TestImportAptPkg',
     ]
 
 
@@ -27,7 +28,8 @@ import os
 
 from gi.repository import Click
 
-from click_package.tests.helpers import TestCase, touch
+from click_package import framework
+from click_package.tests.helpers import TestCase, mock, touch
 
 
 class TestClickFramework(TestCase):
@@ -140,3 +142,21 @@ class TestClickFramework(TestCase):
                 framework.get_field, "nonexistent")
             self.assertEqual("ubuntu-sdk", framework.get_base_name())
             self.assertEqual("14.04", framework.get_base_version())
+
+
+class TestImportAptPkg(TestCase):
+    @mock.patch("click_package.framework._apt_pkg", None)
+    def test_failure_cached(self):
+        real_import = __import__
+        attempts = []
+
+        def fake_import(name, *args, **kwargs):
+            if name == "apt_pkg":
+                attempts.append(name)
+                raise ImportError("No module named apt_pkg")
+            return real_import(name, *args, **kwargs)
+
+        with mock.patch("builtins.__import__", side_effect=fake_import):
+            self.assertIsNone(framework._import_apt_pkg())
+            self.assertIsNone(framework._import_apt_pkg())
+        self.assertEqual(["apt_pkg"], attempts)
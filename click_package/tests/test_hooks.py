@@ -32,11 +32,12 @@ from itertools import takewhile
 import json
 import os
 from textwrap import dedent
+import time
 
 from gi.repository import Click, GLib
 
 from click_package.tests.gimock_types import Passwd
-from click_package.tests.helpers import TestCase, mkfile, mkfile_utf8
+from click_package.tests.helpers import TestCase, mkfile, mkfile_utf8, touch
 
 
 class TestClickPatternFormatter(TestCase):
@@ -145,6 +146,18 @@ class TestClickHookBase(TestCase):
             self.delegate_to_original("g_spawn_sync")
         return 0
 
+    def g_spawn_async_side_effect(self, status_map, working_directory, argv,
+                                  envp, flags, child_setup, user_data,
+                                  child_pid, error):
+        self.spawn_calls.append(list(takewhile(lambda x: x is not None, argv)))
+        # Stand in for the command with a child that just exits with the
+        # requested status, so that there is still something to wait for.
+        pid = os.fork()
+        if pid == 0:
+            os._exit(status_map[argv[2]])
+        child_pid[0] = pid
+        return 1
+
 
 class TestClickHookSystemLevel(TestClickHookBase):
     def test_open(self):
@@ -198,6 +211,70 @@ class TestClickHookSystemLevel(TestClickHookBase):
             hook = Click.Hook.open(self.db, "test")
             self.assertEqual("other", hook.get_hook_name())
 
+    def test_open_all_reloads(self):
+        with self.run_in_subprocess(
+                "click_get_hooks_dir") as (enter, preloads):
+            enter()
+            self._setup_hooks_dir(
+                preloads, hooks_dir=os.path.join(self.temp_dir, "hooks"))
+            self._make_hook_file(
+                "Pattern: a\nHook-Name: x", hookname="a")
+            os.utime(os.path.join(self.hooks_dir, "a.hook"), (0, 0))
+            os.utime(self.hooks_dir, (0, 0))
+            self.assertEqual(
+                ["a"], [hook.get_field("pattern")
+                        for hook in Click.Hook.open_all(self.db, "x")])
+            self._make_hook_file(
+                "Pattern: b\nHook-Name: x", hookname="b")
+            self.assertEqual(
+                ["a", "b"],
+                [hook.get_field("pattern")
+                 for hook in Click.Hook.open_all(self.db, "x")])
+            # Changing a hook in place is noticed even though the hooks
+            # directory itself is unchanged.
+            os.utime(self.hooks_dir, (0, 0))
+            self._make_hook_file(
+                "Pattern: a\nHook-Name: y", hookname="a")
+            os.utime(os.path.join(self.hooks_dir, "a.hook"), (1, 1))
+            self.assertEqual(
+                ["b"],
+                [hook.get_field("pattern")
+                 for hook in Click.Hook.open_all(self.db, "x")])
+            self.assertEqual(
+                ["a"],
+                [hook.get_field("pattern")
+                 for hook in Click.Hook.open_all(self.db, "y")])
+
+    def test_open_all_reloads_same_second(self):
+        with self.run_in_subprocess(
+                "click_get_hooks_dir") as (enter, preloads):
+            enter()
+            self._setup_hooks_dir(
+                preloads, hooks_dir=os.path.join(self.temp_dir, "hooks"))
+            # Start at the beginning of a second, so that the first load
+            # happens in the same second as the hook is written.
+            time.sleep(1 - time.time() % 1)
+            now = int(time.time())
+            self._make_hook_file(
+                "Pattern: a\nHook-Name: x", hookname="a")
+            os.utime(os.path.join(self.hooks_dir, "a.hook"), (now, now))
+            self.assertEqual(
+                ["a"], [hook.get_field("pattern")
+                        for hook in Click.Hook.open_all(self.db, "x")])
+            # A change later in that second leaves the size and
+            # modification time as they were, so it must be reread
+            # however much later the next load happens.
+            time.sleep(1.1)
+            self._make_hook_file(
+                "Pattern: a\nHook-Name: y", hookname="a")
+            os.utime(os.path.join(self.hooks_dir, "a.hook"), (now, now))
+            self.assertEqual(
+                [], [hook.get_field("pattern")
+                     for hook in Click.Hook.open_all(self.db, "x")])
+            self.assertEqual(
+                ["a"], [hook.get_field("pattern")
+                        for hook in Click.Hook.open_all(self.db, "y")])
+
     def test_invalid_app_id(self):
         with self.run_in_subprocess(
                 "click_get_hooks_dir") as (enter, preloads):
@@ -267,6 +344,84 @@ class TestClickHookSystemLevel(TestClickHookBase):
             self.assertEqual(
                 [[b"/bin/sh", b"-c", b"test-update"]], self.spawn_calls)
 
+    def test_run_commands_batched(self):
+        with self.run_in_subprocess(
+                "click_get_hooks_dir", "g_spawn_sync") as (enter, preloads):
+            enter()
+            self._setup_hooks_dir(preloads)
+            preloads["g_spawn_sync"].side_effect = partial(
+                self.g_spawn_sync_side_effect, {b"/bin/sh": 0})
+            with mkfile(os.path.join(self.temp_dir, "test.hook")) as f:
+                print("Exec: test-update", file=f)
+                print("User: root", file=f)
+            hook = Click.Hook.open(self.db, "test")
+            batch = Click.HookBatch()
+            batch.begin()
+            inner = Click.HookBatch()
+            inner.begin()
+            hook.run_commands(user_name=None)
+            inner.commit()
+            hook.run_commands(user_name=None)
+            self.assertEqual([], self.spawn_calls)
+            batch.commit()
+            self.assertEqual(
+                [[b"/bin/sh", b"-c", b"test-update"]], self.spawn_calls)
+            hook.run_commands(user_name=None)
+            self.assertEqual(2, len(self.spawn_calls))
+
+    def test_run_commands_batch_abort(self):
+        with self.run_in_subprocess(
+                "click_get_hooks_dir", "g_spawn_sync") as (enter, preloads):
+            enter()
+            self._setup_hooks_dir(preloads)
+            preloads["g_spawn_sync"].side_effect = partial(
+                self.g_spawn_sync_side_effect, {b"/bin/sh": 1})
+            with mkfile(os.path.join(self.temp_dir, "test.hook")) as f:
+                print("Exec: test-update", file=f)
+                print("User: root", file=f)
+            hook = Click.Hook.open(self.db, "test")
+            batch = Click.HookBatch()
+            batch.begin()
+            hook.run_commands(user_name=None)
+            # Aborting still runs the queued command, but does not raise
+            # its failure.
+            batch.abort()
+            self.assertEqual(
+                [[b"/bin/sh", b"-c", b"test-update"]], self.spawn_calls)
+            # Once a batch has been committed, aborting it does nothing.
+            batch.begin()
+            batch.commit()
+            batch.abort()
+            self.assertRaisesHooksError(
+                Click.HooksError.COMMAND_FAILED, hook.run_commands,
+                user_name=None)
+
+    def test_run_commands_batched_parallel(self):
+        with self.run_in_subprocess(
+                "click_get_hooks_dir", "g_spawn_async") as (enter, preloads):
+            enter()
+            self._setup_hooks_dir(
+                preloads, hooks_dir=os.path.join(self.temp_dir, "hooks"))
+            preloads["g_spawn_async"].side_effect = partial(
+                self.g_spawn_async_side_effect,
+                {b"a-update": 0, b"b-update": 1, b"c-update": 0})
+            for name in ("a", "b", "c"):
+                self._make_hook_file(
+                    "Exec: %s-update\nUser: root" % name, hookname=name)
+            batch = Click.HookBatch()
+            batch.props.jobs = 2
+            batch.begin()
+            for hook in Click.Hook.open_all(self.db):
+                hook.run_commands(user_name=None)
+            self.assertEqual([], self.spawn_calls)
+            self.assertRaisesHooksError(
+                Click.HooksError.COMMAND_FAILED, batch.commit)
+            self.assertCountEqual([
+                [b"/bin/sh", b"-c", b"a-update"],
+                [b"/bin/sh", b"-c", b"b-update"],
+                [b"/bin/sh", b"-c", b"c-update"],
+            ], self.spawn_calls)
+
     def test_run_commands_fail(self):
         with self.run_in_subprocess(
                 "click_get_hooks_dir", "g_spawn_sync") as (enter, preloads):
@@ -614,6 +769,41 @@ class TestClickHookUserLevel(TestClickHookBase):
                 Click.HooksError.COMMAND_FAILED, hook.run_commands,
                 user_name=self.TEST_USER)
 
+    def test_run_user_hooks_other_error_ends_batch(self):
+        with self.run_in_subprocess(
+                "click_get_hooks_dir", "click_get_user_home", "g_spawn_sync",
+                ) as (enter, preloads):
+            enter()
+            self._setup_hooks_dir(
+                preloads, hooks_dir=os.path.join(self.temp_dir, "hooks"))
+            preloads["click_get_user_home"].return_value = b"/home/test-user"
+            preloads["g_spawn_sync"].side_effect = partial(
+                self.g_spawn_sync_side_effect, {b"/bin/sh": 0})
+            self._make_hook_file(dedent("""\
+                User-Level: yes
+                Pattern: %s/${id}.a
+                Exec: a-update""") % self.temp_dir, hookname="a")
+            # Hook b's link directory is a regular file, so syncing it
+            # fails with a FileError rather than a HooksError.
+            not_a_dir = os.path.join(self.temp_dir, "not-a-dir")
+            touch(not_a_dir)
+            self._make_hook_file(dedent("""\
+                User-Level: yes
+                Pattern: %s/${id}.b""") % not_a_dir, hookname="b")
+            self.assertRaisesFileError(
+                GLib.FileError.NOTDIR, Click.run_user_hooks, self.db,
+                user_name=self.TEST_USER)
+            self.assertEqual(
+                [[b"/bin/sh", b"-c", b"a-update"]], self.spawn_calls)
+            # The failed run must not leave its batch active, or this one
+            # would defer its commands to it and never run them.
+            hook = Click.Hook.open(self.db, "a")
+            batch = Click.HookBatch()
+            batch.begin()
+            hook.run_commands(user_name=self.TEST_USER)
+            batch.commit()
+            self.assertEqual(2, len(self.spawn_calls))
+
     def test_install_package(self):
         with self.run_in_subprocess(
                 "click_get_hooks_dir", "click_get_user_home",
@@ -20,6 +20,7 @@ from __future__ import print_function
 __metaclass__ = type
 __all__ = [
     'TestClickInstaller',
+    'TestDebsigVerifyCache',
     ]
 
 
@@ -30,10 +31,12 @@ from contextlib import (
 import hashlib
 import json
 import os
+import re
 import shutil
 import stat
 import subprocess
 import tarfile
+import threading
 
 from unittest import skipUnless
 
@@ -42,9 +45,14 @@ from gi.repository import Click
 
 from click_package.arfile import ArFile
 from click_package.build import ClickBuilder
+from click_package.delta import ClickDeltaBuilder
 from click_package.install import (
     ClickInstaller,
+    DebsigVerify,
+    DebsigVerifyCache,
+    DebsigVerifyError,
     ClickInstallerAuditError,
+    ClickInstallerError,
     ClickInstallerPermissionDenied,
 )
 from click_package.preinst import static_preinst
@@ -89,7 +97,8 @@ class TestClickInstaller(TestCase):
         self.debsig_patcher.stop()
 
     def make_fake_package(self, control_fields=None, manifest=None,
-                          control_scripts=None, data_files=None):
+                          control_scripts=None, data_files=None,
+                          compression="gzip"):
         """Build a fake package with given contents."""
         control_fields = {} if control_fields is None else control_fields
         control_scripts = {} if control_scripts is None else control_scripts
@@ -118,8 +127,9 @@ class TestClickInstaller(TestCase):
             else:
                 shutil.copy2(path, os.path.join(data_dir, name))
         package_path = '%s.click' % data_dir
-        ClickBuilder()._pack(
-            self.temp_dir, control_dir, data_dir, package_path)
+        builder = ClickBuilder()
+        builder.compression = compression
+        builder._pack(self.temp_dir, control_dir, data_dir, package_path)
         return package_path
 
     def test_audit_no_click_version(self):
@@ -293,6 +303,24 @@ class TestClickInstaller(TestCase):
             installer = ClickInstaller(self.db)
             self.assertEqual(("test-package", "1.0"), installer.audit(path))
 
+    def test_audit_passes_xz_package(self):
+        with self.run_in_subprocess(
+                "click_get_frameworks_dir") as (enter, preloads):
+            enter()
+            path = self.make_fake_package(
+                control_fields={"Click-Version": "0.2"},
+                manifest={
+                    "name": "test-package",
+                    "version": "1.0",
+                    "framework": "ubuntu-sdk-13.10",
+                },
+                control_scripts={"preinst": static_preinst},
+                data_files={"foo": None},
+                compression="xz")
+            self._setup_frameworks(preloads, frameworks=["ubuntu-sdk-13.10"])
+            installer = ClickInstaller(self.db)
+            self.assertEqual(("test-package", "1.0"), installer.audit(path))
+
     def test_audit_multiple_frameworks(self):
         with self.run_in_subprocess(
                 "click_get_frameworks_dir") as (enter, preloads):
@@ -384,11 +412,56 @@ class TestClickInstaller(TestCase):
                 },
                 data_files={"foo": None})
             self._setup_frameworks(preloads, frameworks=["ubuntu-sdk-13.10"])
-            with mock_quiet_subprocess_call():
-                installer = ClickInstaller(self.db)
-                self.assertRaises(
-                    subprocess.CalledProcessError, installer.audit,
-                    path, slow=True)
+            installer = ClickInstaller(self.db)
+            self.assertRaisesRegex(
+                ClickInstallerAuditError, "MD5 sum mismatch for foo",
+                installer.audit, path, slow=True)
+
+    def test_audit_md5sums_missing_file(self):
+        with self.run_in_subprocess(
+                "click_get_frameworks_dir") as (enter, preloads):
+            enter()
+            path = self.make_fake_package(
+                control_fields={"Click-Version": "0.2"},
+                manifest={
+                    "name": "test-package",
+                    "version": "1.0",
+                    "framework": "ubuntu-sdk-13.10",
+                },
+                control_scripts={
+                    "preinst": static_preinst,
+                    "md5sums": "%s  bar" % ("0" * 32),
+                },
+                data_files={"foo": None})
+            self._setup_frameworks(preloads, frameworks=["ubuntu-sdk-13.10"])
+            installer = ClickInstaller(self.db)
+            self.assertRaisesRegex(
+                ClickInstallerAuditError,
+                "File bar listed in md5sums is missing from the package",
+                installer.audit, path, slow=True)
+
+    def test_audit_md5sums_no_extraction(self):
+        with self.run_in_subprocess(
+                "click_get_frameworks_dir") as (enter, preloads):
+            enter()
+            path = self.make_fake_package(
+                control_fields={"Click-Version": "0.2"},
+                manifest={
+                    "name": "test-package",
+                    "version": "1.0",
+                    "framework": "ubuntu-sdk-13.10",
+                },
+                control_scripts={
+                    "preinst": static_preinst,
+                    "md5sums": "%s  foo" % hashlib.md5(b"").hexdigest(),
+                },
+                data_files={"foo": None})
+            self._setup_frameworks(preloads, frameworks=["ubuntu-sdk-13.10"])
+            installer = ClickInstaller(self.db)
+            with mock.patch("subprocess.check_call") as mock_check_call:
+                self.assertEqual(
+                    ("test-package", "1.0"), installer.audit(path, slow=True))
+            self.assertFalse(mock_check_call.called)
 
     def test_audit_matching_md5sums(self):
         with self.run_in_subprocess(
@@ -467,7 +540,7 @@ class TestClickInstaller(TestCase):
             root = os.path.join(self.temp_dir, "root")
             db = Click.DB()
             db.add(root)
-            installer = ClickInstaller(db)
+            installer = ClickInstaller(db, single_pass=False)
             self._setup_frameworks(preloads, frameworks=["ubuntu-sdk-13.10"])
             with mock_quiet_subprocess_call():
                 installer.install(path)
@@ -496,6 +569,397 @@ class TestClickInstaller(TestCase):
             mock_package_install_hooks.assert_called_once_with(
                 db, "test-package", None, "1.0", user_name=None)
 
+    @mock.patch("gi.repository.Click.package_install_hooks")
+    def test_install_single_pass(self, mock_package_install_hooks):
+        with self.run_in_subprocess(
+                "click_get_frameworks_dir") as (enter, preloads):
+            enter()
+            script = os.path.join(self.temp_dir, "script")
+            touch(script)
+            os.chmod(script, 0o700)
+            readonly = os.path.join(self.temp_dir, "readonly")
+            touch(readonly)
+            os.chmod(readonly, 0o400)
+            private = os.path.join(self.temp_dir, "private")
+            touch(os.path.join(private, "file"))
+            os.chmod(os.path.join(private, "file"), 0o644)
+            os.chmod(private, 0o700)
+            path = self.make_fake_package(
+                control_fields={
+                    "Package": "test-package",
+                    "Version": "1.0",
+                    "Architecture": "all",
+                    "Maintainer": "Foo Bar <foo@example.org>",
+                    "Description": "test",
+                    "Click-Version": "0.2",
+                },
+                manifest={
+                    "name": "test-package",
+                    "version": "1.0",
+                    "framework": "ubuntu-sdk-13.10",
+                },
+                control_scripts={"preinst": static_preinst},
+                data_files={
+                    "foo": None, "bin/script": script,
+                    "readonly": readonly, "private": private,
+                })
+            root = os.path.join(self.temp_dir, "root")
+            db = Click.DB()
+            db.add(root)
+            installer = ClickInstaller(db)
+            self._setup_frameworks(preloads, frameworks=["ubuntu-sdk-13.10"])
+            installer.install(path)
+            inst_dir = os.path.join(root, "test-package", "current")
+            self.assertEqual("1.0", os.readlink(inst_dir))
+            self.assertCountEqual(
+                [".click", "bin", "foo", "private", "readonly"],
+                os.listdir(inst_dir))
+
+            def mode(name):
+                return stat.S_IMODE(
+                    os.stat(os.path.join(inst_dir, name)).st_mode)
+
+            # Permissions are widened exactly as after unpacking with dpkg.
+            self.assertEqual(0o755, mode("bin/script"))
+            self.assertEqual(0o444, mode("readonly"))
+            self.assertEqual(0o755, mode("private"))
+            self.assertEqual(0o644, mode("private/file"))
+            status_path = os.path.join(inst_dir, ".click", "status")
+            with open(status_path) as status_file:
+                status = list(Deb822.iter_paragraphs(status_file.readlines()))
+            self.assertEqual(1, len(status))
+            self.assertEqual({
+                "Package": "test-package",
+                "Status": "install ok installed",
+                "Version": "1.0",
+                "Architecture": "all",
+                "Maintainer": "Foo Bar <foo@example.org>",
+                "Description": "test",
+                "Click-Version": "0.2",
+            }, status[0])
+            info_dir = os.path.join(inst_dir, ".click", "info")
+            with open(os.path.join(info_dir, "test-package.list")) as f:
+                self.assertEqual(
+                    ["/.", "/bin", "/bin/script", "/foo", "/private",
+                     "/private/file", "/readonly"],
+                    f.read().split())
+            self.assertTrue(os.path.exists(
+                os.path.join(info_dir, "test-package.manifest")))
+            mock_package_install_hooks.assert_called_once_with(
+                db, "test-package", None, "1.0", user_name=None)
+
+    def _make_named_package(self, name, version, control_scripts=None,
+                            **kwargs):
+        control_scripts = dict(control_scripts or {})
+        control_scripts["preinst"] = static_preinst
+        path = self.make_fake_package(
+            control_fields={
+                "Package": name,
+                "Version": version,
+                "Architecture": "all",
+                "Maintainer": "Foo Bar <foo@example.org>",
+                "Description": "test",
+                "Click-Version": "0.2",
+            },
+            manifest={
+                "name": name,
+                "version": version,
+                "framework": "ubuntu-sdk-13.10",
+            },
+            control_scripts=control_scripts,
+            **kwargs)
+        named_path = os.path.join(
+            self.temp_dir, "%s_%s_all.click" % (name, version))
+        os.rename(path, named_path)
+        return named_path
+
+    @mock.patch("gi.repository.Click.package_install_hooks")
+    def test_install_many(self, mock_package_install_hooks):
+        with self.run_in_subprocess(
+                "click_get_frameworks_dir") as (enter, preloads):
+            enter()
+            paths = [
+                self._make_named_package(
+                    "test-package-%d" % i, "1.0", data_files={"foo": None})
+                for i in range(3)]
+            root = os.path.join(self.temp_dir, "root")
+            db = Click.DB()
+            db.add(root)
+            installer = ClickInstaller(db)
+            self._setup_frameworks(preloads, frameworks=["ubuntu-sdk-13.10"])
+            installer.install_many(paths + paths[:1], jobs=2)
+            self.assertCountEqual(
+                [".click", "test-package-0", "test-package-1",
+                 "test-package-2"],
+                os.listdir(root))
+            for i in range(3):
+                inst_dir = os.path.join(root, "test-package-%d" % i, "current")
+                self.assertEqual("1.0", os.readlink(inst_dir))
+                self.assertCountEqual([".click", "foo"], os.listdir(inst_dir))
+            self.assertEqual(3, mock_package_install_hooks.call_count)
+
+    @mock.patch("gi.repository.Click.package_install_hooks")
+    def test_install_link_unchanged(self, mock_package_install_hooks):
+        with self.run_in_subprocess(
+                "click_get_frameworks_dir") as (enter, preloads):
+            enter()
+            paths = {}
+            for version, changed in (("1.0", "old"), ("1.1", "new")):
+                data_files = {}
+                md5sums = []
+                for name, contents in (("same", "same"), ("changed", changed)):
+                    source = os.path.join(self.temp_dir, version, name)
+                    with mkfile(source) as f:
+                        f.write(contents)
+                    os.utime(source, (1000000000, 1000000000))
+                    data_files[name] = source
+                    md5sums.append("%s  %s\n" % (
+                        hashlib.md5(contents.encode()).hexdigest(), name))
+                paths[version] = self._make_named_package(
+                    "test-package", version, data_files=data_files,
+                    control_scripts={"md5sums": "".join(md5sums)})
+            root = os.path.join(self.temp_dir, "root")
+            db = Click.DB()
+            db.add(root)
+            installer = ClickInstaller(db, link_unchanged=True)
+            self._setup_frameworks(preloads, frameworks=["ubuntu-sdk-13.10"])
+            # Keep 1.0 around by not registering either version.
+            with mock.patch.object(ClickInstaller, "_register"):
+                installer.install(paths["1.0"])
+                installer.install(paths["1.1"])
+            package_dir = os.path.join(root, "test-package")
+            self.assertEqual(
+                "1.1", os.readlink(os.path.join(package_dir, "current")))
+
+            def inode(version, name):
+                return os.stat(os.path.join(package_dir, version, name)).st_ino
+
+            self.assertEqual(inode("1.0", "same"), inode("1.1", "same"))
+            self.assertNotEqual(
+                inode("1.0", "changed"), inode("1.1", "changed"))
+            with open(os.path.join(package_dir, "1.1", "changed")) as f:
+                self.assertEqual("new", f.read())
+
+    @mock.patch("gi.repository.Click.package_install_hooks")
+    def test_install_link_unchanged_modified(
+            self, mock_package_install_hooks):
+        with self.run_in_subprocess(
+                "click_get_frameworks_dir") as (enter, preloads):
+            enter()
+            paths = {}
+            for version in ("1.0", "1.1"):
+                source = os.path.join(self.temp_dir, version, "same")
+                with mkfile(source) as f:
+                    f.write("same")
+                os.utime(source, (1000000000, 1000000000))
+                paths[version] = self._make_named_package(
+                    "test-package", version, data_files={"same": source},
+                    control_scripts={"md5sums": "%s  same\n" % (
+                        hashlib.md5(b"same").hexdigest())})
+            root = os.path.join(self.temp_dir, "root")
+            db = Click.DB()
+            db.add(root)
+            installer = ClickInstaller(db, link_unchanged=True)
+            self._setup_frameworks(preloads, frameworks=["ubuntu-sdk-13.10"])
+            with mock.patch.object(ClickInstaller, "_register"):
+                installer.install(paths["1.0"])
+                # Change the old copy without changing its size or
+                # modification time, so that only its contents differ from
+                # what the old md5sums record.
+                package_dir = os.path.join(root, "test-package")
+                old_path = os.path.join(package_dir, "1.0", "same")
+                with open(old_path, "w") as f:
+                    f.write("sane")
+                os.utime(old_path, (1000000000, 1000000000))
+                installer.install(paths["1.1"])
+            new_path = os.path.join(package_dir, "1.1", "same")
+            self.assertNotEqual(
+                os.stat(old_path).st_ino, os.stat(new_path).st_ino)
+            with open(new_path) as f:
+                self.assertEqual("same", f.read())
+
+    @mock.patch("gi.repository.Click.package_install_hooks")
+    def test_install_delta(self, mock_package_install_hooks):
+        with self.run_in_subprocess(
+                "click_get_frameworks_dir") as (enter, preloads):
+            enter()
+            paths = {}
+            for version, changed in (("1.0", "old"), ("1.1", "new")):
+                data_files = {}
+                md5sums = []
+                for name, contents in (("same", "same"), ("changed", changed)):
+                    source = os.path.join(self.temp_dir, version, name)
+                    with mkfile(source) as f:
+                        f.write(contents)
+                    data_files[name] = source
+                    md5sums.append("%s  %s\n" % (
+                        hashlib.md5(contents.encode()).hexdigest(), name))
+                paths[version] = self._make_named_package(
+                    "test-package", version, data_files=data_files,
+                    control_scripts={"md5sums": "".join(md5sums)})
+            delta_path = ClickDeltaBuilder(
+                paths["1.0"], paths["1.1"]).build(self.temp_dir)
+            root = os.path.join(self.temp_dir, "root")
+            db = Click.DB()
+            db.add(root)
+            installer = ClickInstaller(db)
+            self._setup_frameworks(preloads, frameworks=["ubuntu-sdk-13.10"])
+            self.assertRaisesRegex(
+                ClickInstallerError,
+                "Cannot apply delta: test-package 1.0 is not installed",
+                installer.install, delta_path)
+            # Keep 1.0 around by not registering either version.
+            with mock.patch.object(ClickInstaller, "_register"):
+                installer.install(paths["1.0"])
+                package_dir = os.path.join(root, "test-package")
+                with open(os.path.join(package_dir, "1.0", "same"), "w") as f:
+                    f.write("tampered")
+                self.assertRaisesRegex(
+                    ClickInstallerAuditError, "MD5 sum mismatch for same",
+                    installer.install, delta_path)
+                self.assertFalse(
+                    os.path.exists(os.path.join(package_dir, "1.1")))
+                with open(os.path.join(package_dir, "1.0", "same"), "w") as f:
+                    f.write("same")
+                installer.install(delta_path)
+            self.assertEqual(
+                "1.1", os.readlink(os.path.join(package_dir, "current")))
+            for name, contents in (("same", "same"), ("changed", "new")):
+                with open(os.path.join(package_dir, "1.1", name)) as f:
+                    self.assertEqual(contents, f.read())
+
+    @mock.patch("gi.repository.Click.package_install_hooks")
+    def test_install_delta_source_through_symlink(
+            self, mock_package_install_hooks):
+        with self.run_in_subprocess(
+                "click_get_frameworks_dir") as (enter, preloads):
+            enter()
+            paths = {}
+            for version, changed in (("1.0", "old"), ("1.1", "new")):
+                data_files = {}
+                md5sums = []
+                for name, contents in (
+                        ("sub/same", "same"), ("changed", changed)):
+                    source = os.path.join(self.temp_dir, version, name)
+                    with mkfile(source) as f:
+                        f.write(contents)
+                    data_files[name] = source
+                    md5sums.append("%s  %s\n" % (
+                        hashlib.md5(contents.encode()).hexdigest(), name))
+                paths[version] = self._make_named_package(
+                    "test-package", version, data_files=data_files,
+                    control_scripts={"md5sums": "".join(md5sums)})
+            delta_path = ClickDeltaBuilder(
+                paths["1.0"], paths["1.1"]).build(self.temp_dir)
+            root = os.path.join(self.temp_dir, "root")
+            db = Click.DB()
+            db.add(root)
+            installer = ClickInstaller(db)
+            self._setup_frameworks(preloads, frameworks=["ubuntu-sdk-13.10"])
+            with mock.patch.object(ClickInstaller, "_register"):
+                installer.install(paths["1.0"])
+                # Replace a directory in the base with a link to an
+                # outside copy holding the same contents.
+                outside = os.path.join(self.temp_dir, "outside")
+                with mkfile(os.path.join(outside, "same")) as f:
+                    f.write("same")
+                sub = os.path.join(root, "test-package", "1.0", "sub")
+                shutil.rmtree(sub)
+                os.symlink(outside, sub)
+                self.assertRaisesRegex(
+                    ClickInstallerAuditError,
+                    "Delta source sub/same for sub/same is outside the base "
+                    "version",
+                    installer.install, delta_path)
+
+    def test_install_many_audit_failure(self):
+        with self.run_in_subprocess(
+                "click_get_frameworks_dir") as (enter, preloads):
+            enter()
+            good_path = self._make_named_package("test-package", "1.0")
+            bad_path = self._make_named_package(
+                "test-package-bad", "1.0", data_files={"foo": None})
+            with ArFile(name=bad_path, mode="w") as package:
+                package.add_magic()
+            root = os.path.join(self.temp_dir, "root")
+            db = Click.DB()
+            db.add(root)
+            installer = ClickInstaller(db)
+            self._setup_frameworks(preloads, frameworks=["ubuntu-sdk-13.10"])
+            self.assertRaisesRegex(
+                ClickInstallerError, "^%s: " % re.escape(bad_path),
+                installer.install_many, [good_path, bad_path])
+            self.assertFalse(os.path.exists(root))
+
+    @disable_logging
+    @mock.patch("gi.repository.Click.package_install_hooks")
+    def test_install_many_unpack_failure(self, mock_package_install_hooks):
+        with self.run_in_subprocess(
+                "click_get_frameworks_dir") as (enter, preloads):
+            enter()
+            good_path = self._make_named_package("test-package", "1.0")
+            bad_path = self._make_named_package("test-package-bad", "1.0")
+            root = os.path.join(self.temp_dir, "root")
+            db = Click.DB()
+            db.add(root)
+            installer = ClickInstaller(db)
+            self._setup_frameworks(preloads, frameworks=["ubuntu-sdk-13.10"])
+            unpack_files = installer._unpack_files
+            error = ClickInstallerError("unpack failed")
+
+            def side_effect(path, *args, **kwargs):
+                if path == bad_path:
+                    raise error
+                return unpack_files(path, *args, **kwargs)
+
+            with mock.patch.object(
+                    installer, "_unpack_files", side_effect=side_effect):
+                with self.assertRaisesRegex(
+                        ClickInstallerError,
+                        "^%s: unpack failed$" % re.escape(bad_path)) as cm:
+                    installer.install_many([good_path, bad_path])
+            self.assertIs(error, cm.exception.__cause__)
+            # The package that did unpack is not made current.
+            self.assertEqual(
+                ["1.0"], os.listdir(os.path.join(root, "test-package")))
+            mock_package_install_hooks.assert_not_called()
+
+    @mock.patch("gi.repository.Click.package_install_hooks")
+    def test_install_many_checks_frameworks_on_calling_thread(
+            self, mock_package_install_hooks):
+        with self.run_in_subprocess(
+                "click_get_frameworks_dir") as (enter, preloads):
+            enter()
+            paths = [
+                self._make_named_package("test-package-%d" % i, "1.0")
+                for i in range(3)]
+            root = os.path.join(self.temp_dir, "root")
+            db = Click.DB()
+            db.add(root)
+            installer = ClickInstaller(db)
+            self._setup_frameworks(preloads, frameworks=["ubuntu-sdk-13.10"])
+            threads = []
+
+            def validate_framework(*args):
+                threads.append(threading.current_thread())
+
+            with mock.patch(
+                    "click_package.install.validate_framework",
+                    side_effect=validate_framework):
+                installer.install_many(paths, jobs=3)
+            self.assertEqual([threading.current_thread()] * 3, threads)
+
+    @mock.patch("gi.repository.Click.HookBatch")
+    def test_install_failure_aborts_hook_batch(self, mock_hook_batch):
+        installer = ClickInstaller(None)
+        with mock.patch.object(installer, "_install") as mock_install:
+            mock_install.side_effect = ClickInstallerError("unpack failed")
+            self.assertRaisesRegex(
+                ClickInstallerError, "unpack failed",
+                installer.install, "test.click")
+        mock_hook_batch.return_value.commit.assert_not_called()
+        mock_hook_batch.return_value.abort.assert_called_once_with()
+
     @skipUnless(
         os.path.exists(ClickInstaller(None)._preload_path()),
         "preload bits not built; installing packages will fail")
@@ -529,7 +993,7 @@ class TestClickInstaller(TestCase):
             root = os.path.join(self.temp_dir, "root")
             db = Click.DB()
             db.add(root)
-            installer = ClickInstaller(db)
+            installer = ClickInstaller(db, single_pass=False)
             self._setup_frameworks(preloads, frameworks=["ubuntu-sdk-13.10"])
             with mock.patch("subprocess.check_output") as mock_call:
                 mock_call.side_effect = call_side_effect
@@ -769,3 +1233,77 @@ class TestClickInstaller(TestCase):
         overlay_unpacked = os.path.join(overlay, "test-package", "1.1")
         self.assertFalse(os.path.exists(overlay_unpacked))
         self.assertEqual("1.1", registry.get_version("test-package"))
+
+
+class TestDebsigVerifyCache(TestCase):
+    def setUp(self):
+        super(TestDebsigVerifyCache, self).setUp()
+        self.use_temp_dir()
+        self.policies = os.path.join(self.temp_dir, "policies")
+        with mkfile(os.path.join(self.policies, "policy.pol")) as f:
+            f.write("policy")
+        cache_path = os.path.join(self.temp_dir, "cache")
+        os.mkdir(cache_path, 0o755)
+        self.cache = DebsigVerifyCache(cache_path)
+        self.cache.state_paths = (self.policies,)
+        # Stand in for root, who owns the real cache.
+        self.cache.owner = os.geteuid()
+        self.package = os.path.join(self.temp_dir, "test.click")
+        with mkfile(self.package) as f:
+            f.write("package")
+
+    @mock.patch("subprocess.check_output")
+    def test_caches_success(self, mock_check_output):
+        for _ in range(2):
+            self.assertTrue(
+                DebsigVerify.verify(self.package, False, cache=self.cache))
+        self.assertEqual(1, mock_check_output.call_count)
+
+    @mock.patch("subprocess.check_output")
+    def test_package_change_invalidates(self, mock_check_output):
+        DebsigVerify.verify(self.package, False, cache=self.cache)
+        with mkfile(self.package) as f:
+            f.write("other package")
+        DebsigVerify.verify(self.package, False, cache=self.cache)
+        self.assertEqual(2, mock_check_output.call_count)
+
+    @mock.patch("subprocess.check_output")
+    def test_policy_change_invalidates(self, mock_check_output):
+        DebsigVerify.verify(self.package, False, cache=self.cache)
+        with mkfile(os.path.join(self.policies, "policy.pol")) as f:
+            f.write("new policy")
+        DebsigVerify.verify(self.package, False, cache=self.cache)
+        self.assertEqual(2, mock_check_output.call_count)
+        self.assertEqual(1, len(os.listdir(self.cache.path)))
+
+    @mock.patch("subprocess.check_output")
+    def test_does_not_cache_failure(self, mock_check_output):
+        mock_check_output.side_effect = subprocess.CalledProcessError(
+            DebsigVerify.DS_FAIL_BADSIG, "debsig-verify", "bad signature")
+        for _ in range(2):
+            self.assertRaises(
+                DebsigVerifyError,
+                DebsigVerify.verify, self.package, False, cache=self.cache)
+        self.assertEqual(2, mock_check_output.call_count)
+        self.assertEqual([], os.listdir(self.cache.path))
+
+    @mock.patch("subprocess.check_output")
+    def test_ignores_untrusted_cache(self, mock_check_output):
+        DebsigVerify.verify(self.package, False, cache=self.cache)
+        os.chmod(self.cache.path, 0o777)
+        DebsigVerify.verify(self.package, False, cache=self.cache)
+        self.assertEqual(2, mock_check_output.call_count)
+
+    @mock.patch("subprocess.check_output")
+    def test_ignores_cache_of_other_owner(self, mock_check_output):
+        DebsigVerify.verify(self.package, False, cache=self.cache)
+        self.cache.owner = os.geteuid() + 1
+        DebsigVerify.verify(self.package, False, cache=self.cache)
+        self.assertEqual(2, mock_check_output.call_count)
+
+    @mock.patch("subprocess.check_output")
+    def test_only_owner_stores(self, mock_check_output):
+        self.cache.owner = os.geteuid() + 1
+        os.rmdir(self.cache.path)
+        DebsigVerify.verify(self.package, False, cache=self.cache)
+        self.assertFalse(os.path.exists(self.cache.path))
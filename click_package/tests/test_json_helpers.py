@@ -0,0 +1,115 @@
+# Copyright (C) 2026 UBports Foundation
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; version 3 of the License.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Unit tests for click_package.json_helpers."""
+
+from __future__ import print_function
+
+__metaclass__ = type
+__all__ = [
+    'TestLoadManifests',
+    'TestManifestConversionBenchmark',
+    ]
+
+
+import json
+import os
+
+from gi.repository import Click
+
+from click_package.json_helpers import (
+    json_array_to_python,
+    json_object_to_python,
+    load_manifest,
+    load_manifests,
+    )
+from click_package.tests.helpers import BenchmarkTestCase, TestCase, mkfile
+
+
+def make_manifest(name, version):
+    return {
+        "name": name,
+        "version": version,
+        "title": "Test package %s" % name,
+        "description": "A package for testing manifest conversion",
+        "maintainer": "Foo Bar <foo@example.org>",
+        "framework": "ubuntu-sdk-14.04",
+        "installed-size": "1234",
+        "hooks": {
+            "app": {"apparmor": "app.json", "desktop": "app.desktop"},
+            "scope": {"apparmor": "scope.json", "scope": "scope"},
+        },
+    }
+
+
+def install_package(root, manifest):
+    name = manifest["name"]
+    version = manifest["version"]
+    with mkfile(os.path.join(
+            root, name, version, ".click", "info",
+            "%s.manifest" % name)) as f:
+        json.dump(manifest, f)
+    os.symlink(version, os.path.join(root, name, "current"))
+
+
+class TestLoadManifests(TestCase):
+    def setUp(self):
+        super(TestLoadManifests, self).setUp()
+        self.use_temp_dir()
+        self.db = Click.DB()
+        self.db.add(self.temp_dir)
+
+    def test_load_manifest(self):
+        install_package(self.temp_dir, make_manifest("a", "1.0"))
+        self.assertEqual(
+            json_object_to_python(self.db.get_manifest("a", "1.0")),
+            load_manifest(self.db, "a", "1.0"))
+
+    def test_load_manifest_missing(self):
+        self.assertRaisesDatabaseError(
+            Click.DatabaseError.DOES_NOT_EXIST,
+            load_manifest, self.db, "a", "1.0")
+
+    def test_load_manifests(self):
+        self.assertEqual([], load_manifests(self.db, all_versions=True))
+        install_package(self.temp_dir, make_manifest("a", "1.0"))
+        install_package(self.temp_dir, make_manifest("b", "2.0"))
+        manifests = load_manifests(self.db, all_versions=True)
+        self.assertEqual(
+            json_array_to_python(self.db.get_manifests(all_versions=True)),
+            manifests)
+        self.assertEqual(["a", "b"], [m["name"] for m in manifests])
+        self.assertEqual(1, manifests[0]["_removable"])
+
+
+class TestManifestConversionBenchmark(BenchmarkTestCase):
+    def test_conversion(self):
+        count = int(os.environ.get("TEST_BENCHMARK_MANIFESTS", "500"))
+        for i in range(count):
+            install_package(
+                self.temp_dir, make_manifest("package%d" % i, "1.0"))
+        db = Click.DB()
+        db.add(self.temp_dir)
+        # Warm the manifest cache so that only the conversion differs.
+        db.get_manifests(all_versions=True)
+        by_node = self.timed(
+            "json_array_to_python, %d manifests" % count,
+            lambda: json_array_to_python(
+                db.get_manifests(all_versions=True)),
+            items=count)
+        bulk = self.timed(
+            "load_manifests, %d manifests" % count,
+            load_manifests, db, all_versions=True, items=count)
+        self.assertEqual(count, len(bulk))
+        self.assertEqual(by_node, bulk)
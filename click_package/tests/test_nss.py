@@ -0,0 +1,52 @@
+# Copyright (C) 2026 UBports Foundation
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; version 3 of the License.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Unit tests for Click's cached user database lookups."""
+
+from __future__ import print_function
+__all__ = [
+    'TestLookupPasswd',
+    ]
+
+
+from gi.repository import Click
+
+from click_package.tests.gimock_types import Passwd
+from click_package.tests.helpers import TestCase
+
+
+class TestLookupPasswd(TestCase):
+    def test_lookup_cached(self):
+        with self.run_in_subprocess("getpwnam") as (enter, preloads):
+            enter()
+
+            def getpwnam_side_effect(name):
+                if name == b"test-user":
+                    return self.make_pointer(Passwd(
+                        pw_uid=1, pw_gid=2, pw_dir=b"/home/test-user"))
+                return None
+
+            preloads["getpwnam"].side_effect = getpwnam_side_effect
+            pw = Click.lookup_passwd("test-user")
+            self.assertEqual("test-user", pw.props.name)
+            self.assertEqual(1, pw.props.uid)
+            self.assertEqual(2, pw.props.gid)
+            self.assertEqual("/home/test-user", pw.props.home)
+            Click.lookup_passwd("test-user")
+            self.assertIsNone(Click.lookup_passwd("nonexistent"))
+            self.assertIsNone(Click.lookup_passwd("nonexistent"))
+            self.assertEqual(2, preloads["getpwnam"].call_count)
+            Click.invalidate_nss_cache()
+            Click.lookup_passwd("test-user")
+            self.assertEqual(3, preloads["getpwnam"].call_count)
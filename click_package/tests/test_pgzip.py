@@ -0,0 +1,156 @@
+# Copyright (C) 2026 UBports Foundation
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; version 3 of the License.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Unit tests for click_package.pgzip."""
+
+from __future__ import print_function
+
+__metaclass__ = type
+__all__ = [
+    'TestFragmentedGzipWriter',
+    'TestGzipMembersReader',
+    'TestParallelGzipWriter',
+    'TestParallelGzipBenchmark',
+    ]
+
+
+import gzip
+import hashlib
+import io
+import os
+import subprocess
+
+from click_package.build import ClickBuilder
+from click_package.pgzip import (
+    FragmentedGzipWriter,
+    GzipMembersReader,
+    ParallelGzipWriter,
+    )
+from click_package.tests.helpers import BenchmarkTestCase, TestCase
+
+
+class TestParallelGzipWriter(TestCase):
+    def _compress(self, data, **kwargs):
+        output = io.BytesIO()
+        with ParallelGzipWriter(output, **kwargs) as writer:
+            for i in range(0, len(data), 10000):
+                writer.write(data[i:i + 10000])
+        return output.getvalue()
+
+    def _decompress(self, data):
+        with gzip.GzipFile(fileobj=io.BytesIO(data)) as f:
+            return f.read()
+
+    def test_empty(self):
+        for jobs in (1, 4):
+            compressed = self._compress(b"", jobs=jobs)
+            self.assertEqual(b"", self._decompress(compressed))
+
+    def test_round_trip(self):
+        data = (b"test data " * 1000 + os.urandom(1000)) * 50
+        for jobs in (1, 4):
+            compressed = self._compress(data, jobs=jobs, block_size=4096)
+            self.assertEqual(data, self._decompress(compressed))
+
+    def test_output_independent_of_jobs(self):
+        data = (b"test data " * 1000 + os.urandom(1000)) * 50
+        self.assertEqual(
+            self._compress(data, jobs=1, block_size=4096, mtime=0),
+            self._compress(data, jobs=4, block_size=4096, mtime=0))
+
+    def test_gzip_command_accepts_output(self):
+        self.use_temp_dir()
+        data = os.urandom(100000) + b"\0" * 100000
+        path = os.path.join(self.temp_dir, "data.gz")
+        with open(path, "wb") as f:
+            f.write(self._compress(data, jobs=3, block_size=8192))
+        self.assertEqual(data, subprocess.check_output(["gzip", "-dc", path]))
+
+    def test_invalid_jobs(self):
+        self.assertRaises(ValueError, ParallelGzipWriter, io.BytesIO(), jobs=0)
+
+
+class TestFragmentedGzipWriter(TestCase):
+    def test_fragments(self):
+        self.use_temp_dir()
+        fragment_path = os.path.join(self.temp_dir, "fragment")
+        output = io.BytesIO()
+        with FragmentedGzipWriter(output) as writer:
+            writer.write(b"header ")
+            with open(fragment_path, "wb") as capture:
+                writer.begin_fragment(capture)
+                writer.write(b"fragment ")
+                writer.end_fragment()
+            writer.write_fragment(fragment_path, 9)
+            writer.write(b"trailer")
+            self.assertEqual(32, writer.tell())
+        with gzip.GzipFile(fileobj=io.BytesIO(output.getvalue())) as f:
+            self.assertEqual(b"header fragment fragment trailer", f.read())
+
+
+class TestGzipMembersReader(TestCase):
+    def _fragmented(self, *pieces):
+        output = io.BytesIO()
+        with FragmentedGzipWriter(output) as writer:
+            for piece in pieces:
+                writer.begin_fragment()
+                writer.write(piece)
+                writer.end_fragment()
+        return output.getvalue()
+
+    def _read_all(self, reader, size):
+        chunks = []
+        while True:
+            chunk = reader.read(size)
+            if not chunk:
+                return b"".join(chunks)
+            chunks.append(chunk)
+
+    def test_reads_every_member(self):
+        pieces = [b"first ", os.urandom(100000), b"", b"last"]
+        compressed = self._fragmented(*pieces)
+        for size in (1, 10240, -1):
+            reader = GzipMembersReader(io.BytesIO(compressed))
+            self.assertEqual(b"".join(pieces), self._read_all(reader, size))
+
+    def test_truncated(self):
+        compressed = self._fragmented(b"first ", b"second")
+        reader = GzipMembersReader(io.BytesIO(compressed[:-4]))
+        self.assertRaises(EOFError, reader.read)
+
+
+class TestParallelGzipBenchmark(BenchmarkTestCase):
+    def _fsys_tarfile_digest(self, path):
+        digest = hashlib.sha256()
+        dpkg_deb = subprocess.Popen(
+            ["dpkg-deb", "--fsys-tarfile", path], stdout=subprocess.PIPE)
+        for buf in iter(lambda: dpkg_deb.stdout.read(1024 * 1024), b""):
+            digest.update(buf)
+        dpkg_deb.stdout.close()
+        self.assertEqual(0, dpkg_deb.wait())
+        return digest.hexdigest()
+
+    def test_build_throughput(self):
+        scratch, _ = self.make_benchmark_tree()
+        digests = []
+        for jobs in (1, max(2, os.cpu_count() or 1)):
+            dest = os.path.join(self.temp_dir, "out-%d" % jobs)
+            os.mkdir(dest)
+            builder = ClickBuilder()
+            builder.jobs = jobs
+            builder.add_file(scratch, "./")
+            path = self.timed(
+                "build with --jobs=%d" % jobs, builder.build, dest)
+            digests.append(self._fsys_tarfile_digest(path))
+        self.assertEqual(digests[0], digests[1])
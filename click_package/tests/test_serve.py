@@ -0,0 +1,196 @@
+# Copyright (C) 2026 UBports Foundation
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; version 3 of the License.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Unit tests for click_package.serve and "click serve"."""
+
+from __future__ import print_function
+
+__metaclass__ = type
+__all__ = [
+    'TestClickServer',
+    'TestForward',
+    ]
+
+
+from contextlib import closing
+import io
+import os
+import socket
+import threading
+
+from gi.repository import Click
+
+from click_package.commands import load_command
+from click_package.commands.serve import ClickServer
+from click_package.serve import (
+    forward,
+    forwardable,
+    receive_message,
+    send_message,
+    socket_path,
+    )
+from click_package.tests.helpers import (
+    TestCase,
+    make_installed_click,
+    mock,
+    touch,
+)
+
+
+class TestForward(TestCase):
+    def setUp(self):
+        super(TestForward, self).setUp()
+        self.use_temp_dir()
+        os.environ["XDG_RUNTIME_DIR"] = self.temp_dir
+
+    def _serve_once(self, reply):
+        """Answer one query with reply in another thread.
+
+        Returns a list to which the query will be appended.
+        """
+        os.mkdir(os.path.dirname(socket_path()))
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.addCleanup(sock.close)
+        sock.bind(socket_path())
+        sock.listen(1)
+        requests = []
+
+        def answer():
+            conn, _ = sock.accept()
+            with closing(conn):
+                requests.append(receive_message(conn))
+                send_message(conn, reply)
+
+        thread = threading.Thread(target=answer)
+        thread.start()
+        self.addCleanup(thread.join)
+        return requests
+
+    def test_forwardable(self):
+        self.assertTrue(forwardable(["list", "--manifest"]))
+        self.assertTrue(forwardable(["pkgdir", "--user=foo", "foo"]))
+        self.assertTrue(forwardable(["info", "--", "--root"]))
+        self.assertFalse(forwardable([]))
+        self.assertFalse(forwardable(["install", "foo.click"]))
+        self.assertFalse(forwardable(["list", "--root", "/tmp"]))
+        self.assertFalse(forwardable(["list", "--root=/tmp"]))
+        self.assertFalse(forwardable(["list", "--ro=/tmp"]))
+
+    def test_no_runtime_dir(self):
+        del os.environ["XDG_RUNTIME_DIR"]
+        self.assertIsNone(socket_path())
+        self.assertIsNone(forward(["list"]))
+
+    def test_no_server(self):
+        self.assertIsNone(forward(["list"]))
+
+    def test_not_forwardable(self):
+        self.assertIsNone(forward(["install", "foo.click"]))
+
+    def test_forward(self):
+        requests = self._serve_once(
+            {"status": 3, "stdout": "out\n", "stderr": "err\n"})
+        with mock.patch("sys.stdout", new_callable=io.StringIO) as stdout, \
+                mock.patch("sys.stderr", new_callable=io.StringIO) as stderr:
+            self.assertEqual(3, forward(["pkgdir", "foo"]))
+        self.assertEqual("out\n", stdout.getvalue())
+        self.assertEqual("err\n", stderr.getvalue())
+        self.assertEqual(
+            [{"argv": ["pkgdir", "foo"], "cwd": os.getcwd()}], requests)
+
+    def test_forward_declined(self):
+        self._serve_once({"status": None})
+        self.assertIsNone(forward(["pkgdir", "foo"]))
+
+
+class TestClickServer(TestCase):
+    def setUp(self):
+        super(TestClickServer, self).setUp()
+        self.use_temp_dir()
+
+    def _set_up_db(self, preloads):
+        db_dir = os.path.join(self.temp_dir, "databases")
+        self.db_root = os.path.join(self.temp_dir, "db")
+        os.makedirs(db_dir)
+        os.makedirs(self.db_root)
+        with open(os.path.join(db_dir, "10_db.conf"), "w") as f:
+            print("[Click Database]", file=f)
+            print("root = %s" % self.db_root, file=f)
+        preloads["click_get_db_dir"].side_effect = (
+            lambda: self.make_string(db_dir))
+        self.db = Click.DB()
+        self.db.read(db_dir=None)
+
+    def test_list(self):
+        with self.run_in_subprocess("click_get_db_dir") as (enter, preloads):
+            enter()
+            self._set_up_db(preloads)
+            make_installed_click(self.db, self.db_root, "test-1", "1.0")
+            server = ClickServer(None)
+            self.assertEqual(
+                {"status": 0, "stdout": "test-1\t1.0\n", "stderr": ""},
+                server.run_command(["list"], self.temp_dir))
+
+    def test_results_cached_until_changed(self):
+        with self.run_in_subprocess("click_get_db_dir") as (enter, preloads):
+            enter()
+            self._set_up_db(preloads)
+            make_installed_click(self.db, self.db_root, "test-1", "1.0")
+            server = ClickServer(None)
+            with mock.patch(
+                    "click_package.commands.serve.load_command",
+                    side_effect=load_command) as mock_load_command:
+                server.run_command(["list"], self.temp_dir)
+                reply = server.run_command(["list"], self.temp_dir)
+                self.assertEqual("test-1\t1.0\n", reply["stdout"])
+                self.assertEqual(1, mock_load_command.call_count)
+                make_installed_click(self.db, self.db_root, "test-2", "2.0")
+                reply = server.run_command(["list"], self.temp_dir)
+                self.assertEqual(
+                    "test-1\t1.0\ntest-2\t2.0\n", reply["stdout"])
+                self.assertEqual(2, mock_load_command.call_count)
+
+    def test_paths_not_cached(self):
+        with self.run_in_subprocess("click_get_db_dir") as (enter, preloads):
+            enter()
+            self._set_up_db(preloads)
+            touch(os.path.join(self.temp_dir, "test-1"))
+            server = ClickServer(None)
+            with mock.patch(
+                    "click_package.commands.serve.load_command",
+                    side_effect=load_command) as mock_load_command:
+                server.run_command(["pkgdir", "test-1"], self.temp_dir)
+                server.run_command(["pkgdir", "test-1"], self.temp_dir)
+                self.assertEqual(2, mock_load_command.call_count)
+
+    def test_usage_error(self):
+        with self.run_in_subprocess("click_get_db_dir") as (enter, preloads):
+            enter()
+            self._set_up_db(preloads)
+            reply = ClickServer(None).run_command(["pkgdir"], self.temp_dir)
+            self.assertEqual(2, reply["status"])
+            self.assertIn("need package name", reply["stderr"])
+
+    def test_app_id(self):
+        with self.run_in_subprocess("click_get_db_dir") as (enter, preloads):
+            enter()
+            self._set_up_db(preloads)
+            make_installed_click(
+                self.db, self.db_root, "test-1", "1.0",
+                json_data={"hooks": {"app": {}}})
+            reply = ClickServer(None).run_command(
+                ["app-id", "test-1"], self.temp_dir)
+            self.assertEqual(
+                {"status": 0, "stdout": "test-1_app_1.0\n", "stderr": ""},
+                reply)
@@ -233,6 +233,19 @@ class TestClickUser(TestCase):
         self.assertCountEqual(
             ["a", "b", "c"], list(registry.get_package_names()))
 
+    def test_iter_package_names_multiple_root(self):
+        user_dbs, registry = self._setUpMultiDB()
+        os.symlink("@hidden", os.path.join(user_dbs[1], "b"))
+        names = []
+        packages = registry.iter_package_names()
+        while True:
+            name = packages.next_name()
+            if name is None:
+                break
+            names.append(name)
+        self.assertEqual(list(registry.get_package_names()), names)
+        self.assertCountEqual(["a", "c"], names)
+
     def test_get_version_missing(self):
         registry = Click.User.for_user(self.db, "user")
         self.assertRaisesUserError(
@@ -573,6 +586,59 @@ class TestClickUser(TestCase):
         self.assertEqual(b_overlay, registry.get_path("b"))
         self.assertTrue(registry.is_removable("b"))
 
+    def test_registration_snapshot(self):
+        with self.run_in_subprocess("getpwnam") as (enter, preloads):
+            enter()
+            preloads["getpwnam"].side_effect = (
+                lambda name: self.make_pointer(
+                    Passwd(pw_uid=os.getuid(), pw_gid=os.getgid())))
+            user_dbs, registry = self._setUpMultiDB()
+            all_users_db = os.path.join(
+                self.multi_db.get(0).props.root, ".click", "users", "@all")
+            os.makedirs(all_users_db)
+            os.symlink(
+                os.path.join(self.temp_dir, "custom", "b", "2.0"),
+                os.path.join(all_users_db, "b"))
+            os.symlink("@hidden", os.path.join(user_dbs[1], "b"))
+            snapshot = Click.RegistrationSnapshot.new(self.multi_db)
+            self.assertEqual(
+                ["@all", "user"], list(snapshot.get_user_names()))
+            self.assertEqual(
+                ["a", "c"], list(snapshot.get_package_names("user")))
+            self.assertEqual("1.1", snapshot.get_version("user", "a"))
+            self.assertIsNone(snapshot.get_version("user", "b"))
+            self.assertEqual("2.0", snapshot.get_version("@all", "b"))
+            self.assertTrue(snapshot.is_registered("b", "2.0"))
+            self.assertFalse(snapshot.is_registered("a", "1.0"))
+            registry.set_version("a", "1.0")
+            self.assertFalse(snapshot.is_registered("a", "1.0"))
+            snapshot.refresh()
+            self.assertTrue(snapshot.is_registered("a", "1.0"))
+
+    def test_registration_snapshot_dangling_link(self):
+        with self.run_in_subprocess("getpwnam") as (enter, preloads):
+            enter()
+            preloads["getpwnam"].side_effect = (
+                lambda name: self.make_pointer(
+                    Passwd(pw_uid=os.getuid(), pw_gid=os.getgid())))
+            user_dbs, registry = self._setUpMultiDB()
+            os.symlink(
+                os.path.join(self.temp_dir, "click", "d", "1.0"),
+                os.path.join(user_dbs[1], "d"))
+            # A dangling link hides any registration in an earlier
+            # database.
+            os.symlink(
+                os.path.join(self.temp_dir, "click", "b", "3.0"),
+                os.path.join(user_dbs[1], "b"))
+            snapshot = Click.RegistrationSnapshot.new(self.multi_db)
+            self.assertEqual(
+                ["a", "c"], list(snapshot.get_package_names("user")))
+            self.assertIsNone(snapshot.get_version("user", "d"))
+            self.assertIsNone(snapshot.get_version("user", "b"))
+            self.assertFalse(snapshot.is_registered("d", "1.0"))
+            self.assertFalse(snapshot.is_registered("b", "2.0"))
+            self.assertFalse(snapshot.is_registered("b", "3.0"))
+
 
 class StopAppTestCase(TestCase):
 
@@ -0,0 +1,61 @@
+# Copyright (C) 2026 UBports Foundation
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; version 3 of the License.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Unit tests for Click version comparison."""
+
+from __future__ import print_function
+__all__ = [
+    'TestCompareVersions',
+    ]
+
+
+from gi.repository import Click
+
+from click_package.tests.helpers import TestCase
+
+
+class TestCompareVersions(TestCase):
+    def assertVersionLess(self, a, b):
+        self.assertLess(Click.compare_versions(a, b), 0)
+        self.assertGreater(Click.compare_versions(b, a), 0)
+
+    def test_equal(self):
+        self.assertEqual(0, Click.compare_versions("1.0", "1.0"))
+        self.assertEqual(0, Click.compare_versions("1.0", "1.00"))
+        self.assertEqual(0, Click.compare_versions("0:1.0", "1.0"))
+        self.assertEqual(0, Click.compare_versions("1.0-0", "1.0-0"))
+
+    def test_numeric(self):
+        self.assertVersionLess("1.0", "1.1")
+        self.assertVersionLess("9", "10")
+        self.assertVersionLess("0.4.9", "0.4.48")
+        self.assertVersionLess("1.0", "1.0.1")
+
+    def test_tilde(self):
+        self.assertVersionLess("1.0~rc1", "1.0")
+        self.assertVersionLess("1.0~~", "1.0~")
+        self.assertVersionLess("1.0-1~bpo", "1.0-1")
+
+    def test_letters_and_symbols(self):
+        self.assertVersionLess("1.0", "1.0a")
+        self.assertVersionLess("1.0a", "1.0+b1")
+
+    def test_epoch(self):
+        self.assertVersionLess("2.0", "1:0.1")
+        self.assertVersionLess("1:0.1", "2:0.0")
+
+    def test_revision(self):
+        self.assertVersionLess("1.0", "1.0-1")
+        self.assertVersionLess("1.0-1", "1.0-2")
+        self.assertVersionLess("1.0-9", "1.0-10")
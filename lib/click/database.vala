@@ -88,14 +88,306 @@ public class InstalledPackage : Object, Gee.Hashable<InstalledPackage> {
 	}
 }
 
+/* Version of the on-disk package index format.  Bump this whenever the
+ * format changes incompatibly; readers ignore indexes with any other
+ * version and fall back to scanning the database.
+ */
+private const int64 PACKAGE_INDEX_FORMAT = 2;
+
+private int64
+get_mtime (string path)
+{
+	Posix.Stat st;
+	if (Posix.stat (path, out st) < 0)
+		return -1;
+	return (int64) st.st_mtime;
+}
+
+/* Like get_mtime, but in nanoseconds. */
+private int64
+get_mtime_nsec (string path)
+{
+	PosixExtra.StatNsec st;
+	if (PosixExtra.stat_nsec (path, out st) < 0)
+		return -1;
+	return (int64) st.st_mtim.tv_sec * 1000000000 +
+	       (int64) st.st_mtim.tv_nsec;
+}
+
+private Json.Object
+copy_manifest (Json.Object manifest)
+{
+	var ret = new Json.Object ();
+	foreach (unowned string name in manifest.get_members ())
+		ret.set_member (name, manifest.dup_member (name));
+	return ret;
+}
+
+/* The state of a single package directory in a database: its
+ * modification time in nanoseconds when it was scanned, the target of its
+ * "current" symlink, and the unpacked versions it contains.  Versions map
+ * to their raw manifests if these are known, otherwise null.
+ */
+private class PackageIndexEntry : Object {
+	public int64 mtime;
+	public string? current;
+	public Gee.TreeMap<string, Json.Object?> versions;
+
+	public
+	PackageIndexEntry (int64 mtime)
+	{
+		this.mtime = mtime;
+		current = null;
+		versions = new Gee.TreeMap<string, Json.Object?> ();
+	}
+}
+
+private class PackageIndex : Object {
+	public int64 generated;
+	public int64 root_mtime;
+	public Gee.TreeMap<string, PackageIndexEntry> packages;
+
+	public
+	PackageIndex (int64 generated, int64 root_mtime)
+	{
+		this.generated = generated;
+		this.root_mtime = root_mtime;
+		packages = new Gee.TreeMap<string, PackageIndexEntry> ();
+	}
+
+	/* All timestamps are in nanoseconds, and generated is taken from
+	 * the file system's own clock just before the index was scanned.
+	 * Anything changed after that has a timestamp no earlier than
+	 * generated, so a recorded timestamp strictly earlier than it
+	 * cannot hide a later change.  Timestamps at or after generated
+	 * (including all of them on file systems with coarser resolution,
+	 * within the same tick) may have changed again without us
+	 * noticing; treat them as stale.
+	 */
+	public bool
+	is_fresh (int64 recorded, int64 current)
+	{
+		return current >= 0 && current == recorded &&
+		       recorded < generated;
+	}
+
+	private static int64
+	get_int_member (Json.Object obj, string name)
+	{
+		var node = obj.get_member (name);
+		if (node == null || node.get_value_type () != typeof (int64))
+			return -1;
+		return node.get_int ();
+	}
+
+	/**
+	 * load:
+	 * @path: Path to an index file.
+	 *
+	 * Returns: The parsed index, or null if it is missing, malformed,
+	 * or in an unsupported format.
+	 */
+	public static PackageIndex?
+	load (string path)
+	{
+		var parser = new Json.Parser ();
+		try {
+			parser.load_from_file (path);
+		} catch (Error e) {
+			return null;
+		}
+		var node = parser.get_root ();
+		if (node == null || node.get_node_type () != Json.NodeType.OBJECT)
+			return null;
+		var obj = node.get_object ();
+		if (get_int_member (obj, "format") != PACKAGE_INDEX_FORMAT)
+			return null;
+		var packages_node = obj.get_member ("packages");
+		if (packages_node == null ||
+		    packages_node.get_node_type () != Json.NodeType.OBJECT)
+			return null;
+
+		var index = new PackageIndex
+			(get_int_member (obj, "generated"),
+			 get_int_member (obj, "root-mtime"));
+		var packages = packages_node.get_object ();
+		foreach (unowned string package in packages.get_members ()) {
+			var package_node = packages.get_member (package);
+			if (package_node.get_node_type () !=
+			    Json.NodeType.OBJECT)
+				return null;
+			var package_obj = package_node.get_object ();
+			var entry = new PackageIndexEntry
+				(get_int_member (package_obj, "mtime"));
+			if (package_obj.has_member ("current"))
+				entry.current = package_obj.get_string_member
+					("current");
+			var versions_node = package_obj.get_member
+				("versions");
+			if (versions_node == null ||
+			    versions_node.get_node_type () !=
+			    Json.NodeType.OBJECT)
+				return null;
+			var versions = versions_node.get_object ();
+			foreach (unowned string version in
+					versions.get_members ()) {
+				var manifest_node = versions.get_member
+					(version);
+				if (manifest_node.get_node_type () ==
+				    Json.NodeType.OBJECT)
+					entry.versions[version] =
+						manifest_node.get_object ();
+				else
+					entry.versions[version] = null;
+			}
+			index.packages[package] = entry;
+		}
+		return index;
+	}
+
+	public Json.Node
+	to_json ()
+	{
+		var packages_obj = new Json.Object ();
+		foreach (var item in packages.entries) {
+			var entry_obj = new Json.Object ();
+			entry_obj.set_int_member ("mtime", item.value.mtime);
+			if (item.value.current != null)
+				entry_obj.set_string_member
+					("current", item.value.current);
+			var versions_obj = new Json.Object ();
+			foreach (var version in item.value.versions.entries) {
+				if (version.value != null)
+					versions_obj.set_object_member
+						(version.key, version.value);
+				else
+					versions_obj.set_null_member
+						(version.key);
+			}
+			entry_obj.set_object_member ("versions", versions_obj);
+			packages_obj.set_object_member (item.key, entry_obj);
+		}
+		var obj = new Json.Object ();
+		obj.set_int_member ("format", PACKAGE_INDEX_FORMAT);
+		obj.set_int_member ("generated", generated);
+		obj.set_int_member ("root-mtime", root_mtime);
+		obj.set_object_member ("packages", packages_obj);
+		var node = new Json.Node (Json.NodeType.OBJECT);
+		node.set_object (obj);
+		return node;
+	}
+}
+
+/* A bounded least-recently-used cache of parsed manifests, shared by
+ * everything that reads manifests through a #Click.DB.
+ *
+ * Entries are keyed by manifest path, and are only used while the file's
+ * inode, size and modification time are unchanged.  Files modified within
+ * a second of being cached are always parsed again, since a further change
+ * within the same second would not be visible in the modification time.
+ */
+private class ManifestCache : Object {
+	private class Entry : Object {
+		public string package;
+		public string version;
+		public uint64 ino;
+		public int64 size;
+		public int64 mtime;
+		public int64 cached;
+		public Json.Node root;
+	}
+
+	public uint hits { get; private set; default = 0; }
+	public uint misses { get; private set; default = 0; }
+	public int capacity { get; construct; }
+
+	private Gee.HashMap<string, Entry> entries;
+	/* Most recently used first. */
+	private Gee.LinkedList<string> lru;
+
+	public
+	ManifestCache (int capacity = 256)
+	{
+		Object (capacity: capacity);
+		entries = new Gee.HashMap<string, Entry> ();
+		lru = new Gee.LinkedList<string> ();
+	}
+
+	private void
+	forget (string path)
+	{
+		if (entries.unset (path))
+			lru.remove (path);
+	}
+
+	/**
+	 * get:
+	 * @package: A package name.
+	 * @version: A version string.
+	 * @path: The path to the manifest of this version of @package.
+	 *
+	 * Returns: The root node of the parsed manifest.  This is shared
+	 * with the cache, so callers must copy anything they intend to
+	 * modify.
+	 */
+	public Json.Node
+	get (string package, string version, string path) throws Error
+	{
+		Posix.Stat st;
+		if (Posix.stat (path, out st) < 0) {
+			forget (path);
+			/* Let the parser report the error. */
+			var parser = new Json.Parser ();
+			parser.load_from_file (path);
+			return parser.get_root ().copy ();
+		}
+
+		var entry = entries[path];
+		if (entry != null && entry.package == package &&
+		    entry.version == version &&
+		    entry.ino == (uint64) st.st_ino &&
+		    entry.size == (int64) st.st_size &&
+		    entry.mtime == (int64) st.st_mtime &&
+		    entry.mtime < entry.cached) {
+			++hits;
+			lru.remove (path);
+			lru.offer_head (path);
+			return entry.root;
+		}
+
+		++misses;
+		forget (path);
+		var parser = new Json.Parser ();
+		parser.load_from_file (path);
+		entry = new Entry ();
+		entry.package = package;
+		entry.version = version;
+		entry.ino = (uint64) st.st_ino;
+		entry.size = (int64) st.st_size;
+		entry.mtime = (int64) st.st_mtime;
+		entry.cached = get_real_time () / 1000000;
+		entry.root = parser.get_root ().copy ();
+		entries[path] = entry;
+		lru.offer_head (path);
+		while (lru.size > capacity)
+			entries.unset (lru.poll_tail ());
+		return entry.root;
+	}
+}
+
 public class SingleDB : Object {
 	public string root { get; construct; }
 	public DB master_db { private get; construct; }
 
+	private PackageIndex? loaded_index;
+	private uint64 loaded_index_ino;
+	private int64 loaded_index_mtime;
+
 	public
 	SingleDB (string root, DB master_db)
 	{
 		Object (root: root, master_db: master_db);
+		loaded_index = null;
 	}
 
 	private bool
@@ -144,48 +436,206 @@ public class SingleDB : Object {
 		}
 	}
 
+	private string
+	get_index_path ()
+	{
+		return Path.build_filename (root, ".click", "index.json");
+	}
+
 	/**
-	 * get_packages:
-	 * @all_versions: If true, return all versions, not just current ones.
+	 * load_index:
 	 *
-	 * Returns: A list of #InstalledPackage instances corresponding to
-	 * package versions in only this database.
+	 * Returns: The on-disk package index for this database, or null if
+	 * there is no usable index.  The parsed index is kept in memory for
+	 * as long as the file on disk is unchanged.
 	 */
-	public List<InstalledPackage>
-	get_packages (bool all_versions = false) throws Error
+	private PackageIndex?
+	load_index ()
 	{
-		var ret = new List<InstalledPackage> ();
+		var index_path = get_index_path ();
+		Posix.Stat st;
+		if (Posix.stat (index_path, out st) < 0) {
+			loaded_index = null;
+			return null;
+		}
+		if (loaded_index != null &&
+		    loaded_index_ino == (uint64) st.st_ino &&
+		    loaded_index_mtime == (int64) st.st_mtime)
+			return loaded_index;
+		loaded_index = PackageIndex.load (index_path);
+		loaded_index_ino = (uint64) st.st_ino;
+		loaded_index_mtime = (int64) st.st_mtime;
+		return loaded_index;
+	}
 
-		foreach (var package in Click.Dir.open (root)) {
-			if (package == ".click")
+	/**
+	 * scan_package:
+	 * @package: A package name.
+	 *
+	 * Returns: The current state of @package in this database, read
+	 * from the file system, or null if @package is not a directory.
+	 */
+	private PackageIndexEntry?
+	scan_package (string package) throws Error
+	{
+		var package_path = Path.build_filename (root, package);
+		var mtime = get_mtime_nsec (package_path);
+		if (mtime < 0 || ! is_dir (package_path))
+			return null;
+		var entry = new PackageIndexEntry (mtime);
+		foreach (var version in Click.Dir.open (package_path)) {
+			var version_path = Path.build_filename
+				(package_path, version);
+			if (is_symlink (version_path)) {
+				if (version == "current")
+					entry.current = FileUtils.read_link
+						(version_path);
 				continue;
-			if (all_versions) {
-				var package_path =
-					Path.build_filename (root, package);
-				if (! is_dir (package_path))
+			}
+			if (is_dir (version_path))
+				entry.versions[version] = null;
+		}
+		return entry;
+	}
+
+	/**
+	 * get_package_entries:
+	 *
+	 * Returns: A sorted map of package names to their state in this
+	 * database.  Entries are taken from the on-disk index where it is
+	 * still fresh, and otherwise scanned from the file system.
+	 */
+	internal Gee.SortedMap<string, PackageIndexEntry>
+	get_package_entries () throws Error
+	{
+		var ret = new Gee.TreeMap<string, PackageIndexEntry> ();
+		var index = load_index ();
+
+		Gee.Collection<string> packages;
+		if (index != null &&
+		    index.is_fresh (index.root_mtime, get_mtime_nsec (root)))
+			packages = index.packages.keys;
+		else {
+			var scanned = new Gee.ArrayList<string> ();
+			foreach (var package in Click.Dir.open (root)) {
+				if (package != ".click")
+					scanned.add (package);
+			}
+			packages = scanned;
+		}
+
+		foreach (var package in packages) {
+			PackageIndexEntry? entry = null;
+			if (index != null) {
+				var indexed = index.packages[package];
+				var package_path = Path.build_filename
+					(root, package);
+				if (indexed != null &&
+				    index.is_fresh
+					(indexed.mtime,
+					 get_mtime_nsec (package_path)))
+					entry = indexed;
+			}
+			if (entry == null)
+				entry = scan_package (package);
+			if (entry != null)
+				ret[package] = entry;
+		}
+		return ret;
+	}
+
+	/**
+	 * update_index:
+	 *
+	 * Rewrite the on-disk package index for this database.
+	 *
+	 * The index records the unpacked versions and manifests of every
+	 * package, so that listing packages does not need to walk the whole
+	 * database.  Readers check the modification time of each package
+	 * directory against the index, and scan any package that has
+	 * changed since it was written.
+	 *
+	 * Since: 0.4.48
+	 */
+	public void
+	update_index () throws Error
+	{
+		ensuredir (Path.build_filename (root, ".click"));
+		/* Creating a file gives us the file system's idea of the
+		 * current time, which is what package timestamps will be
+		 * compared against.
+		 */
+		var stamp_path = get_index_path () + ".stamp";
+		FileUtils.set_contents (stamp_path, "");
+		var generated = get_mtime_nsec (stamp_path);
+		FileUtils.unlink (stamp_path);
+		var index = new PackageIndex (generated, get_mtime_nsec (root));
+		foreach (var item in get_package_entries ().entries) {
+			var entry = item.value;
+			var unindexed = new Gee.ArrayList<string> ();
+			foreach (var version in entry.versions.entries) {
+				if (version.value == null)
+					unindexed.add (version.key);
+			}
+			foreach (var version in unindexed) {
+				var manifest_path = Path.build_filename
+					(root, item.key, version, ".click",
+					 "info", @"$(item.key).manifest");
+				Json.Node node;
+				try {
+					node = master_db.manifest_cache.get
+						(item.key, version,
+						 manifest_path);
+				} catch (Error e) {
 					continue;
-				foreach (var version in Click.Dir.open
-						(package_path)) {
-					var version_path = Path.build_filename
-						(package_path, version);
-					if (is_symlink (version_path) ||
-					    ! is_dir (version_path))
-						continue;
-					ret.prepend(new InstalledPackage
-						(package, version,
-						 version_path));
 				}
-			} else {
-				var current_path = Path.build_filename
-					(root, package, "current");
-				if (! is_symlink (current_path))
-					continue;
-				var version = FileUtils.read_link
-					(current_path);
-				if (! ("/" in version))
-					ret.prepend(new InstalledPackage
+				if (node != null &&
+				    node.get_node_type () ==
+				    Json.NodeType.OBJECT)
+					entry.versions[version] =
+						node.get_object ();
+			}
+			index.packages[item.key] = entry;
+		}
+		var generator = new Json.Generator ();
+		generator.set_root (index.to_json ());
+		FileUtils.set_contents
+			(get_index_path (), generator.to_data (null));
+	}
+
+	private void
+	try_update_index ()
+	{
+		try {
+			update_index ();
+		} catch (Error e) {
+			warning ("Cannot update package index for %s: %s",
+				 root, e.message);
+		}
+	}
+
+	internal List<InstalledPackage>
+	get_packages_from_entries (Gee.SortedMap<string, PackageIndexEntry>
+				   entries, bool all_versions)
+	{
+		var ret = new List<InstalledPackage> ();
+
+		foreach (var item in entries.entries) {
+			unowned string package = item.key;
+			var entry = item.value;
+			if (all_versions) {
+				foreach (var version in entry.versions.keys)
+					ret.prepend (new InstalledPackage
 						(package, version,
-						 current_path));
+						 Path.build_filename
+							(root, package,
+							 version)));
+			} else if (entry.current != null &&
+				   ! ("/" in entry.current)) {
+				ret.prepend (new InstalledPackage
+					(package, entry.current,
+					 Path.build_filename
+						(root, package, "current")));
 			}
 		}
 
@@ -193,6 +643,61 @@ public class SingleDB : Object {
 		return ret;
 	}
 
+	/**
+	 * get_packages:
+	 * @all_versions: If true, return all versions, not just current ones.
+	 *
+	 * Returns: A list of #InstalledPackage instances corresponding to
+	 * package versions in only this database.
+	 */
+	public List<InstalledPackage>
+	get_packages (bool all_versions = false) throws Error
+	{
+		return get_packages_from_entries
+			(get_package_entries (), all_versions);
+	}
+
+	/**
+	 * get_indexed_manifest:
+	 * @package: A package name.
+	 * @version: A version string.
+	 * @entries: Package entries as returned by get_package_entries.
+	 *
+	 * Like get_manifest, but use the manifest recorded in @entries if
+	 * there is one rather than reading it from the file system.
+	 */
+	internal Json.Object
+	get_indexed_manifest (string package, string version,
+			      Gee.SortedMap<string, PackageIndexEntry> entries)
+		throws DatabaseError
+	{
+		var entry = entries[package];
+		if (entry == null || ! entry.versions.has_key (version))
+			throw new DatabaseError.DOES_NOT_EXIST
+				("%s %s does not exist in %s",
+				 package, version, root);
+		var raw = entry.versions[version];
+		if (raw == null)
+			return get_manifest (package, version);
+		return add_dynamic_keys
+			(copy_manifest (raw),
+			 Path.build_filename (root, package, version));
+	}
+
+	private Json.Object
+	add_dynamic_keys (Json.Object manifest, string path)
+	{
+		var to_remove = new List<string> ();
+		foreach (var name in manifest.get_members ()) {
+			if (name.has_prefix ("_"))
+				to_remove.prepend (name);
+		}
+		foreach (var name in to_remove)
+			manifest.remove_member (name);
+		manifest.set_string_member ("_directory", path);
+		return manifest;
+	}
+
 	/**
 	 * get_manifest:
 	 * @package: A package name.
@@ -212,32 +717,23 @@ public class SingleDB : Object {
 		var path = get_path (package, version);
 		var manifest_path = Path.build_filename
 			(path, ".click", "info", @"$package.manifest");
-		var parser = new Json.Parser ();
+		Json.Node node;
 		try {
-			parser.load_from_file (manifest_path);
+			node = master_db.manifest_cache.get
+				(package, version, manifest_path);
 		} catch (Error e) {
 			throw new DatabaseError.BAD_MANIFEST
 				("Failed to parse manifest in %s: %s",
 				 manifest_path, e.message);
 		}
-		var node = parser.get_root ();
 		if (node.get_node_type () != Json.NodeType.OBJECT)
 			throw new DatabaseError.BAD_MANIFEST
 				("Manifest in %s is not a JSON object",
 				 manifest_path);
-		var manifest = node.dup_object ();
+		var manifest = copy_manifest (node.get_object ());
 
 		/* Set up dynamic keys. */
-		var to_remove = new List<string> ();
-		foreach (var name in manifest.get_members ()) {
-			if (name.has_prefix ("_"))
-				to_remove.prepend (name);
-		}
-		foreach (var name in to_remove)
-			manifest.remove_member (name);
-		manifest.set_string_member ("_directory", path);
-
-		return manifest;
+		return add_dynamic_keys (manifest, path);
 	}
 
 	/**
@@ -314,10 +810,12 @@ public class SingleDB : Object {
 		var manifest_path = Path.build_filename
 			(get_path (package, version), ".click", "info",
 			 @"$package.manifest");
-		var parser = new Json.Parser ();
 		try {
-			parser.load_from_file (manifest_path);
-			var manifest = parser.get_root ().get_object ();
+			var node = master_db.manifest_cache.get
+				(package, version, manifest_path);
+			if (node.get_node_type () != Json.NodeType.OBJECT)
+				return false;
+			var manifest = node.get_object ();
 			if (! manifest.has_member ("hooks"))
 				return false;
 			var hooks = manifest.get_object_member ("hooks");
@@ -389,22 +887,33 @@ public class SingleDB : Object {
 	public void
 	maybe_remove (string package, string version) throws Error
 	{
-		var users_db = new Users (master_db);
-		foreach (var user_name in users_db.get_user_names ()) {
-			var user_db = users_db.get_user (user_name);
-			string reg_version;
-			try {
-				reg_version = user_db.get_version (package);
-			} catch (UserError e) {
-				continue;
-			}
-			if (reg_version == version) {
-				/* In use. */
-				return;
-			}
-		}
+		maybe_remove_with_registrations
+			(package, version, new RegistrationSnapshot (master_db));
+	}
+
+	/**
+	 * maybe_remove_with_registrations:
+	 * @package: A package name.
+	 * @version: A version string.
+	 * @registrations: A #Click.RegistrationSnapshot.
+	 *
+	 * As click_single_db_maybe_remove(), but use a previously-taken
+	 * snapshot of user registrations, so that several packages can be
+	 * considered for removal after a single scan of registrations.
+	 *
+	 * Since: 0.4.48
+	 */
+	public void
+	maybe_remove_with_registrations (string package, string version,
+					 RegistrationSnapshot registrations)
+		throws Error
+	{
+		if (registrations.is_registered (package, version))
+			/* In use. */
+			return;
 
 		remove_unless_running (package, version);
+		try_update_index ();
 	}
 
 	/**
@@ -430,48 +939,55 @@ public class SingleDB : Object {
 		// registration timestamps and compare to package timestamps before
 		// blindly re-registering so old versions can still be registered if
 		// they were done so after the new package was installed.
-		foreach (var package in master_db.get_packages(true)) {
-			var users_db = new Users (master_db);
-			foreach (var name in users_db.get_user_names ()) {
-				var user_db = users_db.get_user (name);
+		var newest = new Gee.HashMap<string, string> ();
+		foreach (var package in master_db.get_packages (true)) {
+			var version = newest[package.package];
+			if (version == null ||
+			    compare_versions (version, package.version) < 0)
+				newest[package.package] = package.version;
+		}
 
+		var registrations = new RegistrationSnapshot (master_db);
+		var updated = false;
+		foreach (var name in registrations.get_user_names ()) {
+			foreach (var package in
+				 registrations.get_package_names (name)) {
+				var version = newest[package];
+				if (version == null)
+					continue;
+				var registered_version =
+					registrations.get_version (name, package);
+				if (compare_versions
+					(registered_version, version) >= 0)
+					continue;
+				// Update the user's registered version.
 				try {
-					string registered_version = user_db.get_version (package.package);
-
-					string[] args = { "dpkg", "--compare-versions",
-					                  registered_version, "lt",
-					                  package.version };
-					int exit_status;
-					Process.spawn_sync (null, args, null,
-					                    SpawnFlags.SEARCH_PATH, null, null,
-					                    null, out exit_status);
-
-					// This will throw if non-zero
-					Process.check_exit_status (exit_status);
-
-					// Update the user's registered version if necessary.
-					user_db.set_version (package.package, package.version);
-				} catch {
-					// User was either not registered for this app or was
-					// registered for this version (or newer). Either way,
-					// skip it.
+					new User.for_user (master_db, name)
+						.set_version (package, version);
+					updated = true;
+				} catch (Error e) {
+					// The registration could not be
+					// updated; leave it alone.
 				}
 			}
 		}
+		if (updated)
+			registrations.refresh ();
 
-		var users_db = new Users (master_db);
 		var user_reg = new Gee.HashMultiMap<string, string> ();
-		foreach (var user_name in users_db.get_user_names ()) {
-			var user_db = users_db.get_user (user_name);
-			foreach (var package in user_db.get_package_names ()) {
-				var version = user_db.get_version (package);
+		foreach (var user_name in registrations.get_user_names ()) {
+			if (user_name == GC_IN_USE_USER)
+				continue;
+			foreach (var package in
+				 registrations.get_package_names (user_name)) {
+				var version = registrations.get_version
+					(user_name, package);
 				if (version == "current")
 					continue;
 				/* Odd multimap syntax; this should really
 				 * be more like foo[package] += version.
 				 */
-				if (! user_db.is_gc_in_use)
-					user_reg[package] = version;
+				user_reg[package] = version;
 			}
 		}
 
@@ -495,6 +1011,8 @@ public class SingleDB : Object {
 				remove_unless_running (package, version);
 			}
 		}
+
+		try_update_index ();
 	}
 
 	private delegate void WalkFunc (string dirpath, string[] dirnames,
@@ -550,6 +1068,9 @@ public class SingleDB : Object {
 					(path, "users");
 				if (exists (users_path))
 					func (users_path);
+				var index_path = get_index_path ();
+				if (exists (index_path))
+					func (index_path);
 			} else {
 				walk (path, (dp, dns, fns) => {
 					func (dp);
@@ -582,19 +1103,20 @@ public class SingleDB : Object {
 	public void
 	ensure_ownership () throws Error
 	{
-		errno = 0;
-		unowned Posix.Passwd? pw = Posix.getpwnam ("clickpkg");
+		var pw = lookup_passwd ("clickpkg");
 		if (pw == null)
 			throw new DatabaseError.ENSURE_OWNERSHIP
 				("Cannot get password file entry for " +
 				 "clickpkg: %s", strerror (errno));
+		var uid = (Posix.uid_t) pw.uid;
+		var gid = (Posix.gid_t) pw.gid;
 		Posix.Stat st;
 		if (Posix.stat (root, out st) < 0)
 			return;
-		if (st.st_uid == pw.pw_uid && st.st_gid == pw.pw_gid)
+		if (st.st_uid == uid && st.st_gid == gid)
 			return;
 		foreach_clickpkg_path ((path) => {
-			if (Posix.chown (path, pw.pw_uid, pw.pw_gid) < 0)
+			if (Posix.chown (path, uid, gid) < 0)
 				throw new DatabaseError.ENSURE_OWNERSHIP
 					("Cannot set ownership of %s: %s",
 					 path, strerror (errno));
@@ -604,9 +1126,33 @@ public class SingleDB : Object {
 
 public class DB : Object {
 	private Gee.ArrayList<SingleDB> db = new Gee.ArrayList<SingleDB> ();
+	internal ManifestCache manifest_cache = new ManifestCache ();
 
 	public DB () {}
 
+	/**
+	 * manifest_cache_hits:
+	 *
+	 * The number of manifest reads served from this database's cache of
+	 * parsed manifests.
+	 *
+	 * Since: 0.4.48
+	 */
+	public uint manifest_cache_hits {
+		get { return manifest_cache.hits; }
+	}
+
+	/**
+	 * manifest_cache_misses:
+	 *
+	 * The number of manifest reads that had to parse the manifest file.
+	 *
+	 * Since: 0.4.48
+	 */
+	public uint manifest_cache_misses {
+		get { return manifest_cache.misses; }
+	}
+
 	public void
 	read (string? db_dir = null) throws FileError
 	{
@@ -713,12 +1259,32 @@ public class DB : Object {
 	 */
 	public List<InstalledPackage>
 	get_packages (bool all_versions = false) throws Error
+	{
+		return get_packages_with_entries
+			(all_versions, get_package_entries ());
+	}
+
+	private Gee.List<Gee.SortedMap<string, PackageIndexEntry>>
+	get_package_entries () throws Error
+	{
+		var ret = new Gee.ArrayList
+			<Gee.SortedMap<string, PackageIndexEntry>> ();
+		foreach (var single_db in db)
+			ret.add (single_db.get_package_entries ());
+		return ret;
+	}
+
+	private List<InstalledPackage>
+	get_packages_with_entries
+		(bool all_versions,
+		 Gee.List<Gee.SortedMap<string, PackageIndexEntry>> entries)
 	{
 		var ret = new List<InstalledPackage> ();
 		var seen = new Gee.HashSet<string> ();
 		var writeable = true;
 		for (int i = db.size - 1; i >= 0; --i) {
-			var child_packages = db[i].get_packages (all_versions);
+			var child_packages = db[i].get_packages_from_entries
+				(entries[i], all_versions);
 			foreach (var pkg in child_packages) {
 				string seen_id;
 				if (all_versions)
@@ -794,6 +1360,26 @@ public class DB : Object {
 		return generator.to_data (null);
 	}
 
+	private Json.Object
+	get_indexed_manifest
+		(string package, string version,
+		 Gee.List<Gee.SortedMap<string, PackageIndexEntry>> entries)
+		throws DatabaseError
+	{
+		for (int i = 0; i < db.size; ++i) {
+			try {
+				return db[i].get_indexed_manifest
+					(package, version, entries[i]);
+			} catch (DatabaseError e) {
+				if (e is DatabaseError.BAD_MANIFEST)
+					throw e;
+			}
+		}
+		throw new DatabaseError.DOES_NOT_EXIST
+			("%s %s does not exist in any database",
+			 package, version);
+	}
+
 	/**
 	 * get_manifests:
 	 * @all_versions: If true, return manifests for all versions, not
@@ -810,11 +1396,13 @@ public class DB : Object {
 	get_manifests (bool all_versions = false) throws Error
 	{
 		var ret = new Json.Array ();
-		foreach (var inst in get_packages (all_versions)) {
+		var entries = get_package_entries ();
+		foreach (var inst in get_packages_with_entries
+				(all_versions, entries)) {
 			Json.Object obj;
 			try {
-				obj = get_manifest
-					(inst.package, inst.version);
+				obj = get_indexed_manifest
+					(inst.package, inst.version, entries);
 			} catch (DatabaseError e) {
 				warning ("%s", e.message);
 				continue;
@@ -884,6 +1472,20 @@ public class DB : Object {
 		ensure_db();
 		db.last ().ensure_ownership ();
 	}
+
+	/**
+	 * update_index:
+	 *
+	 * Rewrite the on-disk package index for the overlay database.
+	 *
+	 * Since: 0.4.48
+	 */
+	public void
+	update_index () throws Error
+	{
+		ensure_db();
+		db.last ().update_index ();
+	}
 }
 
 }
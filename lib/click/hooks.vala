@@ -105,19 +105,23 @@ validate_framework_for_package (DB db, string package, string? version)
 	return validate_framework (required_frameworks);
 }
 
+/* The returned manifest may be shared with the manifest cache of @db, and
+ * must not be modified.
+ */
 private Json.Object
 read_manifest (DB db, string package, string? version)
 {
 	if (version == null)
 		return new Json.Object ();
-	var parser = new Json.Parser ();
 	try {
 		var manifest_path = Path.build_filename
 			(db.get_path (package, version), ".click", "info",
 			 @"$package.manifest");
-		parser.load_from_file (manifest_path);
-		var manifest = parser.get_root ().get_object ();
-		return manifest.ref ();
+		var node = db.manifest_cache.get
+			(package, version, manifest_path);
+		if (node.get_node_type () != Json.NodeType.OBJECT)
+			return new Json.Object ();
+		return node.get_object ().ref ();
 	} catch (Error e) {
 		return new Json.Object ();
 	}
@@ -373,30 +377,56 @@ pattern_format (string format_string, Variant args)
 public Variant?
 pattern_possible_expansion (string s, string format_string, Variant args)
 {
-	string[] regex_pieces = {};
-	string[] group_names = {};
-	foreach (var segment in pattern_parse (format_string)) {
-		if (segment.is_expansion) {
-			unowned string value;
-			if (args.lookup (segment.text, "m&s", out value))
-				regex_pieces += Regex.escape_string (value);
-			else {
-				regex_pieces += "(.*)";
-				group_names += segment.text;
-			}
-		} else
-			regex_pieces += Regex.escape_string (segment.text);
-	}
-	var joined = string.joinv ("", regex_pieces);
-	Regex compiled;
-	try {
-		compiled = new Regex ("^" + joined + "$");
-	} catch (RegexError e) {
-		return null;
+	return new PatternMatcher (format_string, args).match (s);
+}
+
+/* A format string compiled into a regular expression, with some keys bound
+ * to fixed values, for repeated use by pattern_possible_expansion.
+ */
+private class PatternMatcher : Object {
+	private Regex? compiled;
+	private string[] group_names;
+
+	public
+	PatternMatcher (string format_string, Variant args)
+	{
+		string[] regex_pieces = {};
+		group_names = {};
+		foreach (var segment in pattern_parse (format_string)) {
+			if (segment.is_expansion) {
+				unowned string value;
+				if (args.lookup (segment.text, "m&s", out value))
+					regex_pieces += Regex.escape_string
+						(value);
+				else {
+					regex_pieces += "(.*)";
+					group_names += segment.text;
+				}
+			} else
+				regex_pieces += Regex.escape_string
+					(segment.text);
+		}
+		var joined = string.joinv ("", regex_pieces);
+		try {
+			compiled = new Regex
+				("^" + joined + "$", RegexCompileFlags.OPTIMIZE);
+		} catch (RegexError e) {
+			compiled = null;
+		}
 	}
-	MatchInfo match_info;
-	var builder = new VariantBuilder (new VariantType ("a{ss}"));
-	if (compiled.match (s, 0, out match_info)) {
+
+	/* Returns: A dictionary #GLib.Variant mapping all the unbound keys
+	 * to their values in @s, or null if @s is not a possible expansion.
+	 */
+	public Variant?
+	match (string s)
+	{
+		if (compiled == null)
+			return null;
+		MatchInfo match_info;
+		if (! compiled.match (s, 0, out match_info))
+			return null;
+		var builder = new VariantBuilder (new VariantType ("a{ss}"));
 		for (int group_i = 0; group_i < group_names.length;
 		     ++group_i) {
 			var match = match_info.fetch (group_i + 1);
@@ -404,8 +434,385 @@ pattern_possible_expansion (string s, string format_string, Variant args)
 			builder.add ("{ss}", group_names[group_i], match);
 		}
 		return builder.end ();
-	} else
-		return null;
+	}
+}
+
+/**
+ * ClickHookBatch:
+ *
+ * Defers hook commands so that each distinct hook runs its command at
+ * most once per user.
+ *
+ * Between click_hook_batch_begin() and click_hook_batch_commit(), any
+ * hook command that would have been run by click_hook_run_commands() is
+ * instead recorded, and run once at commit time.  Batches may be nested:
+ * if a batch is already in progress, beginning another one joins it, and
+ * the recorded commands are run when the outermost batch is committed.
+ *
+ * There is a single batch in progress per process, not per thread, so
+ * batches and the hook functions that consult them must all be used from
+ * one thread.
+ *
+ * Since: 0.4.48
+ */
+public class HookBatch : Object {
+	private class Pending : Object {
+		public Hook hook;
+		public string? user_name;
+	}
+
+	private static HookBatch? active = null;
+
+	private int depth = 0;
+	private Gee.ArrayList<Pending> pending = new Gee.ArrayList<Pending> ();
+	private Gee.HashSet<string> seen = new Gee.HashSet<string> ();
+
+	/* Names of the hooks whose commands failed in the last commit. */
+	internal string[] failed_hooks = {};
+
+	/**
+	 * jobs:
+	 *
+	 * The maximum number of hook commands to run concurrently when the
+	 * batch is committed.  Commands for different hooks are independent
+	 * of each other; the default of 1 runs them in sequence.
+	 */
+	public int jobs { get; set; default = 1; }
+
+	public HookBatch () {}
+
+	/**
+	 * begin:
+	 *
+	 * Start deferring hook commands.
+	 */
+	public void
+	begin ()
+	{
+		if (depth++ == 0 && active == null)
+			active = this;
+	}
+
+	/* Record that @hook needs to run its command for @user_name.
+	 *
+	 * Returns: True if the command was deferred to the active batch, or
+	 * false if there is no active batch.
+	 */
+	internal static bool
+	defer (Hook hook, string? user_name)
+	{
+		if (active == null)
+			return false;
+		var key = hook.name + "/" + (user_name ?? "");
+		if (active.seen.add (key)) {
+			var item = new Pending ();
+			item.hook = hook;
+			item.user_name = user_name;
+			active.pending.add (item);
+		}
+		return true;
+	}
+
+	/* Run the commands for @items with at most @jobs running at once.
+	 *
+	 * This forks and execs directly rather than using threads, so
+	 * privileges are still dropped between fork() and execve() as
+	 * drop_privileges requires.  Only our own children are reaped: each
+	 * gets a child watch on a private main context, which we block on
+	 * until one of them exits.
+	 */
+	private void
+	run_parallel (Gee.List<Pending> items, ref string[] messages)
+	{
+		var context = new MainContext ();
+		var running = 0;
+		var next = 0;
+		string[] errors = {};
+		while (next < items.size || running > 0) {
+			while (next < items.size && running < jobs) {
+				var item = items[next++];
+				try {
+					Pid pid;
+					if (! item.hook.spawn_commands
+						(item.user_name, out pid)) {
+						item.hook.check_trigger ();
+						continue;
+					}
+					++running;
+					var watch = new ChildWatchSource (pid);
+					watch.set_callback ((child, status) => {
+						Process.close_pid (child);
+						--running;
+						try {
+							item.hook.finish_commands
+								(status);
+						} catch (HooksError e) {
+							failed_hooks +=
+								item.hook.name;
+							errors += e.message;
+						}
+					});
+					watch.attach (context);
+				} catch (Error e) {
+					failed_hooks += item.hook.name;
+					errors += e.message;
+				}
+			}
+			if (running > 0)
+				context.iteration (true);
+		}
+		foreach (var message in errors)
+			messages += message;
+	}
+
+	/**
+	 * commit:
+	 *
+	 * Finish this batch.  If it is the outermost batch in progress, run
+	 * each deferred hook command once, in the order in which they were
+	 * first requested.
+	 */
+	public void
+	commit () throws HooksError
+	{
+		if (depth == 0 || --depth > 0 || active != this)
+			return;
+		run_pending ();
+	}
+
+	/**
+	 * abort:
+	 *
+	 * Finish this batch after an error, unless it has already been
+	 * committed, so that it can be called unconditionally once the work
+	 * is done.  If it is the outermost batch in progress, the deferred
+	 * hook commands are still run, since their hooks have already been
+	 * updated, but failures are only logged so as not to hide the
+	 * original error.
+	 */
+	public void
+	abort ()
+	{
+		if (depth == 0 || --depth > 0 || active != this)
+			return;
+		try {
+			run_pending ();
+		} catch (HooksError e) {
+			warning ("Hook commands failed: %s", e.message);
+		}
+	}
+
+	private void
+	run_pending () throws HooksError
+	{
+		active = null;
+		var items = pending;
+		pending = new Gee.ArrayList<Pending> ();
+		seen.clear ();
+
+		string[] messages = {};
+		failed_hooks = {};
+		if (jobs > 1)
+			run_parallel (items, ref messages);
+		else {
+			foreach (var item in items) {
+				try {
+					item.hook.run_commands_now
+						(item.user_name);
+				} catch (Error e) {
+					failed_hooks += item.hook.name;
+					messages += e.message;
+				}
+			}
+		}
+		if (messages.length != 0)
+			throw new HooksError.COMMAND_FAILED
+				("%s", string.joinv ("; ", messages));
+	}
+}
+
+/* The parsed contents of the hooks directory, loaded once per process.
+ *
+ * The registry is reloaded if the hooks directory changes, or if any hook
+ * file it knows about changes in place.  Timestamps in the same second as
+ * the registry was loaded are never trusted, since a further change within
+ * that second would not be visible.
+ */
+private class HookRegistry : Object {
+	private class Entry : Object {
+		public string name;
+		public int64 mtime;
+		public int64 size;
+		public Gee.Map<string, string> fields;
+		/* Compiled patterns, keyed by user name. */
+		public Gee.Map<string, PatternMatcher> matchers;
+	}
+
+	private static HookRegistry? instance = null;
+
+	private string dir;
+	private int64 dir_mtime;
+	private int64 loaded;
+	/* Ordered by file name, as Click.Dir.open would list them. */
+	private Gee.ArrayList<Entry> entries;
+	private Gee.HashMap<string, Entry> by_name;
+	private Gee.HashMap<string, Gee.ArrayList<Entry>> by_hook_name;
+
+	private
+	HookRegistry (string dir)
+	{
+		this.dir = dir;
+		entries = new Gee.ArrayList<Entry> ();
+		by_name = new Gee.HashMap<string, Entry> ();
+		by_hook_name = new Gee.HashMap<string, Gee.ArrayList<Entry>> ();
+	}
+
+	private static bool
+	stat_file (string path, out int64 mtime, out int64 size)
+	{
+		Posix.Stat st;
+		if (Posix.stat (path, out st) < 0) {
+			mtime = -1;
+			size = -1;
+			return false;
+		}
+		mtime = (int64) st.st_mtime;
+		size = (int64) st.st_size;
+		return true;
+	}
+
+	private bool
+	is_fresh (int64 dir_mtime)
+	{
+		if (dir_mtime < 0 || dir_mtime != this.dir_mtime ||
+		    dir_mtime >= loaded)
+			return false;
+		foreach (var entry in entries) {
+			int64 mtime, size;
+			if (! stat_file (Path.build_filename
+					 (dir, @"$(entry.name).hook"),
+					 out mtime, out size) ||
+			    mtime != entry.mtime || size != entry.size ||
+			    mtime >= loaded)
+				return false;
+		}
+		return true;
+	}
+
+	private void
+	load () throws FileError
+	{
+		var old_by_name = by_name;
+		var old_loaded = loaded;
+		entries = new Gee.ArrayList<Entry> ();
+		by_name = new Gee.HashMap<string, Entry> ();
+		by_hook_name = new Gee.HashMap<string, Gee.ArrayList<Entry>> ();
+		dir_mtime = get_mtime (dir);
+		loaded = get_real_time () / 1000000;
+
+		foreach (var file_name in Click.Dir.open (dir)) {
+			if (! file_name.has_suffix (".hook"))
+				continue;
+			var path = Path.build_filename (dir, file_name);
+			int64 mtime, size;
+			if (! stat_file (path, out mtime, out size))
+				continue;
+			var entry = new Entry ();
+			entry.name = file_name[0:-5];
+			entry.mtime = mtime;
+			entry.size = size;
+			var old_entry = old_by_name[entry.name];
+			if (old_entry != null &&
+			    old_entry.mtime == entry.mtime &&
+			    old_entry.size == entry.size &&
+			    old_entry.mtime < old_loaded) {
+				entry.fields = old_entry.fields;
+				entry.matchers = old_entry.matchers;
+			} else {
+				try {
+					entry.fields = parse_deb822_file (path);
+				} catch (Error e) {
+					continue;
+				}
+				entry.matchers =
+					new Gee.HashMap<string, PatternMatcher> ();
+			}
+			entries.add (entry);
+			by_name[entry.name] = entry;
+
+			var hook_name = entry.fields["hook-name"];
+			if (hook_name == null)
+				hook_name = entry.name;
+			var named = by_hook_name[hook_name];
+			if (named == null) {
+				named = new Gee.ArrayList<Entry> ();
+				by_hook_name[hook_name] = named;
+			}
+			named.add (entry);
+		}
+	}
+
+	/**
+	 * get_default:
+	 *
+	 * Returns: The registry for the current hooks directory, reloaded
+	 * if necessary.
+	 */
+	public static HookRegistry
+	get_default () throws FileError
+	{
+		var dir = get_hooks_dir ();
+		if (instance == null || instance.dir != dir)
+			instance = new HookRegistry (dir);
+		if (! instance.is_fresh (get_mtime (dir)))
+			instance.load ();
+		return instance;
+	}
+
+	/* Returns: A #Click.Hook for the file @name.hook, or null if there
+	 * is no such hook.
+	 */
+	public Hook?
+	lookup (DB db, string name)
+	{
+		var entry = by_name[name];
+		if (entry == null)
+			return null;
+		return new Hook.with_fields
+			(db, entry.name, entry.fields, entry.matchers);
+	}
+
+	/**
+	 * open:
+	 * @db: A #Click.DB.
+	 * @hook_name: (allow-none): A Hook-Name to match, or null.
+	 * @user_level: (allow-none): Only return user-level hooks if true,
+	 * or only system-level hooks if false; null returns both.
+	 *
+	 * Returns: A list of #Click.Hook instances sharing the fields held
+	 * by this registry, in hook file name order.
+	 */
+	public List<Hook>
+	open (DB db, string? hook_name = null, bool? user_level = null)
+	{
+		var ret = new List<Hook> ();
+		Gee.List<Entry> candidates = entries;
+		if (hook_name != null) {
+			candidates = by_hook_name[hook_name];
+			if (candidates == null)
+				return ret;
+		}
+		foreach (var entry in candidates) {
+			var hook = new Hook.with_fields
+				(db, entry.name, entry.fields, entry.matchers);
+			if (user_level != null &&
+			    hook.is_user_level != user_level)
+				continue;
+			ret.prepend (hook);
+		}
+		ret.reverse ();
+		return ret;
+	}
 }
 
 public class Hook : Object {
@@ -413,10 +820,15 @@ public class Hook : Object {
 	public string name { internal get; construct; }
 
 	private Gee.Map<string, string> fields;
+	private Gee.Map<string, PatternMatcher> matchers;
 
-	private Hook (DB db, string name)
+	internal Hook.with_fields (DB db, string name,
+				   Gee.Map<string, string> fields,
+				   Gee.Map<string, PatternMatcher> matchers)
 	{
 		Object (db: db, name: name);
+		this.fields = fields;
+		this.matchers = matchers;
 	}
 
 	/**
@@ -429,16 +841,15 @@ public class Hook : Object {
 	public static Hook
 	open (DB db, string name) throws HooksError
 	{
-		var hook_path = Path.build_filename
-			(get_hooks_dir (), @"$name.hook");
+		Hook? hook = null;
 		try {
-			var hook = new Hook (db, name);
-			hook.fields = parse_deb822_file (hook_path);
-			return hook;
+			hook = HookRegistry.get_default ().lookup (db, name);
 		} catch (Error e) {
+		}
+		if (hook == null)
 			throw new HooksError.NO_SUCH_HOOK
 				("No click hook '%s' installed", name);
-		}
+		return hook;
 	}
 
 	/**
@@ -454,24 +865,7 @@ public class Hook : Object {
 	public static List<Hook>
 	open_all (DB db, string? hook_name = null) throws FileError
 	{
-		var ret = new List<Hook> ();
-		var dir = get_hooks_dir ();
-		foreach (var name in Click.Dir.open (dir)) {
-			if (! name.has_suffix (".hook"))
-				continue;
-			var path = Path.build_filename (dir, name);
-			try {
-				var hook = new Hook (db, name[0:-5]);
-				hook.fields = parse_deb822_file (path);
-				if (hook_name == null ||
-				    hook.get_hook_name () == hook_name)
-					ret.prepend (hook);
-			} catch (Error e) {
-				continue;
-			}
-		}
-		ret.reverse ();
-		return ret;
+		return HookRegistry.get_default ().open (db, hook_name);
 	}
 
 	/**
@@ -615,36 +1009,49 @@ public class Hook : Object {
 			 name, strerror (errno));
 	}
 
-	/* This function is not async-signal-safe, but runs between fork() and
-	 * execve().  As such, it is not safe to run hooks from a multi-threaded
-	 * process.  Do not use the GLib main loop with this!
+	/* Look up everything needed to drop privileges to @user_name, before
+	 * forking.
+	 *
+	 * Returns: A #Click.PasswdEntry, or null if no privileges need to be
+	 * dropped.
 	 */
-	private void
-	drop_privileges_inner (string user_name) throws HooksError
+	private PasswdEntry?
+	prepare_drop_privileges (string user_name) throws HooksError
 	{
 		if (Posix.geteuid () != 0)
-			return;
+			return null;
 
-		errno = 0;
-		unowned Posix.Passwd? pw = Posix.getpwnam (user_name);
+		var pw = lookup_passwd (user_name);
 		if (pw == null)
 			throw new HooksError.NO_SUCH_USER
 				("Cannot get password file entry for user " +
 				 "'%s': %s", user_name, strerror (errno));
+		/* Fill the group cache now rather than in the child. */
+		pw.get_groups ();
+		return pw;
+	}
+
+	/* This function is not async-signal-safe, but runs between fork() and
+	 * execve().  As such, it is not safe to run hooks from a multi-threaded
+	 * process.  Do not spawn hook commands from a GLib main loop that
+	 * other threads may be dispatching: HookBatch.run_parallel only
+	 * iterates a private MainContext of its own, on the calling thread,
+	 * to wait for children that have already been spawned.
+	 */
+	private void
+	drop_privileges_inner (PasswdEntry? pw, uint[] groups)
+		throws HooksError
+	{
+		if (pw == null || Posix.geteuid () != 0)
+			return;
+
 		Posix.gid_t[] supp = {};
-		Posix.setgrent ();
-		unowned PosixExtra.Group? gr;
-		while ((gr = PosixExtra.getgrent ()) != null) {
-			foreach (unowned string member in gr.gr_mem) {
-				if (member == user_name) {
-					supp += gr.gr_gid;
-					break;
-				}
-			}
-		}
-		Posix.endgrent ();
+		foreach (var gid in groups)
+			supp += (Posix.gid_t) gid;
 		if (PosixExtra.setgroups (supp.length, supp) < 0)
 			priv_drop_failure ("setgroups");
+		var uid = (Posix.uid_t) pw.uid;
+		var gid = (Posix.gid_t) pw.gid;
 		/* Portability note: this assumes that we have
 		 * [gs]etres[gu]id, which is true on Linux but not
 		 * necessarily elsewhere.  If you need to support something
@@ -652,31 +1059,29 @@ public class Hook : Object {
 		 * involving other similar calls; see e.g.
 		 * gnulib/lib/idpriv-drop.c.
 		 */
-		if (PosixExtra.setresgid (pw.pw_gid, pw.pw_gid, pw.pw_gid) < 0)
+		if (PosixExtra.setresgid (gid, gid, gid) < 0)
 			priv_drop_failure ("setresgid");
-		if (PosixExtra.setresuid (pw.pw_uid, pw.pw_uid, pw.pw_uid) < 0)
+		if (PosixExtra.setresuid (uid, uid, uid) < 0)
 			priv_drop_failure ("setresuid");
 		{
 			Posix.uid_t ruid, euid, suid;
 			Posix.gid_t rgid, egid, sgid;
 			assert (PosixExtra.getresuid (out ruid, out euid,
 						      out suid) == 0 &&
-				ruid == pw.pw_uid && euid == pw.pw_uid &&
-				suid == pw.pw_uid);
+				ruid == uid && euid == uid && suid == uid);
 			assert (PosixExtra.getresgid (out rgid, out egid,
 						      out sgid) == 0 &&
-				rgid == pw.pw_gid && egid == pw.pw_gid &&
-				sgid == pw.pw_gid);
+				rgid == gid && egid == gid && sgid == gid);
 		}
-		Environment.set_variable ("HOME", pw.pw_dir, true);
+		Environment.set_variable ("HOME", pw.home, true);
 		Posix.umask (get_umask () | Posix.S_IWOTH);
 	}
 
 	private void
-	drop_privileges (string user_name)
+	drop_privileges (PasswdEntry? pw, uint[] groups)
 	{
 		try {
-			drop_privileges_inner (user_name);
+			drop_privileges_inner (pw, groups);
 		} catch (HooksError e) {
 			error ("%s", e.message);
 		}
@@ -704,31 +1109,104 @@ public class Hook : Object {
 	 */
 	public void
 	run_commands (string? user_name = null) throws Error
+	{
+		if (! HookBatch.defer (this, user_name))
+			run_commands_now (user_name);
+	}
+
+	internal void
+	run_commands_now (string? user_name = null) throws Error
 	{
 		if (fields.has_key ("exec")) {
 			string[] argv = {"/bin/sh", "-c", fields["exec"]};
-			var target_user_name = get_run_commands_user
-				(user_name);
+			var pw = prepare_drop_privileges
+				(get_run_commands_user (user_name));
+			uint[] groups = pw != null ? pw.get_groups () : new uint[0];
 			SpawnChildSetupFunc drop =
-				() => drop_privileges (target_user_name);
+				() => drop_privileges (pw, groups);
 			int exit_status;
 			Process.spawn_sync (null, argv, null,
 					    SpawnFlags.SEARCH_PATH, drop,
 					    null, null, out exit_status);
-			try {
-				Process.check_exit_status (exit_status);
-			} catch (Error e) {
-				throw new HooksError.COMMAND_FAILED
-					("Hook command '%s' failed: %s",
-					 fields["exec"], e.message);
-			}
+			check_commands_status (exit_status);
+		}
+
+		check_trigger ();
+	}
+
+	/* Start any command specified by the hook without waiting for it to
+	 * finish.  The caller must reap @pid and pass its wait status to
+	 * finish_commands.
+	 *
+	 * Returns: True if a command was started, otherwise false.
+	 */
+	internal bool
+	spawn_commands (string? user_name, out Pid pid) throws Error
+	{
+		pid = 0;
+		if (! fields.has_key ("exec"))
+			return false;
+		string[] argv = {"/bin/sh", "-c", fields["exec"]};
+		var pw = prepare_drop_privileges
+			(get_run_commands_user (user_name));
+		uint[] groups = pw != null ? pw.get_groups () : new uint[0];
+		SpawnChildSetupFunc drop = () => drop_privileges (pw, groups);
+		Process.spawn_async (null, argv, null,
+				     SpawnFlags.SEARCH_PATH |
+				     SpawnFlags.DO_NOT_REAP_CHILD,
+				     drop, out pid);
+		return true;
+	}
+
+	/* Complete run_commands for a command started by spawn_commands. */
+	internal void
+	finish_commands (int exit_status) throws HooksError
+	{
+		check_commands_status (exit_status);
+		check_trigger ();
+	}
+
+	private void
+	check_commands_status (int exit_status) throws HooksError
+	{
+		try {
+			Process.check_exit_status (exit_status);
+		} catch (Error e) {
+			throw new HooksError.COMMAND_FAILED
+				("Hook command '%s' failed: %s",
+				 fields["exec"], e.message);
 		}
+	}
 
+	internal void
+	check_trigger () throws HooksError
+	{
 		if (fields["trigger"] == "yes")
 			throw new HooksError.NYI
 				("'Trigger: yes' not yet implemented");
 	}
 
+	/* Returns: This hook's pattern compiled with the user and home keys
+	 * bound for @user_name.
+	 */
+	private PatternMatcher
+	get_matcher (string? user_name)
+	{
+		var key = user_name ?? "";
+		var matcher = matchers[key];
+		if (matcher == null) {
+			var builder = new VariantBuilder
+				(new VariantType ("a{sms}"));
+			builder.add ("{sms}", "user", user_name);
+			builder.add
+				("{sms}", "home", get_user_home (user_name));
+			matcher = new PatternMatcher
+				(fields["pattern"], builder.end ());
+			matchers[key] = matcher;
+		}
+		return matcher;
+	}
+
 	private List<PreviousEntry>
 	get_previous_entries (string? user_name = null) throws Error
 	{
@@ -738,15 +1216,10 @@ public class Hook : Object {
 		/* TODO: This only works if the application ID only appears, at
 		 * most, in the last component of the pattern path.
 		 */
+		var matcher = get_matcher (user_name);
 		foreach (var entry in Click.Dir.open (link_dir_path)) {
 			var path = Path.build_filename (link_dir_path, entry);
-			var exp_builder = new VariantBuilder
-				(new VariantType ("a{sms}"));
-			exp_builder.add ("{sms}", "user", user_name);
-			exp_builder.add
-				("{sms}", "home", get_user_home (user_name));
-			var exp = pattern_possible_expansion
-				(path, fields["pattern"], exp_builder.end ());
+			var exp = matcher.match (path);
 			unowned string? id = null;
 			if (exp != null)
 				exp.lookup ("id", "&s", out id);
@@ -861,7 +1334,9 @@ public class Hook : Object {
 	get_all_packages_for_user (string user_name, User user_db) throws Error
 	{
 		var ret = new Gee.ArrayList<UnpackedPackage> ();
-		foreach (var package in user_db.get_package_names ())
+		var packages = user_db.iter_package_names ();
+		string? package;
+		while ((package = packages.next_name ()) != null)
 			ret.add (new UnpackedPackage
 				(package, user_db.get_version (package),
 				 user_name));
@@ -1051,11 +1526,10 @@ get_user_home (string? user_name)
 {
 	if (user_name == null)
 		return null;
-	/* TODO: caching */
-	unowned Posix.Passwd? pw = Posix.getpwnam (user_name);
+	var pw = lookup_passwd (user_name);
 	if (pw == null)
 		return null;
-	return pw.pw_dir;
+	return pw.home;
 }
 
 private Gee.TreeSet<AppHook>
@@ -1098,10 +1572,11 @@ package_install_hooks (DB db, string package, string? old_version,
 	var new_app_hooks = get_app_hooks (new_manifest);
 	foreach (var app_hook in new_app_hooks)
 		old_app_hooks.remove (app_hook);
+	var registry = HookRegistry.get_default ();
+	var user_level = user_name != null;
 	foreach (var app_hook in old_app_hooks) {
-		foreach (var hook in Hook.open_all (db, app_hook.hook_name)) {
-			if (hook.is_user_level != (user_name != null))
-				continue;
+		foreach (var hook in registry.open
+				(db, app_hook.hook_name, user_level)) {
 			if (! hook.is_single_version)
 				continue;
 			hook.remove_package (package, old_version,
@@ -1118,9 +1593,8 @@ package_install_hooks (DB db, string package, string? old_version,
 		foreach (var hook_name in hook_names) {
 			var relative_path = app_hooks.get_string_member
 				(hook_name);
-			foreach (var hook in Hook.open_all (db, hook_name)) {
-				if (hook.is_user_level != (user_name != null))
-					continue;
+			foreach (var hook in registry.open
+					(db, hook_name, user_level)) {
 				hook.install_package (package, new_version,
 						      app_name, relative_path,
 						      user_name);
@@ -1146,11 +1620,11 @@ package_remove_hooks (DB db, string package, string old_version,
 		      string? user_name = null) throws Error
 {
 	var old_manifest = read_manifest_hooks (db, package, old_version);
+	var registry = HookRegistry.get_default ();
 
 	foreach (var app_hook in get_app_hooks (old_manifest)) {
-		foreach (var hook in Hook.open_all (db, app_hook.hook_name)) {
-			if (hook.is_user_level != (user_name != null))
-				continue;
+		foreach (var hook in registry.open
+				(db, app_hook.hook_name, user_name != null)) {
 			hook.remove_package (package, old_version,
 					     app_hook.app_name, user_name);
 		}
@@ -1169,12 +1643,33 @@ package_remove_hooks (DB db, string package, string old_version,
  */
 public void
 run_system_hooks (DB db) throws Error
+{
+	run_system_hooks_parallel (db, 1);
+}
+
+/**
+ * run_system_hooks_parallel:
+ * @db: A #Click.DB.
+ * @jobs: The maximum number of hook commands to run at once.
+ *
+ * Run system-level hooks for all installed packages, as
+ * click_run_system_hooks(), but run the commands of up to @jobs hooks
+ * concurrently once all hook links have been updated.
+ *
+ * Since: 0.4.48
+ */
+public void
+run_system_hooks_parallel (DB db, int jobs) throws Error
 {
 	db.gc ();
 	db.ensure_ownership ();
 	string[] failed = {};
-	foreach (var hook in Hook.open_all (db)) {
-		if (! hook.is_user_level) {
+	var registry = HookRegistry.get_default ();
+	var batch = new HookBatch ();
+	batch.jobs = jobs;
+	batch.begin ();
+	try {
+		foreach (var hook in registry.open (db, null, false)) {
 			try {
 				hook.sync ();
 			} catch (HooksError e) {
@@ -1183,6 +1678,16 @@ run_system_hooks (DB db) throws Error
 				failed += hook.name;
 			}
 		}
+		try {
+			batch.commit ();
+		} catch (HooksError e) {
+			warning ("System-level hook commands failed: %s",
+				 e.message);
+			foreach (var name in batch.failed_hooks)
+				failed += name;
+		}
+	} finally {
+		batch.abort ();
 	}
 	if (failed.length != 0)
 		throw new HooksError.INCOMPLETE
@@ -1204,12 +1709,35 @@ run_system_hooks (DB db) throws Error
  */
 public void
 run_user_hooks (DB db, string? user_name = null) throws Error
+{
+	run_user_hooks_parallel (db, user_name, 1);
+}
+
+/**
+ * run_user_hooks_parallel:
+ * @db: A #Click.DB.
+ * @user_name: (allow-none): A user name, or null to run hooks for the
+ * current user.
+ * @jobs: The maximum number of hook commands to run at once.
+ *
+ * Run user-level hooks for all installed packages, as
+ * click_run_user_hooks(), but run the commands of up to @jobs hooks
+ * concurrently once all hook links have been updated.
+ *
+ * Since: 0.4.48
+ */
+public void
+run_user_hooks_parallel (DB db, string? user_name, int jobs) throws Error
 {
 	if (user_name == null)
 		user_name = Environment.get_user_name ();
 	string[] failed = {};
-	foreach (var hook in Hook.open_all (db)) {
-		if (hook.is_user_level) {
+	var registry = HookRegistry.get_default ();
+	var batch = new HookBatch ();
+	batch.jobs = jobs;
+	batch.begin ();
+	try {
+		foreach (var hook in registry.open (db, null, true)) {
 			try {
 				hook.sync (user_name);
 			} catch (HooksError e) {
@@ -1218,6 +1746,16 @@ run_user_hooks (DB db, string? user_name = null) throws Error
 				failed += hook.name;
 			}
 		}
+		try {
+			batch.commit ();
+		} catch (HooksError e) {
+			warning ("User-level hook commands failed: %s",
+				 e.message);
+			foreach (var name in batch.failed_hooks)
+				failed += name;
+		}
+	} finally {
+		batch.abort ();
 	}
 	if (failed.length != 0)
 		throw new HooksError.INCOMPLETE
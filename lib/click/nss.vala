@@ -0,0 +1,185 @@
+/* Copyright (C) 2026 UBports Foundation
+ *
+ * This program is free software: you can redistribute it and/or modify
+ * it under the terms of the GNU General Public License as published by
+ * the Free Software Foundation; version 3 of the License.
+ *
+ * This program is distributed in the hope that it will be useful,
+ * but WITHOUT ANY WARRANTY; without even the implied warranty of
+ * MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+ * GNU General Public License for more details.
+ *
+ * You should have received a copy of the GNU General Public License
+ * along with this program.  If not, see <http://www.gnu.org/licenses/>.
+ */
+
+/* Cached user and group database lookups.
+ *
+ * On systems where the user database is backed by a network service, each
+ * lookup may be expensive, and Click looks up the same few users many
+ * times over when running hooks or walking registrations.
+ */
+
+namespace Click {
+
+/* How long cached lookups remain valid, in seconds. */
+private const int64 NSS_CACHE_TTL = 60;
+
+/**
+ * ClickPasswdEntry:
+ *
+ * The parts of a password file entry that Click needs.
+ *
+ * Since: 0.4.48
+ */
+public class PasswdEntry : Object {
+	public string name { get; construct; }
+	public uint uid { get; construct; }
+	public uint gid { get; construct; }
+	public string home { get; construct; }
+
+	internal
+	PasswdEntry (string name, Posix.Passwd pw)
+	{
+		Object (name: name, uid: (uint) pw.pw_uid,
+			gid: (uint) pw.pw_gid, home: pw.pw_dir);
+	}
+
+	/**
+	 * get_groups:
+	 *
+	 * Returns: The IDs of the supplementary groups of which this user
+	 * is a member.
+	 */
+	public uint[]
+	get_groups ()
+	{
+		return NssCache.get_groups (name);
+	}
+}
+
+private class NssCache : Object {
+	private class Entry : Object {
+		public PasswdEntry? pw;
+		public int lookup_errno;
+		public int64 time;
+	}
+
+	private static Gee.HashMap<string, Entry>? passwd = null;
+	private static Gee.HashMap<string, Gee.ArrayList<uint>>? groups = null;
+	private static int64 groups_time = 0;
+	/* A forked child starts with a fresh cache, so that it never acts
+	 * on stale entries inherited from a long-running parent.
+	 */
+	private static Posix.pid_t pid = 0;
+
+	private static int64
+	now ()
+	{
+		return get_monotonic_time () / 1000000;
+	}
+
+	private static void
+	check_pid ()
+	{
+		var current = Posix.getpid ();
+		if (pid != current) {
+			invalidate ();
+			pid = current;
+		}
+	}
+
+	public static void
+	invalidate ()
+	{
+		passwd = null;
+		groups = null;
+		groups_time = 0;
+	}
+
+	public static PasswdEntry?
+	lookup (string name)
+	{
+		check_pid ();
+		if (passwd == null)
+			passwd = new Gee.HashMap<string, Entry> ();
+		var entry = passwd[name];
+		if (entry == null || now () - entry.time >= NSS_CACHE_TTL) {
+			entry = new Entry ();
+			errno = 0;
+			unowned Posix.Passwd? pw = Posix.getpwnam (name);
+			entry.lookup_errno = errno;
+			entry.pw = pw != null ? new PasswdEntry (name, pw) : null;
+			entry.time = now ();
+			passwd[name] = entry;
+		}
+		errno = entry.lookup_errno;
+		return entry.pw;
+	}
+
+	public static uint[]
+	get_groups (string name)
+	{
+		check_pid ();
+		if (groups == null || now () - groups_time >= NSS_CACHE_TTL) {
+			/* One pass over the group database finds the groups
+			 * of every user at once.
+			 */
+			groups = new Gee.HashMap<string, Gee.ArrayList<uint>> ();
+			Posix.setgrent ();
+			unowned PosixExtra.Group? gr;
+			while ((gr = PosixExtra.getgrent ()) != null) {
+				foreach (unowned string member in gr.gr_mem) {
+					var member_groups = groups[member];
+					if (member_groups == null) {
+						member_groups =
+							new Gee.ArrayList<uint> ();
+						groups[member] = member_groups;
+					}
+					member_groups.add ((uint) gr.gr_gid);
+				}
+			}
+			Posix.endgrent ();
+			groups_time = now ();
+		}
+		var member_groups = groups[name];
+		if (member_groups == null)
+			return {};
+		return member_groups.to_array ();
+	}
+}
+
+/**
+ * lookup_passwd:
+ * @name: A user name.
+ *
+ * Look up @name in the password database, using a process-wide cache.
+ * Results, including failed lookups, are cached for a short time.  If the
+ * lookup fails, errno is set as it was by getpwnam().
+ *
+ * Returns: (allow-none): A #Click.PasswdEntry, or null if there is no such
+ * user.
+ *
+ * Since: 0.4.48
+ */
+public PasswdEntry?
+lookup_passwd (string name)
+{
+	return NssCache.lookup (name);
+}
+
+/**
+ * invalidate_nss_cache:
+ *
+ * Discard all cached password and group database lookups, for example
+ * after adding a user.
+ *
+ * Since: 0.4.48
+ */
+public void
+invalidate_nss_cache ()
+{
+	NssCache.invalidate ();
+}
+
+}
@@ -163,13 +163,13 @@ public class Users : Object {
 	get_click_pw () throws UserError
 	{
 		if (click_pw == null) {
-			errno = 0;
-			unowned Posix.Passwd pw = Posix.getpwnam ("clickpkg");
+			var pw = lookup_passwd ("clickpkg");
 			if (pw == null)
 				throw new UserError.GETPWNAM
 					("Cannot get password file entry " +
 					 "for clickpkg: %s", strerror (errno));
-			click_pw = new CachedPasswd (pw.pw_uid, pw.pw_gid);
+			click_pw = new CachedPasswd
+				((Posix.uid_t) pw.uid, (Posix.gid_t) pw.gid);
 		}
 		return click_pw;
 	}
@@ -210,7 +210,7 @@ public class Users : Object {
 					continue;
 				// the user is not a pseudo user and does not/no-longer exist
 				if (!entry.has_prefix ("@") &&
-					Posix.getpwnam (entry) == null)
+					lookup_passwd (entry) == null)
 					continue;
 				var path = Path.build_filename (users_db,
 								entry);
@@ -246,6 +246,232 @@ public class Users : Object {
 	}
 }
 
+/**
+ * ClickPackageNameIterator:
+ *
+ * Iterates over the package names registered for a #Click.User without
+ * building the whole list first.
+ *
+ * Since: 0.4.48
+ */
+public class PackageNameIterator : Object {
+	private User user;
+	private string[] dirs;
+	private int next_dir = 0;
+	private Gee.HashSet<string> seen = new Gee.HashSet<string> ();
+	private Gee.ArrayQueue<string> pending = new Gee.ArrayQueue<string> ();
+
+	internal
+	PackageNameIterator (User user)
+	{
+		this.user = user;
+		dirs = user.get_registration_dirs ();
+	}
+
+	/**
+	 * next_name:
+	 *
+	 * Returns: (allow-none): The next registered package name, or null
+	 * when there are no more.
+	 */
+	public string?
+	next_name () throws Error
+	{
+		while (pending.is_empty) {
+			if (next_dir >= dirs.length)
+				return null;
+			user.scan_package_names_for_iter
+				(dirs[next_dir++], seen, pending);
+		}
+		return pending.poll ();
+	}
+}
+
+/**
+ * ClickRegistrationSnapshot:
+ *
+ * The package registrations of every user, read in a single sweep over
+ * all databases.
+ *
+ * Each user's registrations are read with that user's privileges, once
+ * per snapshot rather than once per package.  The snapshot does not
+ * change if registrations are later modified; call
+ * click_registration_snapshot_refresh() to read them again.
+ *
+ * Since: 0.4.48
+ */
+public class RegistrationSnapshot : Object {
+	public DB db { private get; construct; }
+
+	/* user name -> package -> registered version */
+	private Gee.TreeMap<string, Gee.TreeMap<string, string>> users;
+	/* package -> versions registered by any user */
+	private Gee.HashMultiMap<string, string> versions;
+
+	public RegistrationSnapshot (DB db) throws Error
+	{
+		Object (db: db);
+		refresh ();
+	}
+
+	/* Read the links in @user_db, mapping package names to registered
+	 * versions, or to null for hidden packages.  As in
+	 * click_user_get_version, a dangling link hides its package.  Must be
+	 * run with dropped privileges for the user owning @user_db.
+	 */
+	private static Gee.HashMap<string, string?>
+	read_links (string user_db) throws Error
+	{
+		var ret = new Gee.HashMap<string, string?> ();
+		foreach (var entry in Click.Dir.open (user_db)) {
+			var path = Path.build_filename (user_db, entry);
+			if (! is_symlink (path))
+				continue;
+			string target;
+			try {
+				target = FileUtils.read_link (path);
+			} catch (FileError e) {
+				continue;
+			}
+			if (target.has_prefix ("@") || ! exists (path))
+				ret[entry] = null;
+			else
+				ret[entry] = Path.get_basename (target);
+		}
+		return ret;
+	}
+
+	/**
+	 * refresh:
+	 *
+	 * Read all registrations again.
+	 */
+	public void
+	refresh () throws Error
+	{
+		users = new Gee.TreeMap<string, Gee.TreeMap<string, string>> ();
+		versions = new Gee.HashMultiMap<string, string> ();
+
+		/* Registrations for all users apply to each user too, so
+		 * read them first.
+		 */
+		var all_links = new Gee.ArrayList<Gee.HashMap<string, string?>> ();
+		foreach (var single_db in db)
+			all_links.add (read_links (db_for_user
+				(single_db.root, ALL_USERS)));
+
+		foreach (var user_name in new Users (db).get_user_names ()) {
+			var user_links =
+				new Gee.ArrayList<Gee.HashMap<string, string?>> ();
+			if (user_name == ALL_USERS)
+				user_links = all_links;
+			else {
+				var user_db = new User.for_user (db, user_name);
+				user_db.drop_privileges ();
+				try {
+					foreach (var single_db in db)
+						user_links.add (read_links
+							(db_for_user
+							 (single_db.root,
+							  user_name)));
+				} finally {
+					user_db.regain_privileges ();
+				}
+			}
+
+			/* Later databases take precedence, and within each
+			 * database the user's own links take precedence over
+			 * those for all users, as in click_user_get_version.
+			 */
+			var resolved = new Gee.HashMap<string, string?> ();
+			for (int i = db.size - 1; i >= 0; --i) {
+				foreach (var link in user_links[i].entries) {
+					if (! resolved.has_key (link.key))
+						resolved[link.key] = link.value;
+				}
+				foreach (var link in all_links[i].entries) {
+					if (! resolved.has_key (link.key))
+						resolved[link.key] = link.value;
+				}
+			}
+
+			var registered = new Gee.TreeMap<string, string> ();
+			foreach (var item in resolved.entries) {
+				if (item.value == null)
+					continue;
+				registered[item.key] = item.value;
+				versions[item.key] = item.value;
+			}
+			users[user_name] = registered;
+		}
+	}
+
+	/**
+	 * get_user_names:
+	 *
+	 * Returns: A list of user names with registrations.
+	 */
+	public List<string>
+	get_user_names ()
+	{
+		var ret = new List<string> ();
+		foreach (var user_name in users.keys)
+			ret.prepend (user_name);
+		ret.reverse ();
+		return ret;
+	}
+
+	/**
+	 * get_package_names:
+	 * @user_name: A user name.
+	 *
+	 * Returns: A list of package names registered for @user_name.
+	 */
+	public List<string>
+	get_package_names (string user_name)
+	{
+		var ret = new List<string> ();
+		var registered = users[user_name];
+		if (registered != null) {
+			foreach (var package in registered.keys)
+				ret.prepend (package);
+		}
+		ret.reverse ();
+		return ret;
+	}
+
+	/**
+	 * get_version:
+	 * @user_name: A user name.
+	 * @package: A package name.
+	 *
+	 * Returns: (allow-none): The version of @package registered for
+	 * @user_name, or null if it is not registered or is hidden.
+	 */
+	public string?
+	get_version (string user_name, string package)
+	{
+		var registered = users[user_name];
+		if (registered == null)
+			return null;
+		return registered[package];
+	}
+
+	/**
+	 * is_registered:
+	 * @package: A package name.
+	 * @version: A version string.
+	 *
+	 * Returns: True if @version of @package is registered for any user,
+	 * including pseudo-users, otherwise false.
+	 */
+	public bool
+	is_registered (string package, string version)
+	{
+		return versions.get (package).contains (version);
+	}
+}
+
 public class User : Object {
 	public DB db { private get; construct; }
 	public string name { private get; construct; }
@@ -309,13 +535,13 @@ public class User : Object {
 		assert (! is_pseudo_user);
 
 		if (user_pw == null) {
-			errno = 0;
-			unowned Posix.Passwd pw = Posix.getpwnam (name);
+			var pw = lookup_passwd (name);
 			if (pw == null)
 				throw new UserError.GETPWNAM
 				     ("Cannot get password file entry for " +
 				      "%s: %s", name, strerror (errno));
-			user_pw = new CachedPasswd (pw.pw_uid, pw.pw_gid);
+			user_pw = new CachedPasswd
+				((Posix.uid_t) pw.uid, (Posix.gid_t) pw.gid);
 		}
 		return user_pw;
 	}
@@ -422,47 +648,86 @@ public class User : Object {
 		}
 	}
 
+	/* Append to @names the packages newly registered in @user_db,
+	 * skipping any in @seen and recording hidden ones there.  Must be
+	 * run with dropped privileges.
+	 */
+	private void
+	scan_package_names (string user_db, Gee.HashSet<string> seen,
+			    Gee.Queue<string> names) throws Error
+	{
+		foreach (var entry in Click.Dir.open (user_db)) {
+			if (entry in seen)
+				continue;
+			var path = Path.build_filename (user_db, entry);
+			if (is_valid_link (path)) {
+				seen.add (entry);
+				names.offer (entry);
+			} else if (is_symlink (path))
+				/* Hidden; lower-precedence registrations do
+				 * not count either.
+				 */
+				seen.add (entry);
+		}
+	}
+
+	/* Returns: The directories to scan for this user's registrations,
+	 * in order of precedence.
+	 */
+	internal string[]
+	get_registration_dirs ()
+	{
+		string[] ret = {};
+		for (int i = db.size - 1; i >= 0; --i) {
+			ret += db_for_user (db[i].root, name);
+			if (name != ALL_USERS)
+				ret += db_for_user (db[i].root, ALL_USERS);
+		}
+		return ret;
+	}
+
 	private List<string>
 	get_package_names_dropped () throws Error
 	{
+		var seen = new Gee.HashSet<string> ();
+		var names = new Gee.ArrayQueue<string> ();
+		foreach (var user_db in get_registration_dirs ())
+			scan_package_names (user_db, seen, names);
 		var entries = new List<string> ();
-		var hidden = new Gee.HashSet<string> ();
-		for (int i = db.size - 1; i >= 0; --i) {
-			var user_db = db_for_user (db[i].root, name);
-			foreach (var entry in Click.Dir.open (user_db)) {
-				if (entries.find_custom (entry, strcmp)
-					!= null ||
-				    entry in hidden)
-					continue;
-				var path = Path.build_filename (user_db, entry);
-				if (is_valid_link (path))
-					entries.prepend (entry.dup ());
-				else if (is_symlink (path))
-					hidden.add (entry.dup ());
-			}
-
-			if (name != ALL_USERS) {
-				var all_users_db = db_for_user (db[i].root,
-								ALL_USERS);
-				foreach (var entry in Click.Dir.open
-						(all_users_db)) {
-					if (entries.find_custom (entry, strcmp)
-						!= null ||
-					    entry in hidden)
-						continue;
-					var path = Path.build_filename
-						(all_users_db, entry);
-					if (is_valid_link (path))
-						entries.prepend (entry.dup ());
-					else if (is_symlink (path))
-						hidden.add (entry.dup ());
-				}
-			}
-		}
+		foreach (var entry in names)
+			entries.prepend (entry);
 		entries.reverse ();
 		return entries;
 	}
 
+	/* Scan @user_db for an iterator, with dropped privileges. */
+	internal void
+	scan_package_names_for_iter (string user_db, Gee.HashSet<string> seen,
+				     Gee.Queue<string> names) throws Error
+	{
+		drop_privileges ();
+		try {
+			scan_package_names (user_db, seen, names);
+		} finally {
+			regain_privileges ();
+		}
+	}
+
+	/**
+	 * iter_package_names:
+	 *
+	 * Returns: (transfer full): A #Click.PackageNameIterator yielding
+	 * the same package names as click_user_get_package_names(), one
+	 * database directory at a time.
+	 *
+	 * Since: 0.4.48
+	 */
+	public PackageNameIterator
+	iter_package_names ()
+	{
+		return new PackageNameIterator (this);
+	}
+
 	/**
 	 * get_package_names:
 	 *
@@ -606,13 +871,21 @@ public class User : Object {
 		} finally {
 			regain_privileges ();
 		}
-		if (! is_pseudo_user)
-			package_install_hooks (db, package,
-					       old_version, version, name);
-
-		// run user hooks for all logged in users
-		if (name == ALL_USERS)
-			run_user_install_hooks_for_all_logged_in_users (package, old_version, version);
+		var batch = new HookBatch ();
+		batch.begin ();
+		try {
+			if (! is_pseudo_user)
+				package_install_hooks (db, package,
+						       old_version, version,
+						       name);
+
+			// run user hooks for all logged in users
+			if (name == ALL_USERS)
+				run_user_install_hooks_for_all_logged_in_users (package, old_version, version);
+			batch.commit ();
+		} finally {
+			batch.abort ();
+		}
 	}
 
 	private string[]
@@ -887,7 +1160,9 @@ public class User : Object {
 	get_manifests () throws Error /* API-compatibility */
 	{
 		var ret = new Json.Array ();
-		foreach (var package in get_package_names ()) {
+		var packages = iter_package_names ();
+		string? package;
+		while ((package = packages.next_name ()) != null) {
 			try {
 				ret.add_object_element
 					(get_manifest (package));
@@ -0,0 +1,122 @@
+/* Copyright (C) 2026 UBports Foundation
+ *
+ * This program is free software: you can redistribute it and/or modify
+ * it under the terms of the GNU General Public License as published by
+ * the Free Software Foundation; version 3 of the License.
+ *
+ * This program is distributed in the hope that it will be useful,
+ * but WITHOUT ANY WARRANTY; without even the implied warranty of
+ * MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+ * GNU General Public License for more details.
+ *
+ * You should have received a copy of the GNU General Public License
+ * along with this program.  If not, see <http://www.gnu.org/licenses/>.
+ */
+
+/* Debian-style version comparison, as in dpkg --compare-versions. */
+
+namespace Click {
+
+private int
+version_order (char c)
+{
+	if (c.isdigit ())
+		return 0;
+	else if (c.isalpha ())
+		return c;
+	else if (c == '~')
+		return -1;
+	else if (c != '\0')
+		return c + 256;
+	else
+		return 0;
+}
+
+/* Compare two upstream versions or Debian revisions, following dpkg's
+ * verrevcmp.
+ */
+private int
+version_compare_part (string a, string b)
+{
+	int i = 0, j = 0;
+	while (a[i] != '\0' || b[j] != '\0') {
+		int first_diff = 0;
+		while ((a[i] != '\0' && ! a[i].isdigit ()) ||
+		       (b[j] != '\0' && ! b[j].isdigit ())) {
+			var ac = version_order (a[i]);
+			var bc = version_order (b[j]);
+			if (ac != bc)
+				return ac - bc;
+			++i;
+			++j;
+		}
+		while (a[i] == '0')
+			++i;
+		while (b[j] == '0')
+			++j;
+		while (a[i].isdigit () && b[j].isdigit ()) {
+			if (first_diff == 0)
+				first_diff = a[i] - b[j];
+			++i;
+			++j;
+		}
+		if (a[i].isdigit ())
+			return 1;
+		if (b[j].isdigit ())
+			return -1;
+		if (first_diff != 0)
+			return first_diff;
+	}
+	return 0;
+}
+
+private void
+version_split (string version, out int epoch, out string upstream,
+	       out string revision)
+{
+	var rest = version.strip ();
+	var colon = rest.index_of_char (':');
+	if (colon >= 0) {
+		epoch = int.parse (rest[0:colon]);
+		rest = rest.substring (colon + 1);
+	} else
+		epoch = 0;
+	var hyphen = rest.last_index_of_char ('-');
+	if (hyphen >= 0) {
+		upstream = rest[0:hyphen];
+		revision = rest.substring (hyphen + 1);
+	} else {
+		upstream = rest;
+		revision = "";
+	}
+}
+
+/**
+ * compare_versions:
+ * @a: A Debian-style version string.
+ * @b: A Debian-style version string.
+ *
+ * Compare two version strings using the same rules as
+ * `dpkg --compare-versions`, without running dpkg.
+ *
+ * Returns: A negative value if @a is earlier than @b, zero if they are
+ * equal, or a positive value if @a is later than @b.
+ *
+ * Since: 0.4.48
+ */
+public int
+compare_versions (string a, string b)
+{
+	int a_epoch, b_epoch;
+	string a_upstream, b_upstream, a_revision, b_revision;
+	version_split (a, out a_epoch, out a_upstream, out a_revision);
+	version_split (b, out b_epoch, out b_upstream, out b_revision);
+	if (a_epoch != b_epoch)
+		return a_epoch > b_epoch ? 1 : -1;
+	var ret = version_compare_part (a_upstream, b_upstream);
+	if (ret != 0)
+		return ret;
+	return version_compare_part (a_revision, b_revision);
+}
+
+}
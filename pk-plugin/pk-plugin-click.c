@@ -22,6 +22,7 @@
 #include <errno.h>
 #include <pwd.h>
 #include <string.h>
+#include <sys/stat.h>
 #include <sys/types.h>
 #include <unistd.h>
 
@@ -38,9 +39,12 @@
 
 
 struct PkPluginPrivate {
-	guint			 dummy;
+	/* user name -> struct click_search_index */
+	GHashTable		*search_indexes;
 };
 
+#define CLICK_ALL_USERS "@all"
+
 #define DEFAULT_PATH \
 	"/usr/local/sbin:/usr/local/bin:/usr/sbin:/usr/bin:/sbin:/bin"
 
@@ -281,48 +285,295 @@ click_pk_error (PkPlugin *plugin, PkErrorEnum code,
 		pk_backend_job_error_code (plugin->job, code, "%s", summary);
 }
 
+#define CLICK_AR_MAGIC		"!<arch>\n"
+#define CLICK_AR_HEADER_SIZE	60
+#define CLICK_TAR_BLOCK_SIZE	512
+/* Manifests are small; refuse to load anything absurdly large. */
+#define CLICK_MANIFEST_MAX_SIZE	(1024 * 1024)
+
+static gboolean
+click_read_exact (GInputStream *stream, void *buffer, gsize count,
+		  GError **error)
+{
+	gsize bytes_read;
+
+	if (!g_input_stream_read_all (stream, buffer, count, &bytes_read,
+				      NULL, error))
+		return FALSE;
+	if (bytes_read != count) {
+		g_set_error_literal (error, G_IO_ERROR, G_IO_ERROR_FAILED,
+				     "Unexpected end of file");
+		return FALSE;
+	}
+	return TRUE;
+}
+
+/* Read and discard rather than using g_input_stream_skip, which does not
+ * make progress through a GConverterInputStream.
+ */
+static gboolean
+click_skip_bytes (GInputStream *stream, guint64 count, GError **error)
+{
+	gchar buffer[8192];
+	gssize bytes_read;
+
+	while (count > 0) {
+		bytes_read = g_input_stream_read
+			(stream, buffer, MIN (count, sizeof (buffer)), NULL,
+			 error);
+		if (bytes_read < 0)
+			return FALSE;
+		if (bytes_read == 0) {
+			g_set_error_literal (error, G_IO_ERROR,
+					     G_IO_ERROR_FAILED,
+					     "Unexpected end of file");
+			return FALSE;
+		}
+		count -= bytes_read;
+	}
+	return TRUE;
+}
+
+/**
+ * click_parse_number:
+ *
+ * Parse a space- or NUL-padded numeric field from an ar or tar header.
+ */
+static gboolean
+click_parse_number (const gchar *field, gsize length, guint base,
+		    guint64 *value)
+{
+	gchar *text;
+	gchar *end;
+	gboolean ret = FALSE;
+
+	text = g_strstrip (g_strndup (field, length));
+	if (!*text)
+		goto out;
+	*value = g_ascii_strtoull (text, &end, base);
+	ret = (*end == '\0');
+
+out:
+	g_free (text);
+	return ret;
+}
+
+/**
+ * click_open_control_member:
+ *
+ * Return a stream positioned at the start of the uncompressed control
+ * tarball of the Click package open as @stream.
+ */
+static GInputStream *
+click_open_control_member (GInputStream *stream, GError **error)
+{
+	gchar magic[sizeof (CLICK_AR_MAGIC) - 1];
+	gchar header[CLICK_AR_HEADER_SIZE];
+	gchar *name = NULL;
+	guint64 size;
+	GConverter *decompressor;
+	GInputStream *control = NULL;
+
+	if (!click_read_exact (stream, magic, sizeof (magic), error))
+		goto out;
+	if (memcmp (magic, CLICK_AR_MAGIC, sizeof (magic)) != 0) {
+		g_set_error_literal (error, G_IO_ERROR,
+				     G_IO_ERROR_INVALID_DATA,
+				     "Not an ar archive");
+		goto out;
+	}
+
+	for (;;) {
+		if (!click_read_exact (stream, header, sizeof (header), error))
+			goto out;
+		if (memcmp (header + 58, "`\n", 2) != 0 ||
+		    !click_parse_number (header + 48, 10, 10, &size)) {
+			g_set_error_literal (error, G_IO_ERROR,
+					     G_IO_ERROR_INVALID_DATA,
+					     "Malformed ar member header");
+			goto out;
+		}
+		g_free (name);
+		name = g_strstrip (g_strndup (header, 16));
+		if (g_str_has_suffix (name, "/"))
+			name[strlen (name) - 1] = '\0';
+
+		if (strcmp (name, "control.tar.gz") == 0) {
+			decompressor = G_CONVERTER (g_zlib_decompressor_new
+				(G_ZLIB_COMPRESSOR_FORMAT_GZIP));
+			control = g_converter_input_stream_new
+				(stream, decompressor);
+			g_object_unref (decompressor);
+			goto out;
+		} else if (strcmp (name, "control.tar") == 0) {
+			control = g_object_ref (stream);
+			goto out;
+		} else if (g_str_has_prefix (name, "control.tar")) {
+			g_set_error (error, G_IO_ERROR,
+				     G_IO_ERROR_NOT_SUPPORTED,
+				     "Unsupported control member %s", name);
+			goto out;
+		} else if (g_str_has_prefix (name, "data.tar")) {
+			g_set_error_literal (error, G_IO_ERROR,
+					     G_IO_ERROR_INVALID_DATA,
+					     "No control member");
+			goto out;
+		}
+
+		/* ar members are padded to an even length. */
+		if (!click_skip_bytes (stream, size + (size & 1), error))
+			goto out;
+	}
+
+out:
+	g_free (name);
+	return control;
+}
+
+/**
+ * click_read_control_file:
+ *
+ * Return the contents of the regular file @wanted from the top level of
+ * the control tarball open as @stream.
+ */
+static gchar *
+click_read_control_file (GInputStream *stream, const gchar *wanted,
+			 GError **error)
+{
+	gchar block[CLICK_TAR_BLOCK_SIZE];
+	gchar *name = NULL;
+	const gchar *path;
+	guint64 size;
+	gchar typeflag;
+	gchar *contents = NULL;
+
+	for (;;) {
+		if (!click_read_exact (stream, block, sizeof (block), error))
+			goto out;
+		if (block[0] == '\0') {
+			g_set_error (error, G_IO_ERROR, G_IO_ERROR_NOT_FOUND,
+				     "No %s in control member", wanted);
+			goto out;
+		}
+		if (!click_parse_number (block + 124, 12, 8, &size)) {
+			g_set_error_literal (error, G_IO_ERROR,
+					     G_IO_ERROR_INVALID_DATA,
+					     "Malformed tar header");
+			goto out;
+		}
+		g_free (name);
+		name = g_strndup (block, 100);
+		path = name;
+		if (g_str_has_prefix (path, "./"))
+			path += 2;
+		typeflag = block[156];
+
+		/* A POSIX ustar prefix puts the entry in a subdirectory. */
+		if ((typeflag == '0' || typeflag == '\0') &&
+		    strcmp (path, wanted) == 0 &&
+		    !(memcmp (block + 257, "ustar", 6) == 0 &&
+		      block[345] != '\0')) {
+			if (size > CLICK_MANIFEST_MAX_SIZE) {
+				g_set_error (error, G_IO_ERROR,
+					     G_IO_ERROR_INVALID_DATA,
+					     "%s in control member is too "
+					     "large", wanted);
+				goto out;
+			}
+			contents = g_malloc (size + 1);
+			if (!click_read_exact (stream, contents, size,
+					       error)) {
+				g_free (contents);
+				contents = NULL;
+				goto out;
+			}
+			contents[size] = '\0';
+			goto out;
+		}
+
+		/* Entries are padded to a whole number of blocks. */
+		if (!click_skip_bytes
+			(stream,
+			 (size + CLICK_TAR_BLOCK_SIZE - 1) &
+			 ~((guint64) CLICK_TAR_BLOCK_SIZE - 1), error))
+			goto out;
+	}
+
+out:
+	g_free (name);
+	return contents;
+}
+
+/**
+ * click_get_manifest:
+ *
+ * Read the manifest from a Click package file.  This reads the control
+ * member directly rather than running "click info", which would start
+ * another Python process just to decompress the control member again.
+ */
 static JsonParser *
 click_get_manifest (PkPlugin *plugin, const gchar *filename)
 {
-	gboolean ret;
-	gchar **argv = NULL;
-	gint i;
-	gchar **envp = NULL;
+	GFile *file = NULL;
+	GFileInputStream *stream = NULL;
+	GInputStream *control = NULL;
 	gchar *manifest_text = NULL;
-	gchar *click_stderr = NULL;
-	gint click_status;
 	JsonParser *parser = NULL;
+	JsonNode *root;
+	JsonObject *manifest;
+	GList *members = NULL, *members_iter;
+	GError *error = NULL;
 
-	argv = g_malloc0_n (4, sizeof (*argv));
-	i = 0;
-	argv[i++] = g_strdup ("click");
-	argv[i++] = g_strdup ("info");
-	argv[i++] = g_strdup (filename);
-	envp = click_get_envp ();
-	ret = g_spawn_sync (NULL, argv, envp, G_SPAWN_SEARCH_PATH,
-			    NULL, NULL, &manifest_text, &click_stderr,
-			    &click_status, NULL);
-	if (!ret)
+	file = g_file_new_for_path (filename);
+	stream = g_file_read (file, NULL, &error);
+	if (!stream)
 		goto out;
-	if (!g_spawn_check_exit_status (click_status, NULL)) {
-		gchar *summary = g_strdup_printf
-			("\"click info %s\" failed.", filename);
-		click_pk_error (plugin, PK_ERROR_ENUM_INTERNAL_ERROR,
-				summary, click_stderr);
-		g_free (summary);
+	control = click_open_control_member (G_INPUT_STREAM (stream), &error);
+	if (!control)
+		goto out;
+	manifest_text = click_read_control_file (control, "manifest", &error);
+	if (!manifest_text)
 		goto out;
-	}
 
 	parser = json_parser_new ();
-	if (!parser)
+	if (!json_parser_load_from_data (parser, manifest_text, -1, &error))
+		goto out;
+	root = json_parser_get_root (parser);
+	if (!root || !JSON_NODE_HOLDS_OBJECT (root)) {
+		g_set_error_literal (&error, G_IO_ERROR,
+				     G_IO_ERROR_INVALID_DATA,
+				     "Manifest is not a JSON object");
 		goto out;
-	json_parser_load_from_data (parser, manifest_text, -1, NULL);
+	}
+
+	/* As with "click info", drop private keys; these are only
+	 * meaningful in the manifests of installed packages.
+	 */
+	manifest = json_node_get_object (root);
+	members = json_object_get_members (manifest);
+	for (members_iter = members; members_iter;
+	     members_iter = members_iter->next) {
+		if (g_str_has_prefix ((gchar *) members_iter->data, "_"))
+			json_object_remove_member
+				(manifest, (gchar *) members_iter->data);
+	}
 
 out:
-	g_strfreev (argv);
-	g_strfreev (envp);
+	if (error) {
+		gchar *summary = g_strdup_printf
+			("Failed to read manifest from %s.", filename);
+		click_pk_error (plugin, PK_ERROR_ENUM_INTERNAL_ERROR,
+				summary, error->message);
+		g_free (summary);
+		g_clear_object (&parser);
+		g_error_free (error);
+	}
+	if (members)
+		g_list_free (members);
 	g_free (manifest_text);
-	g_free (click_stderr);
+	g_clear_object (&control);
+	g_clear_object (&stream);
+	g_clear_object (&file);
 
 	return parser;
 }
@@ -738,67 +989,348 @@ click_remove_packages (PkPlugin *plugin, PkTransaction *transaction,
 	}
 }
 
-struct click_search_data {
-	PkPlugin *plugin;
-	gchar **values;
-	gboolean search_details;
+/* An installed package as seen by the search index. */
+struct click_search_entry {
+	gchar		*package_id;
+	gchar		*title;
+	gchar		*names;		/* lower-cased name and app names */
+	gchar		*details;	/* lower-cased title and description */
+};
+
+/* A trigram index over the manifests of the packages registered for one
+ * user.  It is rebuilt when any of that user's registration directories
+ * change (registering or unregistering a package always modifies one of
+ * them), and otherwise answers searches without reading any manifests.
+ */
+struct click_search_index {
+	ClickDB		*db;
+	gchar		*stamp;
+	GPtrArray	*entries;
+	GHashTable	*trigrams;	/* trigram -> GArray of entry indices */
 };
 
 static void
-click_search_emit (PkPlugin *plugin, JsonObject *manifest, const gchar *title)
+click_search_entry_free (struct click_search_entry *entry)
 {
-	gchar *package_id;
+	g_free (entry->package_id);
+	g_free (entry->title);
+	g_free (entry->names);
+	g_free (entry->details);
+	g_free (entry);
+}
 
-	package_id = click_build_pkid (plugin, manifest, "installed:click");
-	if (!package_id)
-		return;
-	g_debug ("Found package: %s", package_id);
-	pk_backend_job_package (plugin->job, PK_INFO_ENUM_INSTALLED,
-				package_id, title);
+static void
+click_search_index_free (struct click_search_index *index)
+{
+	g_clear_object (&index->db);
+	g_free (index->stamp);
+	if (index->entries)
+		g_ptr_array_unref (index->entries);
+	if (index->trigrams)
+		g_hash_table_unref (index->trigrams);
+	g_free (index);
+}
 
-	g_free (package_id);
+static gpointer
+click_trigram (const gchar *text)
+{
+	return GUINT_TO_POINTER (((guint) (guchar) text[0] << 16) |
+				 ((guint) (guchar) text[1] << 8) |
+				 (guint) (guchar) text[2]);
+}
+
+/**
+ * click_search_index_stamp:
+ *
+ * Return a string that changes whenever packages are registered or
+ * unregistered for @username.  This only needs a couple of stat calls per
+ * database, which is much cheaper than reading all the manifests again.
+ */
+static gchar *
+click_search_index_stamp (ClickDB *db, const gchar *username)
+{
+	GString *stamp;
+	const gchar *users[] = { username, CLICK_ALL_USERS, NULL };
+	const gchar **user;
+	ClickSingleDB *single_db;
+	gchar *path;
+	struct stat st;
+	gint i;
+
+	stamp = g_string_new (NULL);
+	for (i = 0; i < click_db_get_size (db); ++i) {
+		single_db = click_db_get (db, i, NULL);
+		if (!single_db)
+			continue;
+		for (user = users; *user; ++user) {
+			path = g_build_filename
+				(click_single_db_get_root (single_db),
+				 ".click", "users", *user, NULL);
+			if (stat (path, &st) == 0)
+				g_string_append_printf
+					(stamp, "%lu:%lu:%lld.%09ld;",
+					 (gulong) st.st_dev,
+					 (gulong) st.st_ino,
+					 (long long) st.st_mtim.tv_sec,
+					 st.st_mtim.tv_nsec);
+			else
+				g_string_append (stamp, "-;");
+			g_free (path);
+		}
+		g_object_unref (single_db);
+	}
+	return g_string_free (stamp, FALSE);
 }
 
 static void
-click_search_one (JsonArray *array, guint index, JsonNode *element_node,
-		  gpointer vdata)
+click_search_index_add_text (struct click_search_index *index, guint entry,
+			     const gchar *text)
 {
-	struct click_search_data *data;
-	JsonObject *manifest;
-	const gchar *name = NULL;
-	const gchar *title = NULL;
-	const gchar *description = NULL;
-	gchar **value;
+	gsize length;
+	gsize i;
+	gpointer trigram;
+	GArray *postings;
+
+	length = strlen (text);
+	for (i = 0; i + 3 <= length; ++i) {
+		trigram = click_trigram (text + i);
+		postings = g_hash_table_lookup (index->trigrams, trigram);
+		if (!postings) {
+			postings = g_array_new (FALSE, FALSE, sizeof (guint));
+			g_hash_table_insert (index->trigrams, trigram,
+					     postings);
+		}
+		/* Entries are added in order, so repeats are adjacent. */
+		if (postings->len == 0 ||
+		    g_array_index (postings, guint, postings->len - 1) != entry)
+			g_array_append_val (postings, entry);
+	}
+}
 
-	data = (struct click_search_data *) vdata;
-	manifest = json_node_get_object (element_node);
-	if (!manifest)
-		return;
-	name = json_object_get_string_member (manifest, "name");
+static void
+click_search_index_add (PkPlugin *plugin, struct click_search_index *index,
+			JsonObject *manifest)
+{
+	struct click_search_entry *entry;
+	gchar *name = NULL;
+	gchar *title = NULL;
+	gchar *description = NULL;
+	JsonObject *hooks;
+	GList *hooks_members = NULL, *hooks_iter;
+	GString *names;
+	gchar *details;
+
+	name = click_get_field_string (manifest, "name");
 	if (!name)
-		return;
-	if (data->search_details && json_object_has_member (manifest, "title"))
-		title = json_object_get_string_member (manifest, "title");
+		goto out;
+	title = click_get_field_string (manifest, "title");
 	if (!title)
-		title = "";
-	if (data->search_details &&
-	    json_object_has_member (manifest, "description"))
-		description = json_object_get_string_member (manifest,
-							     "description");
-	if (!description)
-		description = "";
-
-	for (value = data->values; *value; ++value) {
-		if (strcasestr (name, *value)) {
-			click_search_emit (data->plugin, manifest, title);
-			break;
+		title = g_strdup ("");
+	description = click_get_field_string (manifest, "description");
+
+	entry = g_new0 (struct click_search_entry, 1);
+	entry->package_id = click_build_pkid (plugin, manifest,
+					      "installed:click");
+	if (!entry->package_id) {
+		click_search_entry_free (entry);
+		goto out;
+	}
+	entry->title = g_strdup (title);
+
+	names = g_string_new (name);
+	hooks = click_get_field_object (manifest, "hooks");
+	if (hooks) {
+		hooks_members = json_object_get_members (hooks);
+		for (hooks_iter = hooks_members; hooks_iter;
+		     hooks_iter = hooks_iter->next) {
+			g_string_append_c (names, '\n');
+			g_string_append (names, (gchar *) hooks_iter->data);
 		}
-		if (data->search_details &&
-		    (strcasestr (title, *value) ||
-		     strcasestr (description, *value))) {
-			click_search_emit (data->plugin, manifest, title);
-			break;
+	}
+	entry->names = g_ascii_strdown (names->str, -1);
+	g_string_free (names, TRUE);
+	details = g_strjoin ("\n", title, description ? description : "",
+			     NULL);
+	entry->details = g_ascii_strdown (details, -1);
+	g_free (details);
+
+	g_ptr_array_add (index->entries, entry);
+	click_search_index_add_text (index, index->entries->len - 1,
+				     entry->names);
+	click_search_index_add_text (index, index->entries->len - 1,
+				     entry->details);
+
+out:
+	if (hooks_members)
+		g_list_free (hooks_members);
+	g_free (name);
+	g_free (title);
+	g_free (description);
+}
+
+static gboolean
+click_search_index_build (PkPlugin *plugin, struct click_search_index *index,
+			  const gchar *username)
+{
+	ClickUser *registry = NULL;
+	JsonArray *array = NULL;
+	JsonObject *manifest;
+	GError *error = NULL;
+	guint i;
+
+	registry = click_user_new_for_user (index->db, username, &error);
+	if (error) {
+		click_pk_error (plugin, PK_ERROR_ENUM_INTERNAL_ERROR,
+				"Unable to read Click database.",
+				error->message);
+		goto out;
+	}
+	array = click_user_get_manifests (registry, &error);
+	if (error) {
+		click_pk_error (plugin, PK_ERROR_ENUM_INTERNAL_ERROR,
+				"Unable to get Click package manifests.",
+				error->message);
+		goto out;
+	}
+
+	if (index->entries)
+		g_ptr_array_unref (index->entries);
+	index->entries = g_ptr_array_new_with_free_func
+		((GDestroyNotify) click_search_entry_free);
+	if (index->trigrams)
+		g_hash_table_unref (index->trigrams);
+	index->trigrams = g_hash_table_new_full
+		(g_direct_hash, g_direct_equal, NULL,
+		 (GDestroyNotify) g_array_unref);
+	for (i = 0; i < json_array_get_length (array); ++i) {
+		manifest = json_array_get_object_element (array, i);
+		if (manifest)
+			click_search_index_add (plugin, index, manifest);
+	}
+
+out:
+	if (array)
+		json_array_unref (array);
+	g_clear_object (&registry);
+	if (error) {
+		g_error_free (error);
+		return FALSE;
+	}
+	return TRUE;
+}
+
+/**
+ * click_search_index_get:
+ *
+ * Return an up-to-date search index for the user running @transaction.
+ */
+static struct click_search_index *
+click_search_index_get (PkPlugin *plugin, PkTransaction *transaction)
+{
+	gchar *username = NULL;
+	struct click_search_index *index;
+	gchar *stamp = NULL;
+	GError *error = NULL;
+
+	username = click_get_username_for_uid
+		(pk_transaction_get_uid (transaction));
+	if (!username)
+		username = g_strdup (g_get_user_name ());
+
+	index = g_hash_table_lookup (plugin->priv->search_indexes, username);
+	if (!index) {
+		index = g_new0 (struct click_search_index, 1);
+		index->db = click_db_new ();
+		click_db_read (index->db, NULL, &error);
+		if (error) {
+			click_pk_error (plugin, PK_ERROR_ENUM_INTERNAL_ERROR,
+					"Unable to read Click database.",
+					error->message);
+			g_error_free (error);
+			click_search_index_free (index);
+			index = NULL;
+			goto out;
+		}
+		g_hash_table_insert (plugin->priv->search_indexes,
+				     g_strdup (username), index);
+	}
+
+	/* Take the stamp first, so that changes made while building the
+	 * index cause it to be built again next time.
+	 */
+	stamp = click_search_index_stamp (index->db, username);
+	if (!index->stamp || strcmp (stamp, index->stamp) != 0) {
+		g_clear_pointer (&index->stamp, g_free);
+		if (!click_search_index_build (plugin, index, username)) {
+			index = NULL;
+			goto out;
+		}
+		index->stamp = stamp;
+		stamp = NULL;
+	}
+
+out:
+	g_free (stamp);
+	g_free (username);
+	return index;
+}
+
+static gboolean
+click_search_entry_matches (struct click_search_entry *entry,
+			    const gchar *value, gboolean search_details)
+{
+	if (strstr (entry->names, value))
+		return TRUE;
+	return search_details && strstr (entry->details, value);
+}
+
+/**
+ * click_search_index_match:
+ *
+ * Set matched[i] for each entry i that matches the lower-cased @value.
+ */
+static void
+click_search_index_match (struct click_search_index *index,
+			  const gchar *value, gboolean search_details,
+			  gboolean *matched)
+{
+	gsize length;
+	gsize i;
+	GArray *postings;
+	GArray *candidates = NULL;
+	guint entry;
+
+	length = strlen (value);
+	if (length < 3) {
+		/* Too short for the index; check every entry. */
+		for (entry = 0; entry < index->entries->len; ++entry) {
+			if (!matched[entry] &&
+			    click_search_entry_matches
+				(g_ptr_array_index (index->entries, entry),
+				 value, search_details))
+				matched[entry] = TRUE;
 		}
+		return;
+	}
+
+	/* Every trigram of @value occurs in each matching entry, so only
+	 * the entries with the rarest of them need to be checked.
+	 */
+	for (i = 0; i + 3 <= length; ++i) {
+		postings = g_hash_table_lookup (index->trigrams,
+						click_trigram (value + i));
+		if (!postings)
+			return;
+		if (!candidates || postings->len < candidates->len)
+			candidates = postings;
+	}
+	for (i = 0; i < candidates->len; ++i) {
+		entry = g_array_index (candidates, guint, i);
+		if (!matched[entry] &&
+		    click_search_entry_matches
+			(g_ptr_array_index (index->entries, entry),
+			 value, search_details))
+			matched[entry] = TRUE;
 	}
 }
 
@@ -806,17 +1338,33 @@ static void
 click_search (PkPlugin *plugin, PkTransaction *transaction, gchar **values,
 	      gboolean search_details)
 {
-	JsonArray *array = NULL;
-	struct click_search_data data;
+	struct click_search_index *index;
+	struct click_search_entry *entry;
+	gboolean *matched;
+	gchar **value;
+	gchar *lower;
+	guint i;
 
-	array = click_get_list (plugin, transaction);
-	if (!array)
+	index = click_search_index_get (plugin, transaction);
+	if (!index)
 		return;
-	data.plugin = plugin;
-	data.values = values;
-	data.search_details = search_details;
-	json_array_foreach_element (array, click_search_one, &data);
-	json_array_unref (array);
+	matched = g_new0 (gboolean, index->entries->len);
+	for (value = values; *value; ++value) {
+		lower = g_ascii_strdown (*value, -1);
+		click_search_index_match (index, lower, search_details,
+					  matched);
+		g_free (lower);
+	}
+	for (i = 0; i < index->entries->len; ++i) {
+		if (!matched[i])
+			continue;
+		entry = g_ptr_array_index (index->entries, i);
+		g_debug ("Found package: %s", entry->package_id);
+		pk_backend_job_package (plugin->job, PK_INFO_ENUM_INSTALLED,
+					entry->package_id,
+					search_details ? entry->title : "");
+	}
+	g_free (matched);
 }
 
 static void
@@ -844,6 +1392,9 @@ pk_plugin_initialize (PkPlugin *plugin)
 {
 	/* create private area */
 	plugin->priv = PK_TRANSACTION_PLUGIN_GET_PRIVATE (PkPluginPrivate);
+	plugin->priv->search_indexes = g_hash_table_new_full
+		(g_str_hash, g_str_equal, g_free,
+		 (GDestroyNotify) click_search_index_free);
 
 	/* tell PK we might be able to handle these */
 	pk_backend_implement (plugin->backend, PK_ROLE_ENUM_INSTALL_FILES);
@@ -851,6 +1402,15 @@ pk_plugin_initialize (PkPlugin *plugin)
 	pk_backend_implement (plugin->backend, PK_ROLE_ENUM_REMOVE_PACKAGES);
 }
 
+/**
+ * pk_plugin_destroy:
+ */
+void
+pk_plugin_destroy (PkPlugin *plugin)
+{
+	g_hash_table_unref (plugin->priv->search_indexes);
+}
+
 /**
  * pk_plugin_transaction_content_types:
  */